@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve the project with an ASGI server (e.g. ``uvicorn ipo.asgi:application``)
+so /api/events/ can stream run progress without holding a thread per client.
 """
 
 import os
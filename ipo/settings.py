@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from decouple import config as env_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -80,6 +82,32 @@ DATABASES = {
     }
 }
 
+# Parallel workers, background jobs and shards all write to SQLite at once.
+# The "concurrent" profile (default) uses WAL so readers never block the
+# writer, waits on a busy database instead of raising "database is locked",
+# takes write locks up front (IMMEDIATE) and keeps connections open between
+# requests. DB_PROFILE=basic restores Django's stock SQLite settings.
+# WAL is stored in the database file, so it is set once by migrate
+# (ipo_app 0010) rather than on every connection.
+SQLITE_JOURNAL_MODE = 'WAL'
+SQLITE_CONCURRENT_OPTIONS = {
+    'timeout': 30,
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': (
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-65536;'
+        'PRAGMA temp_store=MEMORY;'
+        'PRAGMA mmap_size=268435456;'
+    ),
+}
+
+if env_config('DB_PROFILE', default='concurrent') == 'concurrent':
+    DATABASES['default']['OPTIONS'] = SQLITE_CONCURRENT_OPTIONS
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+else:
+    SQLITE_JOURNAL_MODE = 'DELETE'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,6 +145,29 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Logging
+# Runner output goes through a queue to a listener thread (see ipo_app/logs.py):
+# LOG_FORMAT=json|console, LOG_LEVEL, LOG_STEP_LEVELS=step=LEVEL,... where step is
+# login or a pipeline step name (asba, select_issue, fill_form, submit, ...)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'runner': {
+            '()': 'ipo_app.logs.QueueLogHandler',
+        },
+    },
+    'loggers': {
+        # Levels are applied per step by the handler's filter
+        'ipo_app': {
+            'handlers': ['runner'],
+            'level': 'DEBUG',
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,3 +1,91 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .jobs import ADMIN_LOOKUPS, enqueue_run
+from .models import Run, Tag, UserAccount
+
+
+class CappedCountPaginator(Paginator):
+    """Counts at most COUNT_LIMIT rows instead of the whole table
+
+    With tens of thousands of accounts an exact COUNT(*) on every changelist
+    page is wasted work; narrow the list with search or filters to reach rows
+    past the cap.
+    """
+    COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list[:self.COUNT_LIMIT].count()
+
+
+def _run_filters(request, queryset):
+    """What the run stores to find its accounts again
+
+    "Select all" over a filtered changelist stores the filters instead of tens
+    of thousands of ids; a page selection (or a filter the job can't replay)
+    stores the ids.
+    """
+    params = set(request.GET) - {"o", "p"}
+    if request.POST.get("select_across") == "1" and params <= set(ADMIN_LOOKUPS) | {"q"}:
+        filters = {"lookups": {key: request.GET[key] for key in params if key in ADMIN_LOOKUPS}}
+        if request.GET.get("q"):
+            filters["search"] = request.GET["q"]
+        return filters, queryset.count()
+    ids = list(queryset.values_list("id", flat=True))
+    return {"account_ids": ids}, len(ids)
+
+
+def _enqueue(modeladmin, request, queryset, kind):
+    filters, count = _run_filters(request, queryset)
+    run = enqueue_run(kind=kind, filters=filters, requested_by=request.user.get_username())
+    modeladmin.message_user(request, f"Queued run {run.pk} ({run.get_kind_display()}) for {count} accounts.", messages.SUCCESS)
+
+
+@admin.action(description="Apply for open issue")
+def apply_for_open_issue(modeladmin, request, queryset):
+    _enqueue(modeladmin, request, queryset, Run.KIND_APPLY)
+
+
+@admin.action(description="Check already applied")
+def check_already_applied(modeladmin, request, queryset):
+    _enqueue(modeladmin, request, queryset, Run.KIND_CHECK_APPLIED)
+
+
+@admin.action(description="Check allotment")
+def check_allotment(modeladmin, request, queryset):
+    _enqueue(modeladmin, request, queryset, Run.KIND_CHECK_ALLOTMENT)
+
+
+@admin.register(UserAccount)
+class UserAccountAdmin(admin.ModelAdmin):
+    list_display = ("name", "username", "boid", "dp_id", "lot_size")
+    list_filter = ("dp_id", "lot_size", "tags")
+    search_fields = ("=boid", "=username", "name")
+    filter_horizontal = ("tags",)
+    actions = [apply_for_open_issue, check_already_applied, check_allotment]
+    list_per_page = 100
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        if obj is None:
+            # Secrets may only be left blank on edit, where blank keeps the stored value
+            for name in ("password", "crn"):
+                if name in form.base_fields:
+                    form.base_fields[name].required = True
+        return form
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    search_fields = ("name",)
+
+
+@admin.register(Run)
+class RunAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "issue", "status", "requested_by", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("kind", "issue", "filters", "status", "requested_by", "message", "created_at", "started_at", "finished_at")
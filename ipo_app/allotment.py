@@ -0,0 +1,131 @@
+# ipo_app/allotment.py
+import json
+import logging
+import re
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+
+from .eligibility import issue_terms
+from .ledger import record_allotment
+from .models import ApplicationRecord, UserAccount
+
+logger = logging.getLogger(__name__)
+
+RESULT_URL = config("ALLOTMENT_RESULT_URL", default="https://iporesult.cdsc.com.np")
+WORKERS = config("ALLOTMENT_WORKERS", default=16, cast=int)
+# "Sorry, not alloted for the entered BOID." (sic); any other refusal is not a result
+NOT_ALLOTTED = re.compile(r"not\s+allott?ed", re.IGNORECASE)
+
+
+class AllotmentChecker:
+    """Looks up allotment results on the CDSC result service
+
+    Lookups run on a bounded thread pool, and results are cached per issue so a
+    BOID is never asked twice, even when several accounts share it.
+    """
+
+    def __init__(self, base_url=RESULT_URL, workers=WORKERS, timeout=15):
+        self.base_url = base_url.rstrip("/")
+        self.workers = workers
+        self.timeout = timeout
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def _request(self, path, payload=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=data,
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode())
+
+    def find_issue(self, issue):
+        """Match an issue name like 'RBB Foo Ltd (RBBF)' against the published result list"""
+        companies = self._request("/result/companyShares/fileUploaded")["body"]["companyShareList"]
+        for term in issue_terms(issue):
+            for company in companies:
+                if term.lower() in (company.get("name", "") + " " + company.get("scrip", "")).lower():
+                    return company
+        raise Exception(f"No published allotment result for '{issue}'")
+
+    def check(self, share_id, boid):
+        """Result for one BOID: {"allotted": bool, "message": str}; raises unless the service gave a verdict"""
+        with self.lock:
+            cached = self.cache.get(share_id, {}).get(boid)
+        if cached is not None:
+            return cached
+
+        response = self._request(
+            "/result/result/check",
+            {"companyShareId": share_id, "boid": boid, "userCaptcha": "", "captchaIdentifier": ""},
+        )
+        message = response.get("message", "")
+        if response.get("success"):
+            result = {"allotted": True, "message": message}
+        elif NOT_ALLOTTED.search(message):
+            result = {"allotted": False, "message": message}
+        else:
+            # captcha rejections, invalid BOIDs, "not applied": ask again later, don't store an answer
+            raise Exception(f"Lookup refused: {message or response}")
+        with self.lock:
+            self.cache.setdefault(share_id, {})[boid] = result
+        return result
+
+    def check_all(self, share_id, boids):
+        """Check every distinct BOID concurrently; failed lookups map to an exception"""
+        distinct = list(dict.fromkeys(boids))
+
+        def lookup(boid):
+            try:
+                return boid, self.check(share_id, boid)
+            except Exception as e:
+                return boid, e
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(pool.map(lookup, distinct))
+
+
+def check_allotment(issue, queryset=None, recheck=False, checker=None):
+    """Check allotment for every BOID in `queryset` and store the outcome in the ledger"""
+    checker = checker or AllotmentChecker()
+    accounts = (queryset if queryset is not None else UserAccount.objects.all()).exclude(boid="")
+
+    # Only accounts the ledger knows applied; the rest have no result to look up
+    applied = ApplicationRecord.objects.filter(issue=issue, status=ApplicationRecord.STATUS_SUBMITTED)
+    if not recheck:
+        applied = applied.filter(allotment="")
+    skipped = accounts.exclude(username__in=applied.values("username")).count()
+    accounts = list(accounts.filter(username__in=applied.values("username")))
+    if skipped:
+        logger.info(f"➖ {skipped} accounts skipped: no submitted application for {issue} in the ledger"
+                    f"{'' if recheck else ' or result already stored'}")
+
+    if not accounts:
+        logger.info(f"✅ Nothing to check for {issue}")
+        return {}
+
+    started = time.monotonic()
+    company = checker.find_issue(issue)
+    logger.info(f"🔍 Checking {len(accounts)} accounts against {company.get('name')}...")
+    results = checker.check_all(company["id"], [account.boid for account in accounts])
+
+    counts = {"allotted": 0, "not_allotted": 0, "errors": 0}
+    for account in accounts:
+        result = results[account.boid]
+        if isinstance(result, Exception):
+            counts["errors"] += 1
+            logger.error(f"❌ {account.name}: lookup failed: {result}")
+            continue
+        record_allotment(account, issue, result["allotted"], result["message"])
+        counts["allotted" if result["allotted"] else "not_allotted"] += 1
+        logger.info(f"{'🎉' if result['allotted'] else '➖'} {account.name}: {result['message']}")
+
+    logger.info(f"🏁 {counts['allotted']} allotted, {counts['not_allotted']} not allotted, "
+                f"{counts['errors']} errors in {time.monotonic() - started:.1f}s")
+    return counts
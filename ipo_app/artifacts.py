@@ -0,0 +1,168 @@
+# ipo_app/artifacts.py
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = config("ARTIFACT_DIR", default="artifacts")
+ARTIFACT_MAX_MB = config("ARTIFACT_MAX_MB", default=500, cast=int)
+
+
+def _slug(value):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(value)).strip("_") or "unknown"
+
+
+class ArtifactStore:
+    """Failure screenshots and DOM snapshots, keyed by run, account and step
+
+    Only grabbing the screenshot and page source touches the browser; hashing,
+    compressing and writing happen on a background thread. Blobs are stored by
+    content hash, so an identical capture is written once, and the least
+    recently used blobs are evicted once the store (blobs plus index files)
+    grows past `max_bytes`, together with the index entries pointing at them.
+    """
+
+    def __init__(self, root=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_MB * 1024 * 1024, run_id="adhoc"):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.max_bytes = max_bytes
+        self.run_id = run_id
+        # One writer thread keeps size accounting and eviction free of races
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifacts")
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.total_bytes = 0
+        self.deduplicated = 0
+        os.makedirs(self.blob_dir, exist_ok=True)
+        for name in os.listdir(self.blob_dir):
+            self.total_bytes += os.path.getsize(os.path.join(self.blob_dir, name))
+        for path in self._index_files():
+            self.total_bytes += os.path.getsize(path)
+
+    def _index_files(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self.root and "blobs" in dirnames:
+                dirnames.remove("blobs")
+            for name in filenames:
+                if name.endswith(".json"):
+                    yield os.path.join(dirpath, name)
+
+    def capture(self, driver, account, step, error="", run_id=None):
+        """Grab the page state and hand it to the writer thread"""
+        try:
+            png = driver.get_screenshot_as_png()
+            html = driver.page_source
+            url = driver.current_url
+        except Exception as e:
+            logger.warning(f"⚠️ Could not capture debug artifacts: {e}")
+            return None
+
+        run_id = run_id or self.run_id
+        with self.lock:
+            key = (run_id, account, step)
+            self.counters[key] = self.counters.get(key, 0) + 1
+            attempt = self.counters[key]
+        return self.executor.submit(self._store, run_id, account, step, attempt, png, html, url, error)
+
+    def _put_blob(self, data, suffix, compress=False):
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.blob_dir, f"{digest}{suffix}")
+        if os.path.exists(path):
+            self.deduplicated += 1
+            os.utime(path)  # refresh LRU position
+            return digest + suffix
+
+        payload = gzip.compress(data) if compress else data
+        with open(path, "wb") as f:
+            f.write(payload)
+        self.total_bytes += len(payload)
+        return digest + suffix
+
+    def _store(self, run_id, account, step, attempt, png, html, url, error):
+        entry = {
+            "run": run_id,
+            "account": account,
+            "step": step,
+            "url": url,
+            "error": error[:1000],
+            "captured_at": time.time(),
+            "screenshot": self._put_blob(png, ".png"),
+            "dom": self._put_blob(html.encode(), ".html.gz", compress=True),
+        }
+        index_dir = os.path.join(self.root, _slug(run_id), _slug(account))
+        os.makedirs(index_dir, exist_ok=True)
+        index_path = os.path.join(index_dir, f"{_slug(step)}-{attempt}.json")
+        with open(index_path, "w") as f:
+            json.dump(entry, f, indent=1)
+        self.total_bytes += os.path.getsize(index_path)
+        self._evict()
+        return entry
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        referenced_by = {}
+        for path in self._index_files():
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for blob in (entry.get("screenshot"), entry.get("dom")):
+                referenced_by.setdefault(blob, []).append(path)
+
+        blobs = sorted(os.listdir(self.blob_dir), key=lambda name: os.path.getmtime(os.path.join(self.blob_dir, name)))
+        for name in blobs:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._remove(os.path.join(self.blob_dir, name))
+            # an entry missing its screenshot or DOM is no use for debugging
+            for index_path in referenced_by.get(name, []):
+                if os.path.exists(index_path):
+                    self._remove(index_path)
+                    self._prune(os.path.dirname(index_path))
+
+    def _remove(self, path):
+        self.total_bytes -= os.path.getsize(path)
+        os.remove(path)
+
+    def _prune(self, directory):
+        """Drop run/account directories left empty by eviction"""
+        while os.path.abspath(directory) != os.path.abspath(self.root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def flush(self):
+        """Wait for queued captures to be written"""
+        self.executor.submit(lambda: None).result()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """Process-wide artifact store shared by every runner in the process"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
+
+
+def capture_failure(driver, acc, step, error=""):
+    """Capture debug artifacts for a failed step without blocking the worker"""
+    get_artifact_store().capture(driver, acc.get("name") or acc.get("username"), step, error, acc.get("run_id"))
+    logger.info(f"📸 Debug artifacts queued for {step}")
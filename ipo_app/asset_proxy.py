@@ -0,0 +1,389 @@
+# ipo_app/asset_proxy.py
+import base64
+import datetime
+import hashlib
+import http.client
+import json
+import logging
+import os
+import re
+import select
+import socket
+import ssl
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from decouple import config, Csv
+
+from .metrics import ASSET_BYTES_SAVED, ASSET_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+PROXY_CACHE_DIR = config("ASSET_PROXY_DIR", default="proxy_cache")
+PROXY_CACHE_MB = config("ASSET_PROXY_MAX_MB", default=200, cast=int)
+INTERCEPT_HOSTS = config("ASSET_PROXY_HOSTS", default="meroshare.cdsc.com.np", cast=Csv())
+
+# Angular build output: content-hashed bundles plus the assets folder (fonts, images)
+IMMUTABLE_PATH = re.compile(
+    r"(\.[0-9a-f]{8,}\.(js|css|woff2?|ttf|eot|svg|png|jpe?g|gif|ico)$)|(^/assets/.+\.(woff2?|ttf|eot|svg|png|jpe?g|gif|ico)$)"
+)
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+              "transfer-encoding", "upgrade", "proxy-connection", "content-length"}
+
+
+def is_cacheable(method, host, path):
+    return method == "GET" and host in INTERCEPT_HOSTS and bool(IMMUTABLE_PATH.search(urlsplit(path).path))
+
+
+class AssetCache:
+    """Disk cache of static responses shared by every proxy (and process) using `directory`
+
+    Each entry is <sha256 of URL>.body plus a .json with status and headers,
+    written through a temp file so readers never see half an entry. Past
+    `max_bytes` the least recently served entries are evicted.
+    """
+
+    def __init__(self, directory=PROXY_CACHE_DIR, max_bytes=PROXY_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "passthrough": 0, "bytes_saved": 0, "bytes_fetched": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, suffix):
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + suffix)
+
+    def get(self, url):
+        try:
+            with open(self._path(url, ".json")) as f:
+                meta = json.load(f)
+            with open(self._path(url, ".body"), "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        os.utime(self._path(url, ".body"))  # refresh LRU position
+        return meta["status"], meta["headers"], body
+
+    def _write(self, path, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def put(self, url, status, headers, body):
+        self._write(self._path(url, ".body"), body)
+        self._write(self._path(url, ".json"), json.dumps({"url": url, "status": status, "headers": headers}).encode())
+        self._evict()
+
+    def _evict(self):
+        with self.lock:
+            bodies = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".body")]
+            total = sum(entry.stat().st_size for entry in bodies)
+            if total <= self.max_bytes:
+                return
+            for entry in sorted(bodies, key=lambda entry: entry.stat().st_mtime):
+                if total <= self.max_bytes:
+                    break
+                total -= entry.stat().st_size
+                for path in (entry.path, entry.path[:-len(".body")] + ".json"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def count(self, **deltas):
+        with self.lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+        for result in ("hits", "misses", "passthrough"):
+            if deltas.get(result):
+                ASSET_REQUESTS.inc(deltas[result], result=result)
+        if deltas.get("bytes_saved"):
+            ASSET_BYTES_SAVED.inc(deltas["bytes_saved"])
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+
+
+class CertificateAuthority:
+    """Local CA that signs certificates for the intercepted hosts only
+
+    The CA and leaf keys stay in the cache directory. Chrome is not asked to
+    trust the CA system-wide or to skip validation: it is started with the
+    SPKI hashes of these two keys (spki_hashes), so only certificates made
+    here are accepted and every other host is validated as usual. All leaf
+    certificates share one stable key, so the hashes survive new hosts and
+    restarts.
+    """
+
+    def __init__(self, directory=PROXY_CACHE_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.contexts = {}
+        self.key, self.cert = self._load_or_create()
+        self.leaf_key = self._load_or_create_key("leaf-key.pem")
+
+    def _load_or_create_key(self, filename):
+        path = os.path.join(self.directory, filename)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return serialization.load_pem_private_key(f.read(), password=None)
+        key = ec.generate_private_key(ec.SECP256R1())
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+        return key
+
+    def _load_or_create(self):
+        key = self._load_or_create_key("ca-key.pem")
+        cert_path = os.path.join(self.directory, "ca-cert.pem")
+        if os.path.exists(cert_path):
+            with open(cert_path, "rb") as f:
+                cert = x509.load_pem_x509_certificate(f.read())
+            if cert.public_key() == key.public_key():
+                return key, cert
+
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "IPO runner asset proxy CA")])
+        cert = self._build(name, name, key.public_key(), key, ca=True)
+        with open(cert_path, "wb") as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        return key, cert
+
+    def spki_hashes(self):
+        """base64 SHA-256 of the CA's and the leaf key's SubjectPublicKeyInfo, for --ignore-certificate-errors-spki-list"""
+        return [
+            base64.b64encode(hashlib.sha256(key.public_key().public_bytes(
+                serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)).digest()).decode()
+            for key in (self.key, self.leaf_key)
+        ]
+
+    def _build(self, subject, issuer, public_key, signing_key, ca=False, host=None):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        builder = (
+            x509.CertificateBuilder()
+            .subject_name(subject)
+            .issuer_name(issuer)
+            .public_key(public_key)
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=365))
+            .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True)
+        )
+        if host:
+            builder = builder.add_extension(x509.SubjectAlternativeName([x509.DNSName(host)]), critical=False)
+        return builder.sign(signing_key, hashes.SHA256())
+
+    def server_context(self, host):
+        """TLS context presenting a certificate for `host`, signed by this CA"""
+        with self.lock:
+            if host not in self.contexts:
+                subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, host)])
+                cert = self._build(subject, self.cert.subject, self.leaf_key.public_key(), self.key, host=host)
+                cert_path = os.path.join(self.directory, f"{host}-cert.pem")
+                with open(cert_path, "wb") as f:
+                    f.write(cert.public_bytes(serialization.Encoding.PEM))
+                    f.write(self.cert.public_bytes(serialization.Encoding.PEM))
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+                context.set_alpn_protocols(["http/1.1"])
+                context.load_cert_chain(cert_path, os.path.join(self.directory, "leaf-key.pem"))
+                self.contexts[host] = context
+            return self.contexts[host]
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # set on the per-server subclass
+    cache = None
+    ca = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # CONNECT: intercept the MeroShare host, tunnel everything else untouched
+    def do_CONNECT(self):
+        host, _, port = self.path.partition(":")
+        port = int(port or 443)
+        if host in INTERCEPT_HOSTS and self.ca:
+            self.send_response(200, "Connection established")
+            self.end_headers()
+            self.connection = self.ca.server_context(host).wrap_socket(self.connection, server_side=True)
+            self.rfile = self.connection.makefile("rb", self.rbufsize)
+            self.wfile = self.connection.makefile("wb", 0)
+            self.origin = ("https", host, port)
+            self.close_connection = False
+            while not self.close_connection:
+                self.handle_one_request()
+            return
+        self.tunnel(host, port)
+
+    def tunnel(self, host, port):
+        try:
+            upstream = socket.create_connection((host, port), timeout=30)
+        except OSError as e:
+            self.send_error(502, str(e))
+            return
+        self.send_response(200, "Connection established")
+        self.end_headers()
+        self.cache.count(passthrough=1)
+        sockets = [self.connection, upstream]
+        try:
+            while True:
+                readable, _, errored = select.select(sockets, [], sockets, 60)
+                if errored or not readable:
+                    break
+                for sock in readable:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    (upstream if sock is self.connection else self.connection).sendall(data)
+        except OSError:
+            pass
+        finally:
+            upstream.close()
+            self.close_connection = True
+
+    def _target(self):
+        """(scheme, host, port, path) for both absolute-form (plain HTTP) and intercepted requests"""
+        if getattr(self, "origin", None):
+            scheme, host, port = self.origin
+            return scheme, host, port, self.path
+        parts = urlsplit(self.path)
+        return parts.scheme, parts.hostname, parts.port or 80, (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+    def _forward(self):
+        scheme, host, port, path = self._target()
+        url = f"{scheme}://{host}{path}"
+        cacheable = is_cacheable(self.command, host, path)
+
+        if cacheable:
+            cached = self.cache.get(url)
+            if cached:
+                status, headers, body = cached
+                self.cache.count(hits=1, bytes_saved=len(body))
+                self._respond(status, headers, body, "HIT")
+                return
+            self.cache.count(misses=1)
+        else:
+            self.cache.count(passthrough=1)
+
+        length = int(self.headers.get("Content-Length") or 0)
+        request_body = self.rfile.read(length) if length else None
+        headers = {key: value for key, value in self.headers.items() if key.lower() not in HOP_BY_HOP}
+        connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        upstream = connection_class(host, port, timeout=30)
+        try:
+            upstream.request(self.command, path, body=request_body, headers=headers)
+            response = upstream.getresponse()
+            body = response.read()
+            response_headers = [(key, value) for key, value in response.getheaders() if key.lower() not in HOP_BY_HOP]
+        except OSError as e:
+            self.send_error(502, str(e))
+            return
+        finally:
+            upstream.close()
+
+        self.cache.count(bytes_fetched=len(body))
+        if cacheable and response.status == 200 and "no-store" not in (response.getheader("Cache-Control") or ""):
+            self.cache.put(url, response.status, response_headers, body)
+        self._respond(response.status, response_headers, body, "MISS" if cacheable else None)
+
+    def _respond(self, status, headers, body, cache_status):
+        self.send_response(status)
+        for key, value in headers:
+            self.send_header(key, value)
+        if cache_status:
+            self.send_header("X-Cache", cache_status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    do_GET = do_HEAD = do_POST = do_PUT = do_DELETE = do_OPTIONS = do_PATCH = _forward
+
+
+class AssetProxy:
+    """Local forward proxy the browser engines are pointed at
+
+    Static MeroShare assets (hashed bundles, fonts, images) are served from the
+    shared AssetCache after the first download; everything else, including the
+    whole API host, passes straight through.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, cache=None, intercept_tls=True):
+        self.cache = cache or AssetCache()
+        self.ca = CertificateAuthority(self.cache.directory) if intercept_tls else None
+        handler = type("BoundProxyHandler", (ProxyHandler,), {"cache": self.cache, "ca": self.ca})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="asset-proxy", daemon=True)
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        logger.info(f"🗄️ Asset proxy listening on {self.address} (cache {self.cache.directory})")
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+_enabled = config("ASSET_PROXY", default=False, cast=bool)
+_proxy = None
+_proxy_lock = threading.Lock()
+
+
+def enable_asset_proxy():
+    """Turn the proxy on for this process (applyingipo --asset-proxy) and start it"""
+    global _enabled
+    _enabled = True
+    return get_asset_proxy()
+
+
+def get_asset_proxy():
+    """Process-wide proxy, started on first use when ASSET_PROXY is on; None otherwise"""
+    global _proxy
+    if not _enabled:
+        return None
+    with _proxy_lock:
+        if _proxy is None:
+            _proxy = AssetProxy().start()
+        return _proxy
+
+
+def use_asset_proxy(options):
+    """Point a ChromeOptions at the asset proxy, if it is enabled"""
+    proxy = get_asset_proxy()
+    if proxy:
+        options.add_argument(f"--proxy-server=http://{proxy.address}")
+        if proxy.ca:
+            # Accept the proxy's certificates only; honoured because chromedriver always passes --user-data-dir
+            options.add_argument(f"--ignore-certificate-errors-spki-list={','.join(proxy.ca.spki_hashes())}")
+    return options
+
+
+def proxy_snapshot():
+    """Counters at the start of a run, for proxy_stats_since(); None when the proxy is off"""
+    proxy = get_asset_proxy()
+    return proxy.cache.snapshot() if proxy else None
+
+
+def proxy_stats_since(before):
+    """Hit/miss/bytes deltas since a snapshot, i.e. for one run"""
+    proxy = get_asset_proxy()
+    if not proxy or before is None:
+        return None
+    now = proxy.cache.snapshot()
+    return {key: now[key] - before.get(key, 0) for key in now}
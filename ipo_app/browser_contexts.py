@@ -0,0 +1,105 @@
+# ipo_app/browser_contexts.py
+import threading
+
+from decouple import config
+from selenium import webdriver
+from selenium.webdriver.chrome.webdriver import WebDriver as ChromeDriver
+from selenium.webdriver.remote.switch_to import SwitchTo
+
+from .asset_proxy import use_asset_proxy
+
+
+def create_shared_chrome():
+    """Chrome for hosting many contexts; background tabs must not be throttled"""
+    options = webdriver.ChromeOptions()
+    if config("CONTEXT_HEADLESS", default=True, cast=bool):
+        options.add_argument("--headless=new")
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+    options.add_argument("--disable-renderer-backgrounding")
+    use_asset_proxy(options)
+    return webdriver.Chrome(options=options)
+
+
+class ContextDriver(ChromeDriver):
+    """Driver handle for one isolated browser context inside a shared Chrome
+
+    It shares the engine's WebDriver session and behaves like a normal driver,
+    so the step functions in tasks.py run against it unchanged. Every command
+    first switches the session to this context's tab, under the engine lock.
+    Elements found through the handle belong to it, so their clicks and
+    send_keys are routed the same way. quit() disposes only this context:
+    its cookies, storage and cache go with it.
+    """
+
+    def __init__(self, engine, context_id, handle):
+        # Deliberately skips WebDriver.__init__: no new session, reuse the engine's
+        self.__dict__.update(engine.driver.__dict__)
+        self._switch_to = SwitchTo(self)
+        self.engine = engine
+        self.context_id = context_id
+        self.handle = handle
+
+    def execute(self, driver_command, params=None):
+        with self.engine.lock:
+            self.engine.activate(self.handle)
+            return super().execute(driver_command, params)
+
+    def close(self):
+        self.quit()
+
+    def quit(self):
+        self.engine.dispose(self)
+
+    def __repr__(self):
+        return f"<ContextDriver {self.context_id}>"
+
+
+class ContextEngine:
+    """One Chrome process hosting a separate incognito-style context per account
+
+    Contexts are created with CDP Target.createBrowserContext, so each account
+    gets its own cookie jar and storage, while the browser process, GPU process
+    and shared caches are paid once. Commands from all contexts go through one
+    WebDriver session, so they are serialised; the time a browser step spends
+    is dominated by page loads and sleeps, not by the command round trips.
+    """
+
+    def __init__(self, factory=create_shared_chrome):
+        self.driver = factory()
+        self.home = self.driver.current_window_handle  # never closed, keeps the session alive
+        self.current = self.home
+        self.lock = threading.RLock()
+        self.contexts = {}
+
+    def activate(self, handle):
+        if self.current != handle:
+            self.driver.switch_to.window(handle)
+            self.current = handle
+
+    def new_context(self, url="about:blank"):
+        """Open a fresh context with one tab and return a driver handle for it"""
+        with self.lock:
+            self.activate(self.home)
+            before = set(self.driver.window_handles)
+            context_id = self.driver.execute_cdp_cmd(
+                "Target.createBrowserContext", {"disposeOnDetach": False})["browserContextId"]
+            target_id = self.driver.execute_cdp_cmd(
+                "Target.createTarget", {"url": url, "browserContextId": context_id})["targetId"]
+            created = set(self.driver.window_handles) - before
+            handle = target_id if target_id in created else created.pop()
+            context = ContextDriver(self, context_id, handle)
+            self.contexts[context_id] = context
+            return context
+
+    def dispose(self, context):
+        with self.lock:
+            if self.contexts.pop(context.context_id, None) is None:
+                return
+            self.activate(self.home)
+            self.driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": context.context_id})
+
+    def close(self):
+        with self.lock:
+            self.contexts.clear()
+            self.driver.quit()
@@ -0,0 +1,146 @@
+# ipo_app/browser_pool.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from decouple import config
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+logger = logging.getLogger(__name__)
+
+LOGIN_URL = "https://meroshare.cdsc.com.np/#/login"
+BORROW_TIMEOUT = config("POOL_BORROW_TIMEOUT", default=300, cast=float)
+SPAWN_ATTEMPTS = 3
+
+
+def park_on_login(driver):
+    """Load the login page so the Angular bundles are cached and the form is ready"""
+    driver.get(LOGIN_URL)
+    WebDriverWait(driver, 30).until(
+        EC.presence_of_element_located((By.ID, "username"))
+    )
+
+
+def reset_browser(driver):
+    """Drop the previous account's session and park the browser on the login page again"""
+    driver.delete_all_cookies()
+    driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+    park_on_login(driver)
+
+
+class BrowserPool:
+    """Pre-spawned Chrome instances parked on the MeroShare login page
+
+    Browsers are started before the run (ideally before the issue opens), so the
+    launch and first page load are not paid when latency matters. A returned
+    browser is reset in the background and goes back into the pool; a browser
+    that cannot be reset is replaced with a fresh one. A slot whose replacement
+    cannot be started after SPAWN_ATTEMPTS tries is marked dead.
+    """
+
+    def __init__(self, size, factory, retry_delay=5.0):
+        self.size = size
+        self.factory = factory
+        self.retry_delay = retry_delay
+        self.idle = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, size), thread_name_prefix="browser-pool")
+        self.all_drivers = set()
+        self.dead = 0
+        self.lock = threading.Lock()
+
+    def _spawn(self):
+        driver = self.factory()
+        with self.lock:
+            self.all_drivers.add(driver)
+        try:
+            park_on_login(driver)
+        except Exception:
+            self.discard(driver)
+            raise
+        self.idle.put(driver)
+        return driver
+
+    def _respawn(self):
+        """Fill a slot again, retrying; runs on the executor, so failures are logged rather than raised"""
+        for attempt in range(1, SPAWN_ATTEMPTS + 1):
+            try:
+                return self._spawn()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not start a browser (attempt {attempt}/{SPAWN_ATTEMPTS}): {e}")
+                if attempt < SPAWN_ATTEMPTS:
+                    time.sleep(self.retry_delay * attempt)
+        with self.lock:
+            self.dead += 1
+        logger.error(f"❌ Browser slot lost; {self.size - self.dead}/{self.size} slots left")
+
+    def start(self, wait=True):
+        """Launch every browser; with wait=True block until all are parked"""
+        logger.info(f"🔥 Warming {self.size} browsers on the login page...")
+        futures = [self.executor.submit(self._respawn) for _ in range(self.size)]
+        if wait:
+            for future in futures:
+                future.result()
+            if self.dead >= self.size:
+                raise Exception("Could not start any browser for the pool")
+            logger.info(f"✅ {self.size - self.dead} browsers warm and parked")
+
+    def borrow(self, timeout=BORROW_TIMEOUT):
+        """Take an idle browser, waiting at most `timeout` seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.dead >= self.size:
+                raise Exception("Browser pool has no working browsers left")
+            try:
+                # wake up every second so a slot dying meanwhile is noticed
+                return self.idle.get(timeout=max(0, min(1.0, deadline - time.monotonic())))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    raise Exception(f"No browser available after {timeout:.0f}s")
+
+    def _recycle(self, driver):
+        try:
+            reset_browser(driver)
+            self.idle.put(driver)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not reset browser, replacing it: {e}")
+            self._replace(driver)
+
+    def _replace(self, driver):
+        self.discard(driver)
+        self._respawn()
+
+    def release(self, driver, recycle=False):
+        """Hand a browser back; the reset (or replacement when recycle=True) happens off the caller's thread"""
+        self.executor.submit(self._replace if recycle else self._recycle, driver)
+
+    def discard(self, driver):
+        with self.lock:
+            self.all_drivers.discard(driver)
+        try:
+            driver.quit()
+        except:
+            pass
+
+    @contextmanager
+    def browser(self, timeout=BORROW_TIMEOUT):
+        driver = self.borrow(timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            drivers = list(self.all_drivers)
+            self.all_drivers.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except:
+                pass
@@ -0,0 +1,156 @@
+# ipo_app/circuit_breaker.py
+import logging
+import threading
+import time
+import urllib.request
+
+from decouple import config
+
+from .metrics import BREAKER_OPEN
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_URL = config("HEALTH_PROBE_URL", default="https://webbackend.cdsc.com.np/api/meroShare/capital/")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def probe_site(url=HEALTH_PROBE_URL, timeout=5):
+    """Cheap health check: the DP list the login page loads first must come back"""
+    try:
+        request = urllib.request.Request(url, headers={"Accept": "application/json"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status == 200 and bool(response.read(64))
+    except Exception as e:
+        logger.debug(f"Health probe failed: {e}")
+        return False
+
+
+class CircuitBreaker:
+    """Stops every worker from timing out one by one while MeroShare is down
+
+    Closed: accounts run normally. After `failure_threshold` consecutive failed
+    accounts the site is probed; if the probe fails too the breaker opens (if it
+    passes, the failures were account-specific and the count resets). Open:
+    workers block in wait_until_closed() and one of them probes, backing off
+    from `probe_interval` to `max_probe_interval`. Half-open: the site answers
+    again, so a single trial account goes through; its success closes the
+    breaker and releases the queue, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, probe_interval=10.0, max_probe_interval=120.0,
+                 probe=probe_site, clock=time.monotonic, sleep=time.sleep):
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.probe = probe
+        self.clock = clock
+        self.sleep = sleep
+
+        self.cond = threading.Condition()
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+        self.trial_running = False
+        self.transitions = []
+
+    def _transition(self, state, reason):
+        if state == self.state:
+            return
+        self.transitions.append({"at": self.clock(), "from": self.state, "to": state, "reason": reason})
+        (logger.warning if state == OPEN else logger.info)(f"🔌 Circuit breaker {self.state} → {state}: {reason}")
+        self.state = state
+        BREAKER_OPEN.set(0 if state == CLOSED else 1)
+        self.cond.notify_all()
+
+    def record_success(self):
+        with self.cond:
+            self.failures = 0
+            self.trial_running = False
+            if self.state != CLOSED:
+                self._transition(CLOSED, "trial account succeeded")
+
+    def record_failure(self, reason=""):
+        with self.cond:
+            if self.state == HALF_OPEN:
+                self.trial_running = False
+                self._transition(OPEN, f"trial account failed: {reason[:100]}")
+                return
+            if self.state == OPEN:
+                return
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return
+
+        healthy = self.probe()
+        with self.cond:
+            if self.state != CLOSED:
+                return
+            if healthy:
+                logger.info(f"🔌 {self.failures} failures in a row but the site answers; not opening")
+                self.failures = 0
+            else:
+                self._transition(OPEN, f"{self.failures} consecutive failures and the health probe failed")
+
+    def release_trial(self):
+        """Give the half-open trial slot back without a verdict (e.g. the account was never tried)"""
+        with self.cond:
+            if self.trial_running:
+                self.trial_running = False
+                self.cond.notify_all()
+
+    def wait_until_closed(self):
+        """Block while the breaker is open; returns when this worker may process an account"""
+        while True:
+            with self.cond:
+                while True:
+                    if self.state == CLOSED:
+                        return
+                    if self.state == HALF_OPEN and not self.trial_running:
+                        self.trial_running = True
+                        return
+                    if self.state == OPEN and not self.probing:
+                        self.probing = True
+                        break
+                    self.cond.wait(timeout=1.0)
+
+            interval = self.probe_interval
+            recovered = False
+            try:
+                while not self.probe():
+                    logger.info(f"⏸️ MeroShare still unavailable, next probe in {interval:.0f}s")
+                    self.sleep(interval)
+                    interval = min(interval * 2, self.max_probe_interval)
+                recovered = True
+            finally:
+                with self.cond:
+                    self.probing = False
+                    if recovered and self.state == OPEN:
+                        self._transition(HALF_OPEN, "health probe succeeded")
+                    self.cond.notify_all()
+
+    def is_open(self):
+        return self.state != CLOSED
+
+    def transitions_since(self, started):
+        with self.cond:
+            return [t for t in self.transitions if t["at"] >= started]
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker():
+    """Process-wide breaker shared by every worker thread"""
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                failure_threshold=config("CIRCUIT_FAILURE_THRESHOLD", default=5, cast=int),
+                probe_interval=config("CIRCUIT_PROBE_INTERVAL", default=10, cast=float),
+                max_probe_interval=config("CIRCUIT_MAX_PROBE_INTERVAL", default=120, cast=float),
+            )
+        return _breaker
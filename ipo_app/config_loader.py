@@ -1,38 +1,141 @@
 # ipo_app/config_loader.py
-from decouple import config
-from cryptography.fernet import Fernet
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from decouple import config, RepositoryEnv, UndefinedValueError
+from cryptography.fernet import Fernet, InvalidToken
+
+ENV_FILE = Path(__file__).resolve().parent.parent / ".env"
+SECRET_FIELDS = ("password", "crn", "pin")
+
+# Below this many accounts a process pool costs more to start than it saves
+PARALLEL_DECRYPT_MIN = config("PARALLEL_DECRYPT_MIN", default=500, cast=int)
+DECRYPT_CHUNK = 2000
+
+_fernet = None
+
+
+def fernet_key():
+    try:
+        return config("FERNET_KEY").encode()
+    except UndefinedValueError:
+        raise Exception("FERNET_KEY is not set; it is needed to decrypt account secrets")
+
+
+def get_fernet():
+    global _fernet
+    if _fernet is None:
+        _fernet = Fernet(fernet_key())
+    return _fernet
 
-FERNET_KEY = config("FERNET_KEY")
-fernet = Fernet(FERNET_KEY.encode())
 
 def decrypt(value):
-    return fernet.decrypt(value.encode()).decode()
+    try:
+        return get_fernet().decrypt(value.encode()).decode()
+    except InvalidToken:
+        raise Exception("Could not decrypt an account secret; was it encrypted with this FERNET_KEY?")
 
-def load_accounts():
+
+def is_sealed(value):
+    """Fernet tokens start with the version byte 0x80, i.e. 'gAAAAA' in base64"""
+    return isinstance(value, str) and value.startswith("gAAAAA")
+
+
+def read_env():
+    """Read .env once and overlay the process environment, as decouple does"""
+    env = dict(RepositoryEnv(str(ENV_FILE)).data) if ENV_FILE.exists() else {}
+    env.update(os.environ)
+    return env
+
+
+def load_encrypted_accounts(env=None):
+    """All ACC{i}_* rows in one pass over the environment; secrets stay encrypted
+
+    Name, DP, username and password are required; the first account missing
+    one ends the roster.
+    """
+    env = read_env() if env is None else env
     accounts = []
     i = 1
-    while True:
-        try:
-            name = config(f"ACC{i}_NAME")
-            dp_id = config(f"ACC{i}_DP_ID")
-            boid = config(f"ACC{i}_BOID")
-            username = config(f"ACC{i}_USERNAME")
-            password = decrypt(config(f"ACC{i}_PASSWORD"))
-            crn = decrypt(config(f"ACC{i}_CRN"))
-            pin = decrypt(config(f"ACC{i}_PIN"))
-            lot_size = config(f"ACC{i}_LOT", cast=int)
-
-            accounts.append({
-                "name": name,
-                "dp_id": dp_id,
-                "boid": boid,
-                "username": username,
-                "password": password,
-                "crn": crn,
-                "pin": pin,
-                "lot_size": lot_size,
-            })
-            i += 1
-        except Exception:
-            break
+    while all(env.get(f"ACC{i}_{key}") for key in ("NAME", "DP_ID", "USERNAME", "PASSWORD")):
+        accounts.append({
+            "name": env[f"ACC{i}_NAME"],
+            "dp_id": env[f"ACC{i}_DP_ID"],
+            "boid": env.get(f"ACC{i}_BOID", ""),
+            "username": env[f"ACC{i}_USERNAME"],
+            "password": env[f"ACC{i}_PASSWORD"],
+            "crn": env.get(f"ACC{i}_CRN"),
+            "pin": env.get(f"ACC{i}_PIN"),
+            "lot": env.get(f"ACC{i}_LOT"),
+            "district": env.get(f"ACC{i}_DISTRICT", ""),
+            "foreign_employment": env.get(f"ACC{i}_FOREIGN_EMPLOYMENT", "").lower() in ("1", "true", "yes", "on"),
+            "priority": int(env.get(f"ACC{i}_PRIORITY") or 0),
+        })
+        i += 1
     return accounts
+
+
+def _decrypt_chunk(key, tokens):
+    fernet = Fernet(key)
+    return [fernet.decrypt(token.encode()).decode() if is_sealed(token) else token for token in tokens]
+
+
+def decrypt_accounts(accounts, key=None, parallel_min=PARALLEL_DECRYPT_MIN, processes=None):
+    """Return copies of `accounts` with secrets decrypted, for bulk jobs that need every account at once
+
+    Every secret is decrypted in one batch; large rosters are split across
+    `processes` worker processes (default one per CPU, serial on one CPU).
+    The runner does not use this: it decrypts each account in its worker
+    with unsealed().
+    """
+    key = key or fernet_key()
+    tokens = [acc[field] for acc in accounts for field in SECRET_FIELDS]
+    processes = processes or os.cpu_count() or 1
+
+    if len(accounts) < parallel_min or processes == 1:
+        plaintext = _decrypt_chunk(key, tokens)
+    else:
+        chunks = [tokens[i:i + DECRYPT_CHUNK] for i in range(0, len(tokens), DECRYPT_CHUNK)]
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            plaintext = [value for chunk in pool.map(_decrypt_chunk, [key] * len(chunks), chunks) for value in chunk]
+
+    decrypted = []
+    values = iter(plaintext)
+    for acc in accounts:
+        copy = dict(acc)
+        for field in SECRET_FIELDS:
+            copy[field] = next(values)
+        decrypted.append(copy)
+    return decrypted
+
+
+def decrypt_account(acc):
+    """Copy of one account with its secrets decrypted; plaintext .env values pass through"""
+    copy = dict(acc)
+    for field in SECRET_FIELDS:
+        if is_sealed(copy.get(field)):
+            copy[field] = decrypt(copy[field])
+    return copy
+
+
+def forget_secrets(acc):
+    """Drop an account's plaintext secrets once the worker is done with it"""
+    for field in SECRET_FIELDS:
+        acc.pop(field, None)
+
+
+@contextmanager
+def unsealed(acc):
+    """The account with plaintext secrets, for as long as the worker processing it runs"""
+    plain = decrypt_account(acc)
+    try:
+        yield plain
+    finally:
+        forget_secrets(plain)
+
+
+def load_accounts():
+    """The .env roster with secrets still encrypted; workers decrypt one account at a time"""
+    return load_encrypted_accounts()
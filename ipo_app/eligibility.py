@@ -0,0 +1,90 @@
+# ipo_app/eligibility.py
+import logging
+from decouple import config, Csv
+
+logger = logging.getLogger(__name__)
+
+ORDINARY = "ordinary"
+FOREIGN_EMPLOYMENT = "foreign_employment"
+LOCAL = "local"
+
+
+def load_open_issues():
+    """Parameters of the issue(s) being applied for, from .env"""
+    return [{
+        "name": config("APPLY_IPO", default=""),
+        "share_type": config("ISSUE_SHARE_TYPE", default=ORDINARY),
+        "min_unit": config("ISSUE_MIN_UNIT", default=10, cast=int),
+        "max_unit": config("ISSUE_MAX_UNIT", default=0, cast=int),  # 0 means no cap
+        "unit_step": config("ISSUE_UNIT_STEP", default=10, cast=int),
+        "local_districts": [d.lower() for d in config("ISSUE_LOCAL_DISTRICTS", default="", cast=Csv())],
+    }]
+
+
+def issue_terms(name):
+    """Ways an issue like 'RBB Foo Ltd (RBBF)' shows up on MeroShare: full name, company and scrip"""
+    terms = [name]
+    if "(" in name and ")" in name:
+        terms += [name.split("(")[0].strip(), name.split("(")[1].split(")")[0].strip()]
+    return [term for term in terms if term]
+
+
+def requested_kitta(acc, issue):
+    """Kitta the account asks for, clamped to the issue's cap and rounded down to its unit step"""
+    try:
+        kitta = int(acc.get("lot") or issue["min_unit"])
+    except (TypeError, ValueError):
+        return 0
+    if issue["max_unit"]:
+        kitta = min(kitta, issue["max_unit"])
+    if issue["unit_step"] > 1:
+        kitta -= kitta % issue["unit_step"]
+    return kitta
+
+
+# (rule name, predicate, reason shown when the predicate is False)
+RULES = [
+    ("has_credentials",
+     lambda acc, issue: all(acc.get(key) for key in ("dp_id", "username", "password")),
+     "DP, username or password missing"),
+    ("has_crn_and_pin",
+     lambda acc, issue: bool(acc.get("crn")) and bool(acc.get("pin")),
+     "CRN or PIN missing"),
+    ("foreign_employment_quota",
+     lambda acc, issue: issue["share_type"] != FOREIGN_EMPLOYMENT or acc.get("foreign_employment"),
+     "foreign-employment quota is reserved for migrant workers"),
+    ("local_quota",
+     lambda acc, issue: issue["share_type"] != LOCAL
+     or (acc.get("district") or "").lower() in issue["local_districts"],
+     "local quota is limited to the issue's project districts"),
+    ("minimum_unit",
+     lambda acc, issue: requested_kitta(acc, issue) >= issue["min_unit"],
+     "kitta is below the issue's minimum unit"),
+]
+
+
+def evaluate(accounts, issues, rules=RULES):
+    """Check every account against every issue in one pass, before any browser work
+
+    Returns (plan, ineligible): plan holds account dicts ready to submit, with
+    "issue" set and "lot" replaced by the computed kitta; ineligible lists
+    (account, issue name, reasons) for everything that failed a rule.
+    """
+    plan = []
+    ineligible = []
+    for issue in issues:
+        for acc in accounts:
+            reasons = [reason for name, check, reason in rules if not check(acc, issue)]
+            if reasons:
+                ineligible.append((acc, issue["name"], reasons))
+            else:
+                plan.append(dict(acc, issue=issue["name"], lot=str(requested_kitta(acc, issue))))
+    return plan, ineligible
+
+
+def print_ineligible(ineligible):
+    if not ineligible:
+        return
+    logger.info(f"🚫 {len(ineligible)} account/issue pairs skipped before opening Chrome:")
+    for acc, issue_name, reasons in ineligible:
+        logger.info(f"  - {acc['name']} ({issue_name}): {'; '.join(reasons)}")
@@ -0,0 +1,79 @@
+# ipo_app/events.py
+import asyncio
+import threading
+import time
+from collections import deque
+
+from decouple import config
+
+EVENT_BUFFER = config("EVENT_BUFFER", default=1000, cast=int)
+EVENT_HISTORY = config("EVENT_HISTORY", default=500, cast=int)
+
+
+class Subscription:
+    """Bounded per-client buffer; when a client falls behind the oldest events are dropped"""
+
+    def __init__(self, loop, run_id=None, size=EVENT_BUFFER):
+        self.loop = loop
+        self.run_id = run_id
+        self.events = deque(maxlen=size)
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.ready = asyncio.Event()
+
+    def push(self, event):
+        if self.run_id and event.get("run") != self.run_id:
+            return
+        with self.lock:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:  # client's event loop already closed
+            pass
+
+    def drain(self):
+        with self.lock:
+            events = list(self.events)
+            self.events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+
+class EventBus:
+    """In-process pub/sub from runner threads to SSE clients; publishing never blocks"""
+
+    def __init__(self, history=EVENT_HISTORY):
+        self.subscribers = set()
+        self.history = deque(maxlen=history)
+        self.lock = threading.Lock()
+
+    def publish(self, **event):
+        event.setdefault("ts", time.time())
+        with self.lock:
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.push(event)
+
+    def subscribe(self, run_id=None):
+        """Subscribe from inside a running event loop; recent events are replayed first"""
+        subscription = Subscription(asyncio.get_running_loop(), run_id)
+        with self.lock:
+            for event in self.history:
+                subscription.push(event)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+
+bus = EventBus()
+
+
+def publish_step(acc, step, status, **fields):
+    """Per-account step event from the runner"""
+    bus.publish(run=acc.get("run_id"), account=acc.get("name"), step=step, status=status, **fields)
@@ -0,0 +1,96 @@
+# ipo_app/fields.py
+from django import forms
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from .config_loader import get_fernet
+
+
+class EncryptedValue:
+    """Fernet token loaded from the database and not decrypted yet"""
+    __slots__ = ("token",)
+
+    def __init__(self, token):
+        self.token = token
+
+    def reveal(self):
+        return get_fernet().decrypt(self.token.encode()).decode()
+
+    def __repr__(self):
+        return "<encrypted>"
+
+
+def sealed_value(instance, attname):
+    """An encrypted field's value without decrypting it: the stored token, or whatever was assigned since"""
+    if attname not in instance.__dict__:
+        instance.refresh_from_db(fields=[attname])
+    value = instance.__dict__[attname]
+    return value.token if isinstance(value, EncryptedValue) else value
+
+
+class DecryptOnAccess(DeferredAttribute):
+    """Decrypts the stored token the first time the attribute is read, then caches it"""
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, EncryptedValue):
+            token, value = value.token, value.reveal()
+            instance.__dict__[self.field.attname] = value
+            # Remember the token so saving the unchanged plaintext writes it back as-is
+            instance.__dict__.setdefault("_secret_tokens", {})[self.field.attname] = (value, token)
+        return value
+
+    def __set__(self, instance, value):
+        # Being a data descriptor keeps reads going through __get__ even once the
+        # value sits in the instance __dict__
+        instance.__dict__[self.field.attname] = value
+
+
+class EncryptedField(models.TextField):
+    """Text column holding a Fernet token (FERNET_KEY); plaintext only lives on the instance
+
+    Rows load without decrypting anything, so bulk roster queries stay cheap and
+    only the secrets a worker actually reads are decrypted. Empty strings are
+    stored as-is so blank checks keep working.
+    """
+    descriptor_class = DecryptOnAccess
+
+    def from_db_value(self, value, expression, connection):
+        if not value:
+            return value
+        return EncryptedValue(value)
+
+    def pre_save(self, model_instance, add):
+        # Read the raw instance value: an untouched secret is still an
+        # EncryptedValue, and one that was only read still has its token, so
+        # neither is decrypted or re-encrypted
+        if self.attname not in model_instance.__dict__:
+            return super().pre_save(model_instance, add)
+        value = model_instance.__dict__[self.attname]
+        revealed = model_instance.__dict__.get("_secret_tokens", {}).get(self.attname)
+        if revealed and revealed[0] == value:
+            return EncryptedValue(revealed[1])
+        return value
+
+    def get_prep_value(self, value):
+        if isinstance(value, EncryptedValue):
+            return value.token
+        value = super().get_prep_value(value)
+        if not value:
+            return value
+        return get_fernet().encrypt(value.encode()).decode()
+
+    def save_form_data(self, instance, data):
+        # The form never shows the secret, so a blank submission means "unchanged"
+        if data or not instance.pk:
+            super().save_form_data(instance, data)
+
+    def formfield(self, **kwargs):
+        return forms.CharField(
+            required=False,
+            widget=forms.PasswordInput(render_value=False),
+            label=kwargs.get("label") or self.verbose_name.capitalize(),
+            help_text="Leave blank to keep the stored value.",
+        )
@@ -0,0 +1,82 @@
+# ipo_app/jobs.py
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.text import smart_split, unescape_string_literal
+from django.utils import timezone
+
+from .models import Run, UserAccount
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = config("JOB_WORKERS", default=2, cast=int)
+
+# Changelist filters an admin "select all" run may store instead of every account id
+ADMIN_LOOKUPS = ("dp_id__exact", "lot_size__exact", "tags__id__exact")
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="ipo-job")
+
+
+def run_queryset(run):
+    """UserAccount rows selected by a run's filters"""
+    queryset = UserAccount.objects.all()
+    filters = run.filters or {}
+    if filters.get("account_ids"):
+        queryset = queryset.filter(id__in=filters["account_ids"])
+    if filters.get("dp_id"):
+        queryset = queryset.filter(dp_id=filters["dp_id"])
+    if filters.get("tag"):
+        queryset = queryset.filter(tags__name=filters["tag"])
+    lookups = {key: value for key, value in filters.get("lookups", {}).items() if key in ADMIN_LOOKUPS}
+    if lookups:
+        queryset = queryset.filter(**lookups)
+    # replays ModelAdmin.get_search_results for UserAccountAdmin.search_fields ("=boid", "=username", "name"):
+    # every term, quoted phrases included, must match one of them
+    for term in smart_split(filters.get("search") or ""):
+        if term.startswith(('"', "'")) and term[0] == term[-1]:
+            term = unescape_string_literal(term)
+        queryset = queryset.filter(Q(boid__iexact=term) | Q(username__iexact=term) | Q(name__icontains=term))
+    return queryset.order_by("id")
+
+
+def execute_run(run_id):
+    """Body of a background job; runs on the job pool, never in a request thread"""
+    from .allotment import check_allotment
+    from .tasks import apply_ipo_for_queryset, check_applied_for_queryset
+
+    run = Run.objects.get(pk=run_id)
+    run.status = Run.STATUS_RUNNING
+    run.started_at = timezone.now()
+    run.save(update_fields=["status", "started_at"])
+    try:
+        if run.kind == Run.KIND_APPLY:
+            apply_ipo_for_queryset(run_queryset(run), run=run)
+        elif run.kind == Run.KIND_CHECK_APPLIED:
+            check_applied_for_queryset(run_queryset(run), run=run)
+        elif run.kind == Run.KIND_CHECK_ALLOTMENT:
+            check_allotment(run.issue, run_queryset(run))
+        run.status = Run.STATUS_DONE
+    except Exception as e:
+        logger.error(f"❌ Run {run_id} failed: {e}")
+        run.status = Run.STATUS_FAILED
+        run.message = traceback.format_exc()[-2000:]
+    finally:
+        run.finished_at = timezone.now()
+        run.save(update_fields=["status", "message", "finished_at"])
+        connection.close()
+
+
+def enqueue_run(kind=Run.KIND_APPLY, issue=None, filters=None, requested_by=""):
+    """Create a Run and hand it to the background pool once the row is committed"""
+    run = Run.objects.create(
+        kind=kind,
+        issue=issue or config("APPLY_IPO", default=""),
+        filters=filters or {},
+        requested_by=requested_by,
+    )
+    transaction.on_commit(lambda: _executor.submit(execute_run, run.pk))
+    return run
@@ -0,0 +1,108 @@
+# ipo_app/ledger.py
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import ApplicationRecord, UserAccount
+
+
+def start_application(acc, issue, worker="", run=None):
+    """Open (or reopen) the ledger row for an account's application to an issue"""
+    account = acc.get("account") or UserAccount.objects.filter(username=acc["username"]).first()
+    record, _ = ApplicationRecord.objects.update_or_create(
+        username=acc["username"],
+        issue=issue,
+        defaults={
+            "account": account,
+            "run": run,
+            "status": ApplicationRecord.STATUS_PENDING,
+            "worker": worker,
+            "message": "",
+            "started_at": timezone.now(),
+            "finished_at": None,
+            # a new submission starts the status polling over
+            "application_status": "",
+            "application_message": "",
+            "status_checks": 0,
+            "status_checked_at": None,
+            "next_status_check_at": None,
+            "needs_reapply": False,
+        },
+    )
+    return record
+
+
+def finish_application(record, ok, message=""):
+    """Close a ledger row with the outcome of the attempt"""
+    record.status = ApplicationRecord.STATUS_SUBMITTED if ok else ApplicationRecord.STATUS_FAILED
+    record.message = message[:2000]
+    record.finished_at = timezone.now()
+    record.save(update_fields=["status", "message", "finished_at"])
+    return record
+
+
+def record_already_applied(acc, issue, run=None):
+    """Mark an application found in MeroShare's Application Report as submitted
+
+    A row that is already submitted is left alone, so its status polling
+    carries on. The row gets no started_at: it was not timed here, and
+    historical_durations only averages rows with both timestamps.
+    """
+    account = acc.get("account") or UserAccount.objects.filter(username=acc["username"]).first()
+    record, created = ApplicationRecord.objects.get_or_create(
+        username=acc["username"],
+        issue=issue,
+        defaults={
+            "account": account,
+            "run": run,
+            "status": ApplicationRecord.STATUS_SUBMITTED,
+            "message": "Found in Application Report",
+            "finished_at": timezone.now(),
+        },
+    )
+    if created or record.status == ApplicationRecord.STATUS_SUBMITTED:
+        return record
+    # a pending or failed attempt that went through after all
+    record.status = ApplicationRecord.STATUS_SUBMITTED
+    record.message = "Found in Application Report"
+    record.started_at = None
+    record.finished_at = timezone.now()
+    record.save(update_fields=["status", "message", "started_at", "finished_at"])
+    return record
+
+
+def record_allotment(account, issue, allotted, message=""):
+    """Store an allotment result on the account's ledger row for the issue
+
+    Returns None, and stores nothing, when the account has no row for the issue.
+    """
+    record = ApplicationRecord.objects.filter(username=account.username, issue=issue).first()
+    if record is None:
+        return None
+    record.allotment = ApplicationRecord.ALLOTMENT_ALLOTTED if allotted else ApplicationRecord.ALLOTMENT_NOT_ALLOTTED
+    record.allotment_message = message[:255]
+    record.allotment_checked_at = timezone.now()
+    record.save(update_fields=["allotment", "allotment_message", "allotment_checked_at"])
+    return record
+
+
+def record_application_status(record, status, message="", reapply=False, interval=300, max_interval=6 * 3600):
+    """Store what the bank made of a submitted form and schedule the next check
+
+    Non-final statuses are checked again after `interval` seconds, doubling with
+    every check up to `max_interval`; final ones are not checked again.
+    """
+    now = timezone.now()
+    record.application_status = status
+    record.application_message = message[:255]
+    record.status_checks += 1
+    record.status_checked_at = now
+    if status in ApplicationRecord.FINAL_APPLICATION_STATUSES:
+        record.next_status_check_at = None
+    else:
+        delay = min(interval * 2 ** (record.status_checks - 1), max_interval)
+        record.next_status_check_at = now + timedelta(seconds=delay)
+    record.needs_reapply = reapply
+    record.save(update_fields=["application_status", "application_message", "status_checks", "status_checked_at",
+                               "next_status_check_at", "needs_reapply"])
+    return record
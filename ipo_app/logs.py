@@ -0,0 +1,161 @@
+# ipo_app/logs.py
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import re
+import sys
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+from decouple import config, Csv
+
+SECRET_KEYS = ("password", "crn", "pin", "boid")
+BOID_PATTERN = re.compile(r"\b\d{16}\b")
+KEY_VALUE_PATTERN = re.compile(r"\b(password|crn|pin|boid)(['\"]?\s*[:=]\s*['\"]?)([^\s'\",}]+)", re.IGNORECASE)
+REDACTED = "***"
+
+_account = contextvars.ContextVar("log_account", default=None)
+_step = contextvars.ContextVar("log_step", default=None)
+
+
+@contextmanager
+def account_scope(acc):
+    """Tag every log record in this block with the account, and redact its secrets"""
+    context = {
+        "account": acc.get("name") or acc.get("username"),
+        "dp_id": acc.get("dp_id"),
+        "issue": acc.get("issue"),
+        "run": acc.get("run_id"),
+        "secrets": tuple(sorted({str(acc[key]) for key in SECRET_KEYS if acc.get(key)}, key=len, reverse=True)),
+    }
+    token = _account.set(context)
+    try:
+        yield
+    finally:
+        _account.reset(token)
+
+
+@contextmanager
+def step_scope(step):
+    token = _step.set(step)
+    try:
+        yield
+    finally:
+        _step.reset(token)
+
+
+def parse_levels(value):
+    """'fill_ipo_form=WARNING,login=DEBUG' -> {'fill_ipo_form': 30, 'login': 10}"""
+    levels = {}
+    for item in Csv()(value):
+        step, _, level = item.partition("=")
+        levels[step.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+class ContextFilter(logging.Filter):
+    """Runs in the calling thread: attaches account/step context and applies per-step levels
+
+    LOG_LEVEL is the default threshold; LOG_STEP_LEVELS overrides it while a
+    given step runs, e.g. DEBUG for the step being investigated and WARNING for
+    the chatty ones.
+    """
+
+    def __init__(self, level=None, step_levels=None):
+        super().__init__()
+        self.level = logging.getLevelName(level or config("LOG_LEVEL", default="INFO").upper())
+        self.step_levels = step_levels if step_levels is not None else parse_levels(
+            config("LOG_STEP_LEVELS", default=""))
+
+    def filter(self, record):
+        step = _step.get()
+        if record.levelno < self.step_levels.get(step, self.level):
+            return False
+        context = _account.get() or {}
+        record.account = context.get("account")
+        record.dp_id = context.get("dp_id")
+        record.issue = context.get("issue")
+        record.run = context.get("run")
+        record.step = step
+        record._secrets = context.get("secrets", ())
+        return True
+
+
+class RedactingFilter(logging.Filter):
+    """Masks the current account's password, CRN, PIN and BOID, any 16-digit BOID and key=value secrets"""
+
+    def filter(self, record):
+        message = record.getMessage()
+        for secret in getattr(record, "_secrets", ()):
+            message = message.replace(secret, REDACTED)
+        message = BOID_PATTERN.sub(REDACTED, message)
+        message = KEY_VALUE_PATTERN.sub(lambda m: m.group(1) + m.group(2) + REDACTED, message)
+        record.msg, record.args = message, None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the account context as fields"""
+    CONTEXT_FIELDS = ("account", "dp_id", "issue", "run", "step")
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in self.CONTEXT_FIELDS:
+            if getattr(record, field, None):
+                entry[field] = getattr(record, field)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """The runner's usual emoji lines, prefixed with the account when several run in parallel"""
+
+    def format(self, record):
+        account = getattr(record, "account", None)
+        return f"[{account}] {record.getMessage()}" if account else record.getMessage()
+
+
+class QueueLogHandler(QueueHandler):
+    """Non-blocking handler: callers only enqueue, a listener thread redacts, formats and writes
+
+    The queue is bounded; when the console cannot keep up, records are dropped
+    (and counted) instead of stalling the browser workers.
+    """
+
+    def __init__(self, format=None, stream=None, maxsize=None):
+        super().__init__(queue.Queue(maxsize=maxsize or config("LOG_QUEUE_SIZE", default=10000, cast=int)))
+        self.dropped = 0
+        self.addFilter(ContextFilter())
+
+        format = format or config("LOG_FORMAT", default="console" if sys.stdout.isatty() else "json")
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if format == "json" else ConsoleFormatter())
+        output.addFilter(RedactingFilter())
+        self.listener = QueueListener(self.queue, output)
+        self.listener.start()
+        self.running = True
+        atexit.register(self.stop)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Drain the queue and stop the listener thread"""
+        if self.running:
+            self.running = False
+            try:
+                self.listener.stop()
+            except queue.Full:
+                pass  # no room for the stop sentinel; the daemon listener dies with the process
+            if self.dropped:
+                sys.stderr.write(f"{self.dropped} log records dropped (LOG_QUEUE_SIZE)\n")
@@ -1,9 +1,80 @@
 # ipo_app/management/commands/applyipo.py
-from django.core.management.base import BaseCommand
-from ipo_app.tasks import apply_ipo_for_all
+import logging
+import time
+from datetime import datetime
+
+from decouple import config
+from django.core.management.base import BaseCommand, CommandError
+from ipo_app.asset_proxy import enable_asset_proxy
+from ipo_app.browser_contexts import ContextEngine
+from ipo_app.browser_pool import BrowserPool
+from ipo_app.metrics import start_http_server
+from ipo_app.tasks import apply_ipo_for_all, apply_ipo_for_shard, create_driver, enqueue_shard_run
+
+logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = "Apply IPO for accounts from .env"
 
+    def add_arguments(self, parser):
+        parser.add_argument("--enqueue", action="store_true", help="Queue every UserAccount for a sharded run")
+        parser.add_argument("--shard", action="store_true", help="Claim and process accounts from the shared queue")
+        parser.add_argument("--worker", default=None, help="Worker name reported to the ledger (default host-pid)")
+        parser.add_argument("--batch", type=int, default=1, help="Accounts leased per claim in shard mode")
+        parser.add_argument("--warm-pool", type=int, default=0, help="Pre-spawn N browsers parked on the login page")
+        parser.add_argument("--contexts", action="store_true",
+                            help="Host the warm pool as isolated contexts inside one Chrome process")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Run every step up to, but not including, the final Apply click")
+        parser.add_argument("--metrics-port", type=int, default=config("METRICS_PORT", default=0, cast=int),
+                            help="Serve Prometheus metrics on this port during the run (0 = off)")
+        parser.add_argument("--asset-proxy", action="store_true",
+                            help="Serve MeroShare's static assets to every browser from a shared local cache")
+        parser.add_argument("--start-at", default=None, help="Wait until HH:MM (local time) before starting the run")
+
+    def wait_until(self, start_at):
+        hour, minute = (int(part) for part in start_at.split(":"))
+        target = datetime.now().replace(hour=hour, minute=minute, second=0, microsecond=0)
+        delay = (target - datetime.now()).total_seconds()
+        if delay > 0:
+            logger.info(f"⏳ Waiting {delay:.0f}s until {start_at}...")
+            time.sleep(delay)
+
     def handle(self, *args, **kwargs):
-        apply_ipo_for_all()
+        if kwargs["dry_run"] and (kwargs["shard"] or kwargs["enqueue"]):
+            raise CommandError("--dry-run only works for a direct run, not with --shard or --enqueue")
+
+        if kwargs["enqueue"]:
+            enqueue_shard_run()
+            return
+
+        if kwargs["contexts"] and not kwargs["warm_pool"]:
+            raise CommandError("--contexts needs --warm-pool N (the number of contexts)")
+
+        if kwargs["metrics_port"]:
+            start_http_server(kwargs["metrics_port"])
+
+        if kwargs["asset_proxy"]:
+            enable_asset_proxy()
+
+        pool = None
+        engine = None
+        if kwargs["warm_pool"]:
+            if kwargs["contexts"]:
+                engine = ContextEngine()
+            pool = BrowserPool(kwargs["warm_pool"], engine.new_context if engine else create_driver)
+            pool.start()
+
+        try:
+            if kwargs["start_at"]:
+                self.wait_until(kwargs["start_at"])
+
+            if kwargs["shard"]:
+                apply_ipo_for_shard(worker=kwargs["worker"], batch=kwargs["batch"], pool=pool)
+            else:
+                apply_ipo_for_all(pool=pool, dry_run=kwargs["dry_run"])
+        finally:
+            if pool:
+                pool.close()
+            if engine:
+                engine.close()
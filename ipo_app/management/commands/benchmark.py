@@ -0,0 +1,213 @@
+# ipo_app/management/commands/benchmark.py
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from cryptography.fernet import Fernet
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from ipo_app.browser_contexts import ContextEngine, create_shared_chrome
+from ipo_app.browser_pool import LOGIN_URL
+from ipo_app.config_loader import decrypt_accounts, load_encrypted_accounts
+from ipo_app.ledger import finish_application, start_application
+from ipo_app.memory_guard import MB, psutil
+from ipo_app.models import UserAccount
+
+
+def fake_env(count, key):
+    """Synthetic .env contents with `count` encrypted accounts"""
+    fernet = Fernet(key)
+    env = {}
+    for i in range(1, count + 1):
+        env.update({
+            f"ACC{i}_NAME": f"Account {i}",
+            f"ACC{i}_DP_ID": "13700",
+            f"ACC{i}_BOID": f"{1301370000000000 + i}",
+            f"ACC{i}_USERNAME": f"user{i}",
+            f"ACC{i}_PASSWORD": fernet.encrypt(f"password{i}".encode()).decode(),
+            f"ACC{i}_CRN": fernet.encrypt(f"CRN{i}".encode()).decode(),
+            f"ACC{i}_PIN": fernet.encrypt(b"1234").decode(),
+            f"ACC{i}_LOT": "10",
+        })
+    return env
+
+
+@contextmanager
+def throwaway_database(on_disk=False):
+    """Run against a freshly migrated test database instead of db.sqlite3"""
+    old_name = connection.settings_dict["NAME"]
+    if on_disk:
+        # SQLite test databases live in memory by default; locking needs a real file
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def chrome_memory_mb(driver):
+    """Proportional set size of chromedriver and its Chrome processes
+
+    PSS splits shared pages between the processes using them, so Chrome's
+    shared libraries are not counted once per renderer as they are with RSS.
+    """
+    root = psutil.Process(driver.service.process.pid)
+    total = 0
+    for process in [root] + root.children(recursive=True):
+        try:
+            info = process.memory_full_info()
+            total += getattr(info, "pss", info.rss)
+        except psutil.Error:
+            pass
+    return total / MB
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    result = fn()
+    print(f"  {label:<44} {time.perf_counter() - started:>8.3f}s")
+    return result
+
+
+class Command(BaseCommand):
+    help = "Benchmarks for the runner's hot paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", choices=["secrets", "roster", "dbwrites", "contexts"])
+        parser.add_argument("--rows", type=int, default=100000, help="Roster size for the roster benchmark")
+        parser.add_argument("--workers", type=int, default=16, help="Concurrent writers for the dbwrites benchmark")
+        parser.add_argument("--seconds", type=float, default=10, help="Duration of each dbwrites phase")
+        parser.add_argument("--accounts", type=int, default=8, help="Parallel accounts for the contexts benchmark")
+        parser.add_argument("--url", default=LOGIN_URL, help="Page each account loads in the contexts benchmark")
+
+    def handle(self, *args, **kwargs):
+        getattr(self, f"bench_{kwargs['target']}")(**kwargs)
+
+    def bench_secrets(self, **kwargs):
+        key = Fernet.generate_key()
+        # at least two processes, so a 1-CPU host still shows what the pool costs instead of a second serial run
+        processes = max(2, os.cpu_count() or 1)
+        print(f"{os.cpu_count()} CPU(s); parallel column uses {processes} processes")
+        print(f"{'accounts':>8}  {'read':>8}  {'serial':>8}  {'parallel':>8}")
+        for count in (10, 1000, 10000):
+            env = fake_env(count, key)
+
+            started = time.perf_counter()
+            accounts = load_encrypted_accounts(env)
+            read = time.perf_counter() - started
+
+            started = time.perf_counter()
+            decrypt_accounts(accounts, key, parallel_min=float("inf"))
+            serial = time.perf_counter() - started
+
+            started = time.perf_counter()
+            decrypt_accounts(accounts, key, parallel_min=0, processes=processes)
+            parallel = time.perf_counter() - started
+
+            print(f"{count:>8}  {read:>7.3f}s  {serial:>7.3f}s  {parallel:>7.3f}s")
+
+    def bench_roster(self, rows, **kwargs):
+        os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+        with throwaway_database():
+            timed(f"insert {rows} accounts", lambda: UserAccount.objects.bulk_create(
+                (UserAccount(name=f"Account {i}", dp_id=str(13700 + i % 50), boid=f"{1301370000000000 + i}",
+                             username=f"user{i}", password=f"password{i}", crn=f"CRN{i}", pin="1234")
+                 for i in range(rows)),
+                batch_size=5000,
+            ))
+
+            accounts = timed("load full roster (secrets still encrypted)", lambda: list(UserAccount.objects.all()))
+            timed("decrypt password for every account", lambda: [account.password for account in accounts])
+            timed("load one DP in id order", lambda: list(UserAccount.objects.filter(dp_id="13710").order_by("id")))
+            timed("1000 lookups by BOID", lambda: [
+                UserAccount.objects.filter(boid=f"{1301370000000000 + i * 97}").first() for i in range(1000)
+            ])
+            timed("1000 lookups by username", lambda: [
+                UserAccount.objects.filter(username=f"user{i * 97}").first() for i in range(1000)
+            ])
+
+    def bench_dbwrites(self, workers, seconds, **kwargs):
+        """Ledger write throughput with `workers` threads, stock SQLite settings vs the concurrent profile"""
+        os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+        profiles = {
+            "basic": ("DELETE", {}),
+            "concurrent": ("WAL", settings.SQLITE_CONCURRENT_OPTIONS),
+        }
+
+        print(f"{'profile':<12} {'rows/s':>9} {'locked':>7}")
+        for profile, (journal_mode, options) in profiles.items():
+            connections.settings["default"]["OPTIONS"] = options
+            # A fresh file per profile: journal_mode sticks to the file, and migrate sets it from DB_PROFILE
+            with throwaway_database(on_disk=True):
+                with connection.cursor() as cursor:
+                    cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+                accounts = UserAccount.objects.bulk_create(
+                    UserAccount(name=f"Account {i}", dp_id="13700", boid=f"{1301370000000000 + i}",
+                                username=f"user{i}", password="x", crn="x")
+                    for i in range(workers)
+                )
+                connection.close()
+
+                stop = time.monotonic() + seconds
+                counts = {"writes": 0, "locked": 0}
+                lock = threading.Lock()
+
+                def worker(account):
+                    acc = {"account": account, "username": account.username}
+                    n = 0
+                    while time.monotonic() < stop:
+                        n += 1
+                        try:
+                            record = start_application(acc, f"{profile}-{n}", "bench")
+                            finish_application(record, ok=True)
+                            result = "writes"
+                        except OperationalError:
+                            result = "locked"
+                        with lock:
+                            counts[result] += 1
+                    connection.close()
+
+                threads = [threading.Thread(target=worker, args=(account,)) for account in accounts]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                print(f"{profile:<12} {counts['writes'] / seconds:>9.0f} {counts['locked']:>7}")
+
+    def bench_contexts(self, accounts, url, seconds, **kwargs):
+        """Memory for `accounts` parallel sessions: one Chrome each vs one Chrome with a context each"""
+        if not psutil:
+            raise CommandError("the contexts benchmark needs psutil")
+
+        print(f"{'engine':<12} {'accounts':>8} {'total MB':>9} {'MB/acct':>8} {'accts/GB':>9}")
+
+        drivers = []
+        try:
+            for _ in range(accounts):
+                driver = create_shared_chrome()
+                driver.get(url)
+                drivers.append(driver)
+            time.sleep(seconds)  # let the pages settle
+            self.report_memory("processes", accounts, sum(chrome_memory_mb(driver) for driver in drivers))
+        finally:
+            for driver in drivers:
+                driver.quit()
+
+        engine = ContextEngine()
+        try:
+            for _ in range(accounts):
+                engine.new_context(url)
+            time.sleep(seconds)
+            self.report_memory("contexts", accounts, chrome_memory_mb(engine.driver))
+        finally:
+            engine.close()
+
+    def report_memory(self, engine, accounts, total_mb):
+        per_account = total_mb / accounts
+        print(f"{engine:<12} {accounts:>8} {total_mb:>9.0f} {per_account:>8.0f} {1024 / per_account:>9.1f}")
@@ -0,0 +1,17 @@
+# ipo_app/management/commands/checkallotment.py
+from decouple import config
+from django.core.management.base import BaseCommand
+
+from ipo_app.allotment import check_allotment
+
+
+class Command(BaseCommand):
+    help = "Check allotment results for every UserAccount BOID"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--issue", default=None, help="Issue name (default APPLY_IPO from .env)")
+        parser.add_argument("--recheck", action="store_true", help="Also re-check accounts with a stored result")
+
+    def handle(self, *args, **kwargs):
+        issue = kwargs["issue"] or config("APPLY_IPO", default="")
+        check_allotment(issue, recheck=kwargs["recheck"])
@@ -0,0 +1,18 @@
+# ipo_app/management/commands/pollstatus.py
+from django.core.management.base import BaseCommand
+
+from ipo_app.status_poller import poll_statuses
+
+
+class Command(BaseCommand):
+    help = "Re-check the bank status of submitted applications and flag rejected ones for reapplication"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--issue", default=None, help="Only poll applications for this issue (default all)")
+        parser.add_argument("--once", action="store_true", help="Check what is due once and exit (for cron)")
+        parser.add_argument("--workers", type=int, default=None, help="Accounts checked concurrently")
+        parser.add_argument("--max-hours", type=float, default=48, help="Stop polling after this many hours")
+
+    def handle(self, *args, **kwargs):
+        options = {"workers": kwargs["workers"]} if kwargs["workers"] else {}
+        poll_statuses(issue=kwargs["issue"], once=kwargs["once"], max_hours=kwargs["max_hours"], **options)
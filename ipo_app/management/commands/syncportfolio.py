@@ -0,0 +1,21 @@
+# ipo_app/management/commands/syncportfolio.py
+from django.core.management.base import BaseCommand
+
+from ipo_app.models import UserAccount
+from ipo_app.portfolio import sync_portfolio
+
+
+class Command(BaseCommand):
+    help = "Fetch holdings and transactions for every UserAccount, writing only what changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dp-id", default=None, help="Only sync accounts of this DP")
+        parser.add_argument("--tag", default=None, help="Only sync accounts with this tag")
+
+    def handle(self, *args, **kwargs):
+        accounts = UserAccount.objects.order_by("id")
+        if kwargs["dp_id"]:
+            accounts = accounts.filter(dp_id=kwargs["dp_id"])
+        if kwargs["tag"]:
+            accounts = accounts.filter(tags__name=kwargs["tag"])
+        sync_portfolio(accounts)
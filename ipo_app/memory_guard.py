@@ -0,0 +1,101 @@
+# ipo_app/memory_guard.py
+import logging
+import os
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+except ImportError:  # browser RSS needs psutil; the rest works without it
+    psutil = None
+
+MB = 1024 * 1024
+
+
+def python_rss_mb():
+    """Resident memory of this Python process"""
+    if psutil:
+        return psutil.Process().memory_info().rss / MB
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError):
+        return None
+
+
+def browser_rss_mb(driver):
+    """Resident memory of chromedriver plus every Chrome process it started"""
+    if not psutil:
+        return None
+    try:
+        root = psutil.Process(driver.service.process.pid)
+        processes = [root] + root.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes if p.is_running()) / MB
+    except Exception:
+        return None
+
+
+def js_heap_mb(driver):
+    """Used JS heap of the current page, read through CDP (performance.memory as a fallback)
+
+    For a context of a shared Chrome the commands run on that context's tab, so
+    this is the account's own memory.
+    """
+    try:
+        driver.execute_cdp_cmd("Performance.enable", {})
+        metrics = driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]
+        for metric in metrics:
+            if metric["name"] == "JSHeapUsedSize":
+                return metric["value"] / MB
+    except Exception:
+        pass
+    try:
+        used = driver.execute_script("return performance.memory ? performance.memory.usedJSHeapSize : null")
+        if used is not None:
+            return used / MB
+    except Exception:
+        pass
+    return None
+
+
+def is_context(driver):
+    """A ContextDriver: one account's context inside a Chrome shared with the others"""
+    return getattr(driver, "context_id", None) is not None
+
+
+class MemoryGuard:
+    """Samples memory after every account and asks for a fresh browser past the limits
+
+    A browser context shares its Chrome with every other context, so the
+    browser's RSS says nothing about it; contexts are only recycled on their
+    own JS heap.
+    """
+
+    def __init__(self, trace, max_browser_mb=None, max_js_heap_mb=None):
+        self.trace = trace
+        self.max_browser_mb = max_browser_mb or config("MEMORY_MAX_BROWSER_MB", default=1500, cast=float)
+        self.max_js_heap_mb = max_js_heap_mb or config("MEMORY_MAX_JS_HEAP_MB", default=300, cast=float)
+
+    def check(self, driver, account_name):
+        """Record a sample in the run trace; True means the browser should be recycled"""
+        shared = is_context(driver)
+        sample = {
+            "account": account_name,
+            "python_mb": python_rss_mb(),
+            "browser_mb": browser_rss_mb(driver),
+            "js_heap_mb": js_heap_mb(driver),
+            "shared_browser": shared,
+        }
+        over_limit = (
+            (not shared and (sample["browser_mb"] or 0) > self.max_browser_mb)
+            or (sample["js_heap_mb"] or 0) > self.max_js_heap_mb
+        )
+        sample["recycled"] = over_limit
+        self.trace.record("memory", **sample)
+
+        if over_limit:
+            logger.info(f"♻️ Memory limit crossed after {account_name} "
+                        f"(browser {sample['browser_mb'] or 0:.0f} MB, JS heap {sample['js_heap_mb'] or 0:.0f} MB), recycling browser")
+        return over_limit
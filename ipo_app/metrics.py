@@ -0,0 +1,167 @@
+# ipo_app/metrics.py
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Metric:
+    """Base for the registry's metric types; one lock-protected dict per metric, keyed by label values"""
+    kind = ""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value in self.samples():
+            lines.append(f"{name}{_labels(self.labelnames, key)} {value:g}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    DEFAULT_BUCKETS = (0.5, 1, 2.5, 5, 10, 15, 25, 40, 60, 120)
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        with self.lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                samples.append((f"{self.name}_bucket", key + (le,), cumulative))
+            samples.append((f"{self.name}_count", key, cumulative))
+            samples.append((f"{self.name}_sum", key, total))
+        return samples
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, value in self.samples():
+            names = self.labelnames + ("le",) if name.endswith("_bucket") else self.labelnames
+            lines.append(f"{name}{_labels(names, key)} {value:g}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+registry = Registry()
+
+ACCOUNTS = registry.register(Counter(
+    "ipo_accounts_total", "Accounts processed, by outcome (submitted, failed, rehearsed)", ["outcome"]))
+ACCOUNTS_IN_PROGRESS = registry.register(Gauge(
+    "ipo_accounts_in_progress", "Accounts currently being processed"))
+QUEUE_DEPTH = registry.register(Gauge(
+    "ipo_queue_depth", "Accounts waiting in this process's run queue"))
+STEP_SECONDS = registry.register(Histogram(
+    "ipo_step_seconds", "Duration of each browser step", ["step"]))
+STEP_FAILURES = registry.register(Counter(
+    "ipo_step_failures_total", "Browser steps that raised", ["step"]))
+SERVER_ERRORS = registry.register(Counter(
+    "ipo_server_errors_total", "429/5xx responses seen by the browser", ["dp_id"]))
+BREAKER_OPEN = registry.register(Gauge(
+    "ipo_circuit_breaker_open", "1 while the circuit breaker holds the queue"))
+ASSET_REQUESTS = registry.register(Counter(
+    "ipo_asset_proxy_requests_total", "Requests through the asset proxy, by result (hits, misses, passthrough)",
+    ["result"]))
+ASSET_BYTES_SAVED = registry.register(Counter(
+    "ipo_asset_proxy_bytes_saved_total", "Bytes served from the asset cache instead of MeroShare"))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve /metrics on its own port for CLI runs that have no Django server"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"📈 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipo_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=50)),
+                ('issue', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('submitted', 'Submitted'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('message', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='applications', to='ipo_app.useraccount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('username', 'issue'), name='unique_application_per_issue')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('issue', models.CharField(max_length=200)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('claimed', 'Claimed'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('claim_token', models.CharField(blank=True, max_length=32)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claims', to='ipo_app.useraccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['issue', 'status', 'lease_expires_at'], name='ipo_app_wor_issue_e109f5_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'issue'), name='unique_claim_per_issue')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipo_app', '0002_applicationrecord_workclaim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='applicationrecord',
+            name='allotment',
+            field=models.CharField(blank=True, choices=[('allotted', 'Allotted'), ('not_allotted', 'Not allotted')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='applicationrecord',
+            name='allotment_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='applicationrecord',
+            name='allotment_message',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipo_app', '0004_run_applicationrecord_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='run',
+            name='kind',
+            field=models.CharField(choices=[('apply', 'Apply for issue'), ('check_applied', 'Check already applied'), ('check_allotment', 'Check allotment')], default='apply', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='useraccount',
+            name='lot_size',
+            field=models.IntegerField(db_index=True, default=10),
+        ),
+        migrations.AddField(
+            model_name='useraccount',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='accounts', to='ipo_app.tag'),
+        ),
+    ]
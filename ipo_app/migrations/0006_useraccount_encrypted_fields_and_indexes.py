@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:03
+
+import ipo_app.fields
+from cryptography.fernet import InvalidToken
+from django.db import migrations, models
+
+
+def encrypt_plaintext_secrets(apps, schema_editor):
+    """Encrypt password/CRN values that were stored in plaintext before this migration"""
+    from ipo_app.config_loader import get_fernet
+
+    UserAccount = apps.get_model("ipo_app", "UserAccount")
+    table = UserAccount._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT id, password, crn FROM {table}")
+        rows = cursor.fetchall()
+        if not rows:
+            return
+
+        fernet = get_fernet()
+
+        def encrypt(value):
+            if not value:
+                return value
+            try:
+                fernet.decrypt(value.encode())
+                return value  # already a token
+            except InvalidToken:
+                return fernet.encrypt(value.encode()).decode()
+
+        for pk, password, crn in rows:
+            cursor.execute(
+                f"UPDATE {table} SET password = %s, crn = %s WHERE id = %s",
+                [encrypt(password), encrypt(crn), pk],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipo_app', '0005_tag_alter_run_kind_alter_useraccount_dp_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccount',
+            name='bank_account',
+            field=models.CharField(blank=True, max_length=30),
+        ),
+        migrations.AddField(
+            model_name='useraccount',
+            name='bank_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='useraccount',
+            name='pin',
+            field=ipo_app.fields.EncryptedField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='useraccount',
+            name='crn',
+            field=ipo_app.fields.EncryptedField(),
+        ),
+        migrations.AlterField(
+            model_name='useraccount',
+            name='password',
+            field=ipo_app.fields.EncryptedField(),
+        ),
+        migrations.RunPython(encrypt_plaintext_secrets, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='applicationrecord',
+            index=models.Index(fields=['issue', 'status'], name='ipo_app_app_issue_3f6de3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='applicationrecord',
+            index=models.Index(fields=['issue', 'allotment'], name='ipo_app_app_issue_f1e492_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useraccount',
+            index=models.Index(fields=['dp_id', 'id'], name='ipo_app_use_dp_id_832a0d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useraccount',
+            index=models.Index(fields=['username'], name='ipo_app_use_usernam_e1e1ee_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='useraccount',
+            constraint=models.UniqueConstraint(fields=('boid',), name='unique_account_boid'),
+        ),
+    ]
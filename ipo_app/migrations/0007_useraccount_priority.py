@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipo_app', '0006_useraccount_encrypted_fields_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useraccount',
+            name='priority',
+            field=models.IntegerField(default=0, help_text='Higher priorities are applied for first'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipo_app', '0007_useraccount_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holdings_hash', models.CharField(blank=True, max_length=64)),
+                ('transactions_hash', models.CharField(blank=True, max_length=64)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='portfolio_sync', to='ipo_app.useraccount')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Holding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scrip', models.CharField(max_length=30)),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('last_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('value', models.DecimalField(blank=True, decimal_places=2, max_digits=16, null=True)),
+                ('row_hash', models.CharField(max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='ipo_app.useraccount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'scrip'), name='unique_holding_per_scrip')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scrip', models.CharField(max_length=30)),
+                ('date', models.DateField(blank=True, null=True)),
+                ('credit', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('debit', models.DecimalField(decimal_places=3, default=0, max_digits=14)),
+                ('balance', models.DecimalField(blank=True, decimal_places=3, max_digits=14, null=True)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='ipo_app.useraccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'date'], name='ipo_app_tra_account_b2c7f8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'fingerprint'), name='unique_transaction_fingerprint')],
+            },
+        ),
+    ]
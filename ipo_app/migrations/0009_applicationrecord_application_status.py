@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ipo_app', '0008_holding_transaction_portfoliosync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='applicationrecord',
+            name='application_message',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='applicationrecord',
+            name='application_status',
+            field=models.CharField(blank=True, choices=[('unverified', 'Unverified'), ('verified', 'Verified'), ('rejected', 'Rejected'), ('block_failed', 'Block failed')], max_length=20),
+        ),
+        migrations.AddField(
+            model_name='applicationrecord',
+            name='needs_reapply',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='applicationrecord',
+            name='next_status_check_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='applicationrecord',
+            name='status_checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='applicationrecord',
+            name='status_checks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='applicationrecord',
+            index=models.Index(fields=['status', 'next_status_check_at'], name='ipo_app_app_status_da2702_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def set_journal_mode(schema_editor, mode):
+    # journal_mode is stored in the SQLite file, so this only has to happen once
+    if schema_editor.connection.vendor == "sqlite":
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode={mode}")
+
+
+def use_configured_journal_mode(apps, schema_editor):
+    set_journal_mode(schema_editor, getattr(settings, "SQLITE_JOURNAL_MODE", "DELETE"))
+
+
+def use_rollback_journal(apps, schema_editor):
+    set_journal_mode(schema_editor, "DELETE")
+
+
+class Migration(migrations.Migration):
+    # SQLite refuses to switch into WAL inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('ipo_app', '0009_applicationrecord_application_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_configured_journal_mode, use_rollback_journal),
+    ]
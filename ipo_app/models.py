@@ -1,14 +1,227 @@
 # ipo_app/models.py
 from django.db import models
 
+from .fields import EncryptedField
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 class UserAccount(models.Model):
     name = models.CharField(max_length=100)
     dp_id = models.CharField(max_length=20)
     boid = models.CharField(max_length=16)
     username = models.CharField(max_length=50)
-    password = models.CharField(max_length=50)   # store encrypted in real use
-    crn = models.CharField(max_length=20)
-    lot_size = models.IntegerField(default=10)
+    password = EncryptedField()
+    crn = EncryptedField()
+    pin = EncryptedField(blank=True, default="")
+    bank_name = models.CharField(max_length=100, blank=True)
+    bank_account = models.CharField(max_length=30, blank=True)
+    lot_size = models.IntegerField(default=10, db_index=True)
+    priority = models.IntegerField(default=0, help_text="Higher priorities are applied for first")
+    tags = models.ManyToManyField(Tag, blank=True, related_name="accounts")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["boid"], name="unique_account_boid"),
+        ]
+        indexes = [
+            # roster filtered by DP in id order (API/admin runs, DP-sharded claims)
+            models.Index(fields=["dp_id", "id"]),
+            # ledger and .env roster matching by username
+            models.Index(fields=["username"]),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class Run(models.Model):
+    """A background job started from the API or the admin, with the account filter it was given"""
+    KIND_APPLY = "apply"
+    KIND_CHECK_APPLIED = "check_applied"
+    KIND_CHECK_ALLOTMENT = "check_allotment"
+    KIND_CHOICES = [
+        (KIND_APPLY, "Apply for issue"),
+        (KIND_CHECK_APPLIED, "Check already applied"),
+        (KIND_CHECK_ALLOTMENT, "Check allotment"),
+    ]
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_APPLY)
+    issue = models.CharField(max_length=200)
+    filters = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    requested_by = models.CharField(max_length=150, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Run {self.pk} {self.kind} {self.issue} ({self.status})"
+
+
+class ApplicationRecord(models.Model):
+    """Ledger entry: one account's attempt at one issue, shared by every worker"""
+    STATUS_PENDING = "pending"
+    STATUS_SUBMITTED = "submitted"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SUBMITTED, "Submitted"),
+        (STATUS_FAILED, "Failed"),
+    ]
+    ALLOTMENT_ALLOTTED = "allotted"
+    ALLOTMENT_NOT_ALLOTTED = "not_allotted"
+    ALLOTMENT_CHOICES = [
+        (ALLOTMENT_ALLOTTED, "Allotted"),
+        (ALLOTMENT_NOT_ALLOTTED, "Not allotted"),
+    ]
+    # What the bank made of a submitted form, as MeroShare's application report shows it
+    APPLICATION_UNVERIFIED = "unverified"
+    APPLICATION_VERIFIED = "verified"
+    APPLICATION_REJECTED = "rejected"
+    APPLICATION_BLOCK_FAILED = "block_failed"
+    APPLICATION_STATUS_CHOICES = [
+        (APPLICATION_UNVERIFIED, "Unverified"),
+        (APPLICATION_VERIFIED, "Verified"),
+        (APPLICATION_REJECTED, "Rejected"),
+        (APPLICATION_BLOCK_FAILED, "Block failed"),
+    ]
+    FINAL_APPLICATION_STATUSES = [APPLICATION_VERIFIED, APPLICATION_REJECTED, APPLICATION_BLOCK_FAILED]
+
+    account = models.ForeignKey(
+        UserAccount, null=True, blank=True, on_delete=models.SET_NULL, related_name="applications"
+    )
+    run = models.ForeignKey(Run, null=True, blank=True, on_delete=models.SET_NULL, related_name="applications")
+    username = models.CharField(max_length=50)
+    issue = models.CharField(max_length=200)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    worker = models.CharField(max_length=100, blank=True)
+    message = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    allotment = models.CharField(max_length=20, choices=ALLOTMENT_CHOICES, blank=True)
+    allotment_message = models.CharField(max_length=255, blank=True)
+    allotment_checked_at = models.DateTimeField(null=True, blank=True)
+    application_status = models.CharField(max_length=20, choices=APPLICATION_STATUS_CHOICES, blank=True)
+    application_message = models.CharField(max_length=255, blank=True)
+    status_checks = models.IntegerField(default=0)
+    status_checked_at = models.DateTimeField(null=True, blank=True)
+    next_status_check_at = models.DateTimeField(null=True, blank=True)
+    needs_reapply = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["username", "issue"], name="unique_application_per_issue"),
+        ]
+        indexes = [
+            models.Index(fields=["issue", "status"]),
+            models.Index(fields=["issue", "allotment"]),
+            # pollstatus: submitted forms not yet in a final state, due for a check
+            models.Index(fields=["status", "next_status_check_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.username} - {self.issue} ({self.status})"
+
+
+class WorkClaim(models.Model):
+    """Shared work-queue row; a shard leases it while processing the account"""
+    STATUS_QUEUED = "queued"
+    STATUS_CLAIMED = "claimed"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_CLAIMED, "Claimed"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    account = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="claims")
+    issue = models.CharField(max_length=200)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    worker = models.CharField(max_length=100, blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "issue"], name="unique_claim_per_issue"),
+        ]
+        indexes = [
+            models.Index(fields=["issue", "status", "lease_expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} - {self.issue} ({self.status})"
+
+
+class Holding(models.Model):
+    """Current balance of one scrip in an account, as shown on My Portfolio"""
+    account = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="holdings")
+    scrip = models.CharField(max_length=30)
+    quantity = models.DecimalField(max_digits=14, decimal_places=3)
+    last_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    value = models.DecimalField(max_digits=16, decimal_places=2, null=True, blank=True)
+    row_hash = models.CharField(max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "scrip"], name="unique_holding_per_scrip"),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} - {self.scrip} ({self.quantity})"
+
+
+class Transaction(models.Model):
+    """One line of an account's My Transaction History"""
+    account = models.ForeignKey(UserAccount, on_delete=models.CASCADE, related_name="transactions")
+    scrip = models.CharField(max_length=30)
+    date = models.DateField(null=True, blank=True)
+    credit = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    debit = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    balance = models.DecimalField(max_digits=14, decimal_places=3, null=True, blank=True)
+    description = models.CharField(max_length=255, blank=True)
+    fingerprint = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["account", "fingerprint"], name="unique_transaction_fingerprint"),
+        ]
+        indexes = [
+            models.Index(fields=["account", "date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} - {self.scrip} {self.date}"
+
+
+class PortfolioSync(models.Model):
+    """Content hashes of the last synced portfolio; an unchanged hash means nothing to write"""
+    account = models.OneToOneField(UserAccount, on_delete=models.CASCADE, related_name="portfolio_sync")
+    holdings_hash = models.CharField(max_length=64, blank=True)
+    transactions_hash = models.CharField(max_length=64, blank=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    changed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.account_id} synced {self.synced_at}"
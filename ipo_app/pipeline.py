@@ -0,0 +1,85 @@
+# ipo_app/pipeline.py
+import importlib
+import logging
+
+from decouple import config, Csv
+
+from .events import publish_step
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PIPELINE = ["asba", "select_issue", "fill_form", "submit"]
+
+
+class Step:
+    """One stage of the apply flow
+
+    `action(driver, acc)` does the work. `precondition(driver, acc)` must hold
+    before it runs, otherwise the account fails fast instead of timing out on a
+    selector. `postcondition(driver, acc)` says whether the work is already
+    done (e.g. login left the browser on My ASBA), in which case the step is
+    skipped. Both checks should be cheap: look at the URL or call
+    find_elements, never wait.
+    """
+
+    def __init__(self, name, action, precondition=None, postcondition=None):
+        self.name = name
+        self.__name__ = name  # run_throttled reports steps by __name__
+        self.action = action
+        self.precondition = precondition
+        self.postcondition = postcondition
+
+    def __call__(self, driver, acc):
+        return self.action(driver, acc)
+
+    def __repr__(self):
+        return f"<Step {self.name}>"
+
+
+STEPS = {}
+
+
+def register_step(name, action, precondition=None, postcondition=None):
+    """Add a step, or replace the implementation registered under `name`
+
+    This is how an alternative implementation (say an HTTP version of
+    select_issue) or an extra stage is plugged in: register it from a module
+    listed in APPLY_PIPELINE_MODULES and name it in APPLY_PIPELINE.
+    """
+    STEPS[name] = Step(name, action, precondition, postcondition)
+    return STEPS[name]
+
+
+def load_pipeline(names=None):
+    """Steps to run for each account, from APPLY_PIPELINE (default DEFAULT_PIPELINE)"""
+    for module in config("APPLY_PIPELINE_MODULES", default="", cast=Csv()):
+        importlib.import_module(module)
+
+    names = names or config("APPLY_PIPELINE", default=",".join(DEFAULT_PIPELINE), cast=Csv())
+    unknown = [name for name in names if name not in STEPS]
+    if unknown:
+        raise Exception(f"Unknown pipeline step(s) {', '.join(unknown)}; registered: {', '.join(STEPS)}")
+    return [STEPS[name] for name in names]
+
+
+def _holds(check, driver, acc):
+    try:
+        return bool(check(driver, acc))
+    except Exception:
+        return False
+
+
+def run_pipeline(driver, acc, steps, runner):
+    """Run `steps` in order for one account
+
+    `runner(step, driver, acc, acc)` executes a step; the browser runner passes
+    run_throttled so every step is rate limited, timed and published.
+    """
+    for step in steps:
+        if step.postcondition and _holds(step.postcondition, driver, acc):
+            logger.info(f"⏭️ {step.name}: already done, skipping")
+            publish_step(acc, step.name, "skipped")
+            continue
+        if step.precondition and not _holds(step.precondition, driver, acc):
+            raise Exception(f"Precondition for step '{step.name}' not met")
+        runner(step, driver, acc, acc)
@@ -0,0 +1,206 @@
+# ipo_app/portfolio.py
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+from .config_loader import unsealed
+from .logs import account_scope
+from .models import Holding, PortfolioSync, Transaction, UserAccount
+
+logger = logging.getLogger(__name__)
+
+PORTFOLIO_URL = "https://meroshare.cdsc.com.np/#/portfolio"
+TRANSACTIONS_URL = "https://meroshare.cdsc.com.np/#/transaction"
+
+READ_TABLE_JS = """
+const table = document.querySelector('table');
+if (table && table.querySelector('tbody tr td')) {
+    const headers = [...table.querySelectorAll('thead th')].map(th => th.innerText.trim().toLowerCase());
+    const rows = [...table.querySelectorAll('tbody tr')]
+        .map(tr => [...tr.querySelectorAll('td')].map(td => td.innerText.trim()))
+        .filter(cells => cells.length === headers.length);
+    return {headers, rows};
+}
+// MeroShare says so when an account really has nothing; anything else is still loading
+if (/no\\s+(data|records?)\\s+(found|available)/i.test(document.body ? document.body.innerText : '')) {
+    return {headers: [], rows: []};
+}
+return null;
+"""
+
+
+def read_table(driver, url, timeout=20):
+    """Rows of the first table on a MeroShare page, as dicts keyed by lower-cased header
+
+    [] only when the page shows its no-data message; a table that never loads
+    raises, so the caller keeps what it stored last time.
+    """
+    driver.get(url)
+    try:
+        table = WebDriverWait(driver, timeout).until(lambda d: d.execute_script(READ_TABLE_JS))
+    except TimeoutException:
+        raise Exception(f"{url} showed neither a table nor a no-data message within {timeout}s")
+    return [dict(zip(table["headers"], cells)) for cells in table["rows"]]
+
+
+def _column(row, *keywords):
+    for header, value in row.items():
+        if any(keyword in header for keyword in keywords):
+            return value
+    return ""
+
+
+def _number(value):
+    try:
+        return str(Decimal(value.replace(",", "")))
+    except (InvalidOperation, AttributeError):
+        return None
+
+
+def _date(value):
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def fetch_portfolio(driver):
+    """Holdings and transactions of the logged-in account, normalised to plain strings"""
+    holdings = [
+        {
+            "scrip": _column(row, "scrip"),
+            "quantity": _number(_column(row, "current balance", "balance")) or "0",
+            "last_price": _number(_column(row, "last closing price", "ltp")),
+            "value": _number(_column(row, "value as of")),
+        }
+        for row in read_table(driver, PORTFOLIO_URL)
+        if _column(row, "scrip") and not _column(row, "scrip").lower().startswith("total")
+    ]
+    transactions = [
+        {
+            "scrip": _column(row, "scrip"),
+            "date": _date(_column(row, "date")),
+            "credit": _number(_column(row, "credit")) or "0",
+            "debit": _number(_column(row, "debit")) or "0",
+            "balance": _number(_column(row, "balance after", "balance")),
+            "description": _column(row, "description")[:255],
+        }
+        for row in read_table(driver, TRANSACTIONS_URL)
+        if _column(row, "scrip")
+    ]
+    return holdings, transactions
+
+
+def content_hash(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+def transaction_fingerprints(transactions):
+    """Stable key per transaction; identical lines are told apart by their occurrence"""
+    seen = {}
+    fingerprints = []
+    for row in transactions:
+        key = content_hash(row)
+        seen[key] = seen.get(key, 0) + 1
+        fingerprints.append(content_hash([key, seen[key]]))
+    return fingerprints
+
+
+def store_portfolio(account, holdings, transactions):
+    """Write what changed since the last sync
+
+    The whole-portfolio hashes are compared first, so an unchanged account costs
+    one read. Otherwise only holdings whose row hash differs are upserted, sold
+    scrips are deleted and unseen transactions are inserted.
+    """
+    sync, _ = PortfolioSync.objects.get_or_create(account=account)
+    now = timezone.now()
+    holdings_hash = content_hash(holdings)
+    transactions_hash = content_hash(transactions)
+    counts = {"holdings": 0, "removed": 0, "transactions": 0}
+
+    with transaction.atomic():
+        if holdings_hash != sync.holdings_hash:
+            current = dict(account.holdings.values_list("scrip", "row_hash"))
+            changed = [
+                Holding(account=account, row_hash=content_hash(row), **row)
+                for row in holdings if current.get(row["scrip"]) != content_hash(row)
+            ]
+            Holding.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=["account", "scrip"],
+                update_fields=["quantity", "last_price", "value", "row_hash", "updated_at"],
+            )
+            gone = set(current) - {row["scrip"] for row in holdings}
+            counts["removed"], _ = account.holdings.filter(scrip__in=gone).delete()
+            counts["holdings"] = len(changed)
+
+        if transactions_hash != sync.transactions_hash:
+            fingerprints = transaction_fingerprints(transactions)
+            known = set(account.transactions.filter(fingerprint__in=fingerprints).values_list("fingerprint", flat=True))
+            new = [
+                Transaction(account=account, fingerprint=fingerprint, **row)
+                for fingerprint, row in zip(fingerprints, transactions) if fingerprint not in known
+            ]
+            Transaction.objects.bulk_create(new, ignore_conflicts=True)
+            counts["transactions"] = len(new)
+
+        changed = holdings_hash != sync.holdings_hash or transactions_hash != sync.transactions_hash
+        sync.holdings_hash = holdings_hash
+        sync.transactions_hash = transactions_hash
+        sync.synced_at = now
+        if changed:
+            sync.changed_at = now
+        sync.save()
+    return counts
+
+
+def sync_portfolio(queryset=None):
+    """Log in to every account and store its holdings and transactions"""
+    # Imported here: tasks pulls in Selenium and the whole runner
+    from .tasks import account_to_dict, create_driver, load_accounts, login, run_throttled
+
+    roster = {acc["username"]: acc for acc in load_accounts()}
+    accounts = queryset if queryset is not None else UserAccount.objects.all()
+    totals = {"accounts": 0, "changed": 0, "failed": 0, "holdings": 0, "removed": 0, "transactions": 0}
+    started = time.monotonic()
+    driver = create_driver()
+    try:
+        for account in accounts.iterator():
+            totals["accounts"] += 1
+            try:
+                with unsealed(account_to_dict(account, roster)) as acc, account_scope(acc):
+                    run_throttled(login, driver, acc, acc)
+                    holdings, transactions = fetch_portfolio(driver)
+                    counts = store_portfolio(account, holdings, transactions)
+            except Exception as e:
+                totals["failed"] += 1
+                logger.error(f"❌ {account.name}: portfolio sync failed: {e}")
+                continue
+
+            for key, value in counts.items():
+                totals[key] += value
+            if any(counts.values()):
+                totals["changed"] += 1
+                logger.info(f"🔄 {account.name}: {counts['holdings']} holdings updated, {counts['removed']} removed, "
+                            f"{counts['transactions']} new transactions")
+            else:
+                logger.info(f"➖ {account.name}: unchanged")
+    finally:
+        driver.quit()
+
+    logger.info(f"🏁 Synced {totals['accounts']} accounts in {time.monotonic() - started:.0f}s: "
+                f"{totals['changed']} changed, {totals['failed']} failed, {totals['holdings']} holdings written, "
+                f"{totals['transactions']} transactions added")
+    return totals
@@ -0,0 +1,193 @@
+# ipo_app/rate_limiter.py
+import heapq
+import threading
+import time
+
+from decouple import config
+
+
+class TokenBucket:
+    """Classic token bucket; `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now, factor=1.0):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate * factor)
+        self.updated = now
+
+    def wait_time(self, factor=1.0):
+        """Seconds until one token is available (0 if one is available now)"""
+        # Tolerate float drift so an almost-full bucket never spins on a 1e-17 s wait
+        if self.tokens >= 1 - 1e-9:
+            return 0.0
+        return (1 - self.tokens) / (self.rate * factor)
+
+
+class AdaptiveRateLimiter:
+    """Global plus per-DP token buckets that back off when MeroShare throttles us
+
+    Rates follow AIMD: every throttle signal (error, timeout, 429/5xx) halves the
+    effective rate, at most once per `cooldown` seconds, and every success adds a
+    little back until the configured rate is reached again.
+    """
+
+    def __init__(self, global_rate, dp_rate, burst=2, dp_overrides=None,
+                 decrease=0.5, increase=0.01, min_factor=0.05, cooldown=1.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.global_rate = global_rate
+        self.dp_rate = dp_rate
+        self.burst = burst
+        self.dp_overrides = dp_overrides or {}
+        self.decrease = decrease
+        self.increase = increase
+        self.min_factor = min_factor
+        self.cooldown = cooldown
+        self.clock = clock
+        self.sleep = sleep
+
+        self.lock = threading.Lock()
+        self.global_bucket = TokenBucket(global_rate, burst, clock())
+        self.dp_buckets = {}
+        self.factors = {None: 1.0}
+        self.last_decrease = {}
+
+    def _dp_bucket(self, dp_id, now):
+        if dp_id not in self.dp_buckets:
+            rate = self.dp_overrides.get(dp_id, self.dp_rate)
+            self.dp_buckets[dp_id] = TokenBucket(rate, self.burst, now)
+            self.factors.setdefault(dp_id, 1.0)
+        return self.dp_buckets[dp_id]
+
+    def try_acquire(self, dp_id, now=None):
+        """Take a token from both buckets, or return how long to wait before retrying"""
+        with self.lock:
+            now = self.clock() if now is None else now
+            dp_bucket = self._dp_bucket(dp_id, now)
+            global_factor = self.factors[None]
+            dp_factor = self.factors[dp_id]
+
+            self.global_bucket.refill(now, global_factor)
+            dp_bucket.refill(now, dp_factor)
+
+            wait = max(self.global_bucket.wait_time(global_factor), dp_bucket.wait_time(dp_factor))
+            if wait > 0:
+                return wait
+
+            self.global_bucket.tokens -= 1
+            dp_bucket.tokens -= 1
+            return 0.0
+
+    def acquire(self, dp_id):
+        """Block until both the global and the DP bucket allow another request"""
+        while True:
+            wait = self.try_acquire(dp_id)
+            if wait <= 0:
+                return
+            self.sleep(wait)
+
+    def record_success(self, dp_id):
+        with self.lock:
+            for key in (None, dp_id):
+                self.factors[key] = min(1.0, self.factors.get(key, 1.0) + self.increase)
+
+    def record_throttle(self, dp_id):
+        with self.lock:
+            now = self.clock()
+            for key in (None, dp_id):
+                if now - self.last_decrease.get(key, float("-inf")) < self.cooldown:
+                    continue
+                self.factors[key] = max(self.min_factor, self.factors.get(key, 1.0) * self.decrease)
+                self.last_decrease[key] = now
+
+    def current_rate(self, dp_id=None):
+        """Effective requests per second for a DP (or globally when dp_id is None)"""
+        base = self.global_rate if dp_id is None else self.dp_overrides.get(dp_id, self.dp_rate)
+        return base * self.factors.get(dp_id, 1.0)
+
+
+def _parse_overrides(value):
+    overrides = {}
+    for item in value.split(","):
+        if ":" in item:
+            dp_id, rate = item.split(":", 1)
+            overrides[dp_id.strip()] = float(rate)
+    return overrides
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Process-wide limiter shared by every engine and worker thread"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = AdaptiveRateLimiter(
+                global_rate=config("RATE_LIMIT_GLOBAL", default=2.0, cast=float),
+                dp_rate=config("RATE_LIMIT_PER_DP", default=1.0, cast=float),
+                burst=config("RATE_LIMIT_BURST", default=2, cast=int),
+                dp_overrides=_parse_overrides(config("RATE_LIMIT_DP_OVERRIDES", default="")),
+            )
+        return _limiter
+
+
+def simulate(limiter, clock, workers, server_capacity, duration, dp_ids=("default",),
+             latency=1.0, timeout_penalty=15.0):
+    """Discrete-event simulation of workers sharing `limiter` against a throttling server
+
+    The simulated server accepts `server_capacity` requests per second and answers
+    the rest with a throttle that costs the worker `timeout_penalty` seconds, just
+    like a WebDriverWait running into its ceiling. Overload in one second also
+    reduces the capacity of the next. `clock` must be a FakeClock that
+    the limiter was built with.
+    """
+    ready = [(0.0, i) for i in range(workers)]
+    heapq.heapify(ready)
+    served = {}
+    stats = {"submitted": 0, "throttled": 0}
+
+    while ready:
+        t, worker = heapq.heappop(ready)
+        if t >= duration:
+            continue
+        clock.now = t
+        dp_id = dp_ids[worker % len(dp_ids)]
+
+        wait = limiter.try_acquire(dp_id)
+        if wait > 0:
+            heapq.heappush(ready, (t + wait, worker))
+            continue
+
+        second = int(t)
+        served[second] = served.get(second, 0) + 1
+        # An overloaded second eats into the next one, as a backlogged backend does
+        backlog = max(0, served.get(second - 1, 0) - server_capacity)
+        if served[second] > max(1, server_capacity - backlog):
+            stats["throttled"] += 1
+            limiter.record_throttle(dp_id)
+            heapq.heappush(ready, (t + timeout_penalty, worker))
+        else:
+            stats["submitted"] += 1
+            limiter.record_success(dp_id)
+            heapq.heappush(ready, (t + latency, worker))
+
+    return stats
+
+
+class FakeClock:
+    """Manually advanced clock for simulate()"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
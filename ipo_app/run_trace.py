@@ -0,0 +1,108 @@
+# ipo_app/run_trace.py
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from decouple import config
+
+TRACE_DIR = config("RUN_TRACE_DIR", default="runs")
+
+
+class RunTrace:
+    """Timeline of one run, saved as runs/<run_id>.json and summarised at the end"""
+
+    def __init__(self, run_id=None, directory=TRACE_DIR):
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.directory = directory
+        self.started = time.monotonic()
+        self.events = []
+        self.lock = threading.Lock()
+
+    def record(self, kind, **fields):
+        event = {"t": round(time.monotonic() - self.started, 3), "kind": kind, **fields}
+        with self.lock:
+            self.events.append(event)
+        return event
+
+    def of_kind(self, kind):
+        with self.lock:
+            return [event for event in self.events if event["kind"] == kind]
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.run_id}.json")
+        with self.lock:
+            events = list(self.events)
+        with open(path, "w") as f:
+            json.dump({"run_id": self.run_id, "events": events}, f, indent=1)
+        return path
+
+    def print_summary(self):
+        print(f"\n📊 Run {self.run_id} summary ({time.monotonic() - self.started:.0f}s)")
+        self._print_step_timings()
+        self._print_breaker_transitions()
+        self._print_asset_proxy()
+        self._print_memory_curve()
+
+    def _print_asset_proxy(self):
+        for event in self.of_kind("proxy"):
+            cacheable = event["hits"] + event["misses"]
+            hit_rate = event["hits"] / cacheable if cacheable else 0
+            print(f"🗄️ Asset cache: {event['hits']}/{cacheable} static requests served locally ({hit_rate:.0%}), "
+                  f"{event['bytes_saved'] / 1024 / 1024:.1f} MB saved, {event['bytes_fetched'] / 1024 / 1024:.1f} MB "
+                  f"fetched, {event['passthrough']} passed through")
+
+    def _print_breaker_transitions(self):
+        transitions = self.of_kind("breaker")
+        if not transitions:
+            return
+        print("🔌 Circuit breaker:")
+        for event in transitions:
+            print(f"  {event['at']:>7.1f}s  {event['from']} → {event['to']}  ({event['reason']})")
+        opened = [event["at"] for event in transitions if event["to"] == "open"]
+        closed = [event["at"] for event in transitions if event["to"] == "closed"]
+        held = sum(end - start for start, end in zip(opened, closed))
+        print(f"  queue on hold for {held:.0f}s over {len(opened)} outage(s)")
+
+    def _print_step_timings(self):
+        steps = self.of_kind("step")
+        if not steps:
+            return
+        by_step = {}
+        for event in steps:
+            by_step.setdefault(event["step"], []).append(event["seconds"])
+        print("⏱️ Step timings (s):")
+        print(f"  {'step':<24}  {'n':>4}  {'avg':>6}  {'p50':>6}  {'max':>6}  failed")
+        for step, durations in by_step.items():
+            durations = sorted(durations)
+            failed = sum(1 for event in steps if event["step"] == step and not event.get("ok"))
+            print(f"  {step:<24}  {len(durations):>4}  {sum(durations) / len(durations):>6.2f}  "
+                  f"{durations[len(durations) // 2]:>6.2f}  {durations[-1]:>6.2f}  {failed}")
+
+        per_account = {}
+        for event in steps:
+            per_account[event["account"]] = per_account.get(event["account"], 0) + event["seconds"]
+        slowest = sorted(per_account.items(), key=lambda item: item[1], reverse=True)[:5]
+        print("  slowest accounts: " + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in slowest))
+
+    def _print_memory_curve(self):
+        samples = self.of_kind("memory")
+        if not samples:
+            return
+        print("🧠 Memory after each account (MB):")
+        print(f"  {'#':>3}  {'python':>7}  {'browser':>8}  {'js heap':>8}  account")
+        for i, sample in enumerate(samples, 1):
+            row = [_mb(sample.get(key)) for key in ("python_mb", "browser_mb", "js_heap_mb")]
+            recycled = "  ♻️ recycled" if sample.get("recycled") else ""
+            print(f"  {i:>3}  {row[0]:>7}  {row[1]:>8}  {row[2]:>8}  {sample.get('account', '')}{recycled}")
+
+        first, last = samples[0], samples[-1]
+        for key, label in (("python_mb", "python"), ("browser_mb", "browser"), ("js_heap_mb", "js heap")):
+            if first.get(key) is not None and last.get(key) is not None:
+                print(f"  {label} growth: {last[key] - first[key]:+.1f} MB over {len(samples)} accounts")
+
+
+def _mb(value):
+    return "-" if value is None else f"{value:.1f}"
@@ -0,0 +1,110 @@
+# ipo_app/scheduler.py
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+
+from decouple import config
+from django.db.models import Avg, DurationField, ExpressionWrapper, F
+
+from .models import ApplicationRecord
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_ORDER = config("SCHEDULE_ORDER", default="longest_first")  # or shortest_first
+DEFAULT_SECONDS = config("SCHEDULE_DEFAULT_SECONDS", default=60, cast=float)
+
+
+def historical_durations(usernames):
+    """Average seconds a submitted application took per username, from the ledger"""
+    rows = (
+        ApplicationRecord.objects
+        .filter(username__in=usernames, status=ApplicationRecord.STATUS_SUBMITTED,
+                started_at__isnull=False, finished_at__isnull=False)
+        .values("username")
+        .annotate(avg=Avg(ExpressionWrapper(F("finished_at") - F("started_at"), output_field=DurationField())))
+    )
+    return {row["username"]: row["avg"].total_seconds() for row in rows if row["avg"] is not None}
+
+
+def _format_seconds(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m{seconds:02d}s" if minutes else f"{seconds}s"
+
+
+class Scheduler:
+    """Hands out plan entries by priority, then by expected duration
+
+    Expected durations come from the ledger; accounts without history get the
+    median of those with history. Longest-first (the default) keeps a long
+    account from being the straggler at the end of the book; shortest-first
+    gets the most accounts in early. Each finished account updates a per-DP
+    drift factor (observed / expected time this run), so when one DP is slow
+    today its remaining accounts are re-ranked and the ETA follows.
+    """
+
+    def __init__(self, plan, workers=1, order=SCHEDULE_ORDER, durations=None, clock=time.monotonic):
+        self.workers = max(1, workers)
+        self.order = order
+        self.clock = clock
+        self.remaining = list(plan)
+        self.running = {}
+        self.drift = {}
+
+        history = durations if durations is not None else historical_durations([acc["username"] for acc in plan])
+        known = sorted(history.values())
+        fallback = known[len(known) // 2] if known else DEFAULT_SECONDS
+        self.expected = {acc["username"]: history.get(acc["username"], fallback) for acc in plan}
+
+    def __bool__(self):
+        return bool(self.remaining)
+
+    def estimate(self, acc):
+        """Expected seconds for an account, scaled by how its DP is doing this run"""
+        ratios = self.drift.get(acc["dp_id"])
+        factor = sum(ratios) / len(ratios) if ratios else 1.0
+        return self.expected[acc["username"]] * factor
+
+    def _key(self, acc):
+        duration = self.estimate(acc)
+        return (-int(acc.get("priority") or 0), duration if self.order == "shortest_first" else -duration)
+
+    def ordered(self):
+        """Remaining accounts in the order they would be handed out right now"""
+        return sorted(self.remaining, key=self._key)
+
+    def next(self):
+        """Take the best remaining account and mark it as running"""
+        acc = min(self.remaining, key=self._key)
+        self.remaining.remove(acc)
+        self.running[(acc["username"], acc.get("issue"))] = (acc, self.clock())
+        return acc
+
+    def done(self, acc):
+        """Record how long the account took and re-rank what is left"""
+        _, started = self.running.pop((acc["username"], acc.get("issue")))
+        took = self.clock() - started
+        self.drift.setdefault(acc["dp_id"], []).append(took / max(self.expected[acc["username"]], 1e-3))
+        return took
+
+    def requeue(self, acc):
+        """Put an account back, e.g. when it failed because the site went down"""
+        self.running.pop((acc["username"], acc.get("issue")), None)
+        self.remaining.append(acc)
+
+    def eta_seconds(self):
+        """Seconds until the book is done, list-scheduling what is left onto the workers"""
+        now = self.clock()
+        free_at = sorted(max(0.0, started + self.estimate(acc) - now) for acc, started in self.running.values())
+        free_at = (free_at + [0.0] * self.workers)[:self.workers]
+        heapq.heapify(free_at)
+        for acc in self.ordered():
+            heapq.heappush(free_at, heapq.heappop(free_at) + self.estimate(acc))
+        return max(free_at)
+
+    def report(self):
+        eta = self.eta_seconds()
+        finish = (datetime.now() + timedelta(seconds=eta)).strftime("%H:%M:%S")
+        logger.info(f"⏳ {len(self.remaining)} queued, {len(self.running)} running, "
+                    f"~{_format_seconds(eta)} to go (finish ~{finish})")
+        return eta
@@ -0,0 +1,217 @@
+# ipo_app/status_poller.py
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .eligibility import issue_terms, load_open_issues
+from .ledger import record_application_status
+from .logs import account_scope
+from .models import ApplicationRecord
+
+logger = logging.getLogger(__name__)
+
+API_URL = config("MEROSHARE_API_URL", default="https://webbackend.cdsc.com.np/api/meroShare")
+WORKERS = config("STATUS_WORKERS", default=8, cast=int)
+POLL_INTERVAL = config("STATUS_POLL_INTERVAL", default=300, cast=int)
+MAX_POLL_INTERVAL = config("STATUS_MAX_POLL_INTERVAL", default=6 * 3600, cast=int)
+
+REPORT_QUERY = {
+    "filterFieldParams": [
+        {"key": "companyShare.companyIssue.companyISIN.script", "alias": "Scrip"},
+        {"key": "companyShare.companyIssue.companyISIN.company.name", "alias": "Company Name"},
+    ],
+    "filterDateParams": [
+        {"key": "appliedDate", "condition": "", "alias": "", "value": ""},
+        {"key": "appliedDate", "condition": "", "alias": "", "value": ""},
+    ],
+    "page": 1,
+    "size": 200,
+    "searchRoleViewConstants": "VIEW_APPLICANT_FORM_COMPLETE",
+}
+
+
+def normalise_status(status_name):
+    """Map MeroShare's statusName (e.g. TRANSACTION_SUCCESS, Verified, BLOCK_FAILED) to a ledger status"""
+    status = (status_name or "").lower()
+    if "reject" in status:
+        return ApplicationRecord.APPLICATION_REJECTED
+    if "fail" in status:
+        return ApplicationRecord.APPLICATION_BLOCK_FAILED
+    if "verified" in status and "unverified" not in status:
+        return ApplicationRecord.APPLICATION_VERIFIED
+    return ApplicationRecord.APPLICATION_UNVERIFIED
+
+
+class MeroShareClient:
+    """Talks to the JSON backend behind the MeroShare web app
+
+    The auth token of every account is kept and reused for later polls; it is
+    only replaced when the backend answers 401.
+    """
+
+    def __init__(self, base_url=API_URL, timeout=15):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.tokens = {}
+        self.capitals = None
+        self.lock = threading.Lock()
+        self.logins = 0
+
+    def _request(self, path, payload=None, token=None, method=None):
+        data = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        if token:
+            headers["Authorization"] = token
+        request = urllib.request.Request(f"{self.base_url}{path}", data=data, headers=headers, method=method)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            body = response.read().decode()
+            return (json.loads(body) if body else None), response.headers
+
+    def capital_id(self, dp_id):
+        """Backend id of a DP from its code (the dp_id stored on the account)"""
+        with self.lock:
+            if self.capitals is None:
+                self.capitals = {str(capital["code"]): capital["id"] for capital in self._request("/capital/")[0]}
+        if str(dp_id) not in self.capitals:
+            raise Exception(f"Unknown DP {dp_id}")
+        return self.capitals[str(dp_id)]
+
+    def login(self, acc):
+        payload = {"clientId": self.capital_id(acc["dp_id"]), "username": acc["username"], "password": acc["password"]}
+        _, headers = self._request("/auth/", payload)
+        token = headers.get("Authorization")
+        if not token:
+            raise Exception("Login failed: no token returned")
+        with self.lock:
+            self.tokens[acc["username"]] = token
+            self.logins += 1
+        return token
+
+    def call(self, acc, path, payload=None):
+        """Authenticated request with the account's cached token, logging in when there is none or it expired"""
+        with self.lock:
+            token = self.tokens.get(acc["username"])
+        for attempt in range(2):
+            token = token or self.login(acc)
+            try:
+                return self._request(path, payload, token)[0]
+            except urllib.error.HTTPError as e:
+                if e.code != 401 or attempt:
+                    raise
+                token = None
+
+    def application_statuses(self, acc, issues):
+        """{issue: (status, message)} from the account's application report; missing issues are left out"""
+        forms = self.call(acc, "/applicantForm/active/search/", REPORT_QUERY).get("object", [])
+        statuses = {}
+        for issue in issues:
+            terms = [term.lower() for term in issue_terms(issue)]
+            form = next((form for form in forms if any(
+                term in f"{form.get('companyName', '')} {form.get('scrip', '')}".lower() for term in terms)), None)
+            if form is None:
+                continue
+            detail = self.call(acc, f"/applicantForm/report/detail/{form['applicantFormId']}")
+            status_name = detail.get("statusName") or form.get("statusName")
+            statuses[issue] = (normalise_status(status_name), detail.get("reasonOrRemark") or status_name or "")
+        return statuses
+
+
+def pending_records(issue=None):
+    """Submitted applications not yet in a final state"""
+    records = (
+        ApplicationRecord.objects
+        .filter(status=ApplicationRecord.STATUS_SUBMITTED, account__isnull=False)
+        .exclude(application_status__in=ApplicationRecord.FINAL_APPLICATION_STATUSES)
+    )
+    return records.filter(issue=issue) if issue else records
+
+
+def due_records(issue=None):
+    """Pending applications whose next check is due"""
+    return pending_records(issue).filter(Q(next_status_check_at__isnull=True) | Q(next_status_check_at__lte=timezone.now()))
+
+
+def poll_once(client, records, open_issues, workers=WORKERS, interval=POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL):
+    """Check every record once: one report fetch per account, `workers` accounts at a time"""
+    by_account = {}
+    for record in records.select_related("account"):
+        by_account.setdefault(record.account_id, []).append(record)
+
+    def check(account_records):
+        account = account_records[0].account
+        acc = {"name": account.name, "dp_id": account.dp_id, "username": account.username,
+               "password": account.password}
+        with account_scope(acc):
+            try:
+                return client.application_statuses(acc, [record.issue for record in account_records])
+            except Exception as e:
+                return e
+
+    counts = {"checked": 0, "final": 0, "reapply": 0, "errors": 0}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(check, by_account.values())
+        for account_records, result in zip(by_account.values(), results):
+            for record in account_records:
+                name = record.account.name
+                if isinstance(result, Exception):
+                    counts["errors"] += 1
+                    logger.error(f"❌ {name}: status check failed: {result}")
+                    status, message = record.application_status, f"Check failed: {result}"
+                elif record.issue not in result:
+                    logger.warning(f"⚠️ {name}: {record.issue} is not in the application report")
+                    status, message = record.application_status, "Not found in application report"
+                else:
+                    status, message = result[record.issue]
+
+                failed = status in (ApplicationRecord.APPLICATION_REJECTED, ApplicationRecord.APPLICATION_BLOCK_FAILED)
+                reapply = failed and record.issue in open_issues
+                record_application_status(record, status, message, reapply, interval, max_interval)
+                counts["checked"] += 1
+                counts["final"] += status in ApplicationRecord.FINAL_APPLICATION_STATUSES
+                counts["reapply"] += reapply
+                if reapply:
+                    logger.warning(f"🔁 {name}: {record.issue} {status.replace('_', ' ')} ({message}); "
+                                   f"flagged for reapplication")
+                elif status:
+                    logger.info(f"{'✅' if status == ApplicationRecord.APPLICATION_VERIFIED else '➖'} {name}: "
+                                f"{record.issue} {status.replace('_', ' ')}")
+    return counts
+
+
+def poll_statuses(issue=None, once=False, client=None, open_issues=None, max_hours=48, sleep=time.sleep,
+                  **options):
+    """Re-check submitted applications until every one is final (or `max_hours` pass)
+
+    Each round only takes the records whose growing interval has elapsed, then
+    sleeps until the next one is due.
+    """
+    client = client or MeroShareClient()
+    open_issues = open_issues if open_issues is not None else [open_issue["name"] for open_issue in load_open_issues()]
+    deadline = time.monotonic() + max_hours * 3600
+    totals = {"checked": 0, "final": 0, "reapply": 0, "errors": 0}
+
+    while True:
+        records = due_records(issue)
+        if records.exists():
+            counts = poll_once(client, records, open_issues, **options)
+            for key, value in counts.items():
+                totals[key] += value
+        pending = pending_records(issue)
+        if once or not pending.exists() or time.monotonic() >= deadline:
+            break
+        next_check = pending.aggregate(next_check=Min("next_status_check_at"))["next_check"]
+        delay = (next_check - timezone.now()).total_seconds() if next_check else 0
+        logger.info(f"⏳ {pending.count()} applications still pending, next check in {max(delay, 0):.0f}s")
+        sleep(max(delay, 1))
+
+    logger.info(f"🏁 {totals['checked']} status checks, {totals['final']} final, {totals['reapply']} flagged for "
+                f"reapplication, {totals['errors']} errors, {client.logins} logins")
+    return totals
@@ -1,3 +1,7 @@
+import logging
+import os
+import re
+import socket
 import time
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -6,35 +10,53 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from decouple import config
 
+from ipo_app.artifacts import capture_failure, get_artifact_store
+from ipo_app.asset_proxy import proxy_snapshot, proxy_stats_since, use_asset_proxy
+from ipo_app.browser_pool import LOGIN_URL
+from ipo_app.circuit_breaker import get_circuit_breaker
+from ipo_app.config_loader import load_accounts, unsealed
+from ipo_app.eligibility import evaluate, issue_terms, load_open_issues, print_ineligible
+from ipo_app.fields import sealed_value
+from ipo_app.events import publish_step
+from ipo_app.ledger import finish_application, record_already_applied, start_application
+from ipo_app.logs import account_scope, step_scope
+from ipo_app.memory_guard import MemoryGuard
+from ipo_app.metrics import ACCOUNTS, ACCOUNTS_IN_PROGRESS, QUEUE_DEPTH, SERVER_ERRORS, STEP_FAILURES, STEP_SECONDS
+from ipo_app.models import UserAccount
+from ipo_app.pipeline import load_pipeline, register_step, run_pipeline
+from ipo_app.rate_limiter import get_rate_limiter
+from ipo_app.run_trace import RunTrace
+from ipo_app.scheduler import Scheduler
+from ipo_app.work_queue import LeaseHeartbeat, get_work_queue
 
-def load_accounts():
-    """Load accounts from .env"""
-    accounts = []
-    i = 1
-    while True:
-        name = config(f"ACC{i}_NAME", default=None)
-        dp_id = config(f"ACC{i}_DP_ID", default=None)
-        username = config(f"ACC{i}_USERNAME", default=None)
-        password = config(f"ACC{i}_PASSWORD", default=None)
-        crn = config(f"ACC{i}_CRN", default=None)
-        pin = config(f"ACC{i}_PIN", default=None)
-        lot = config(f"ACC{i}_LOT", default=None)
-
-        if not all([name, dp_id, username, password]):
-            break
-
-        accounts.append({
-            "name": name,
-            "dp_id": dp_id,
-            "username": username,
-            "password": password,
-            "crn": crn,
-            "pin": pin,
-            "lot": lot,
-        })
-        i += 1
-
-    return accounts
+logger = logging.getLogger(__name__)
+
+ASBA_URL = "https://meroshare.cdsc.com.np/#/asba"
+# How often an account that failed during an outage goes back on hold before it counts as failed
+MAX_HOLDS = 3
+
+
+def account_to_dict(account, roster):
+    """Build the account dict the browser steps expect from a UserAccount row
+
+    Secrets stay sealed (Fernet tokens, as in the .env roster); the worker
+    decrypts them with unsealed() while it handles the account.
+    """
+    # Quota details (and PINs not yet stored in the database) come from .env by username
+    env_acc = roster.get(account.username, {})
+    return {
+        "account": account,
+        "name": account.name,
+        "dp_id": account.dp_id,
+        "username": account.username,
+        "password": sealed_value(account, "password"),
+        "crn": sealed_value(account, "crn"),
+        "pin": sealed_value(account, "pin") or env_acc.get("pin"),
+        "lot": str(account.lot_size),
+        "district": env_acc.get("district", ""),
+        "foreign_employment": env_acc.get("foreign_employment", False),
+        "priority": account.priority,
+    }
 
 
 def select_dp(driver, dp_id):
@@ -58,7 +80,7 @@ def select_dp(driver, dp_id):
         search_box.send_keys(Keys.ENTER)
         time.sleep(1)
 
-        print(f"✅ DP selected: {dp_id}")
+        logger.info(f"✅ DP selected: {dp_id}")
 
     except Exception as e:
         raise Exception(f"Failed to select DP: {e}")
@@ -78,7 +100,7 @@ def enter_username(driver: webdriver.Chrome, username: str, timeout: int = 15):
         Exception: If the final value in the field does not match the input.
     """
     if not isinstance(username, str):
-        print("⚠️ Warning: The provided username is not a string. Attempting to convert.")
+        logger.warning("⚠️ Warning: The provided username is not a string. Attempting to convert.")
         username = str(username)
 
     try:
@@ -91,7 +113,7 @@ def enter_username(driver: webdriver.Chrome, username: str, timeout: int = 15):
         username_field.clear()
         time.sleep(0.3)  # Small delay for Angular to register the clear event
 
-        print(f"Typing username: {username}")
+        logger.debug(f"Typing username: {username}")
         # Type each character with a small delay
         for char in username:
             username_field.send_keys(char)
@@ -105,10 +127,10 @@ def enter_username(driver: webdriver.Chrome, username: str, timeout: int = 15):
         if final_value != username:
             raise ValueError(f"❌ Username mismatch: expected '{username}', but got '{final_value}'")
 
-        print(f"✅ Username entered successfully: {final_value}")
+        logger.info(f"✅ Username entered successfully: {final_value}")
 
     except Exception as e:
-        print(f"An error occurred while entering the username: {e}")
+        logger.error(f"An error occurred while entering the username: {e}")
         raise
 
 
@@ -121,12 +143,14 @@ def enter_password(driver, password):
     password_field.click()
     password_field.clear()
     password_field.send_keys(password)
-    print("🔑 Password entered successfully")
+    logger.info("🔑 Password entered successfully")
 
 
 def login(driver, acc):
     """Login to MeroShare and navigate directly to My ASBA page"""
-    driver.get("https://meroshare.cdsc.com.np/#/login")
+    # A browser from the warm pool is already parked on the login page
+    if driver.current_url != LOGIN_URL:
+        driver.get(LOGIN_URL)
 
     # Wait for login form
     WebDriverWait(driver, 15).until(
@@ -147,7 +171,7 @@ def login(driver, acc):
         EC.element_to_be_clickable((By.XPATH, "//button[contains(text(),'Login')]"))
     )
     login_button.click()
-    print(f"🔐 Attempting login for {acc['name']}...")
+    logger.info(f"🔐 Attempting login for {acc['name']}...")
 
     # ✅ Wait for dashboard or ASBA page after login
     try:
@@ -157,23 +181,23 @@ def login(driver, acc):
                 EC.url_contains("dashboard")
             )
         )
-        print("✅ Login successful!")
+        logger.info("✅ Login successful!")
 
         # 🔄 Navigate directly to ASBA page after login
         navigate_to_asba(driver)
 
     except Exception as e:
-        print(f"⚠️ Warning: Could not verify dashboard load: {e}")
-        print(f"Current URL: {driver.current_url}")
-        print("🔄 Trying to navigate to ASBA page anyway...")
+        logger.warning(f"⚠️ Warning: Could not verify dashboard load: {e}")
+        logger.debug(f"Current URL: {driver.current_url}")
+        logger.debug("🔄 Trying to navigate to ASBA page anyway...")
         navigate_to_asba(driver)
 
 
 def navigate_to_asba(driver):
     """Navigate to My ASBA section using direct URL"""
     try:
-        print("🔍 Navigating directly to My ASBA page...")
-        driver.get("https://meroshare.cdsc.com.np/#/asba")
+        logger.debug("🔍 Navigating directly to My ASBA page...")
+        driver.get(ASBA_URL)
         time.sleep(3)  # Wait for page to load
 
         # Verify ASBA page loaded
@@ -182,26 +206,26 @@ def navigate_to_asba(driver):
                 (By.XPATH, "//*[contains(text(),'Apply for Issue') or contains(text(),'Current Issue')]")
             )
         )
-        print("✅ Successfully navigated to My ASBA page")
+        logger.info("✅ Successfully navigated to My ASBA page")
 
     except Exception as e:
-        print(f"❌ Failed to navigate to My ASBA: {e}")
+        logger.error(f"❌ Failed to navigate to My ASBA: {e}")
         try:
-            print(f"Current URL: {driver.current_url}")
-            print(f"Page title: {driver.title}")
+            logger.debug(f"Current URL: {driver.current_url}")
+            logger.debug(f"Page title: {driver.title}")
         except:
             pass
         raise
 
 
-def select_ipo_and_apply(driver):
+def select_ipo_and_apply(driver, ipo_name=None):
     """Find specific IPO by name/symbol and click Apply"""
     try:
-        ipo_name = config("APPLY_IPO", default="")
+        ipo_name = ipo_name or config("APPLY_IPO", default="")
         if not ipo_name:
             raise Exception("APPLY_IPO not found in .env file")
         
-        print(f"🔍 Looking for IPO: {ipo_name}")
+        logger.debug(f"🔍 Looking for IPO: {ipo_name}")
         
         # Wait for the IPO list to load
         WebDriverWait(driver, 15).until(
@@ -209,15 +233,8 @@ def select_ipo_and_apply(driver):
         )
         time.sleep(2)
         
-        # Extract key parts from IPO name for flexible matching
-        ipo_parts = []
-        if "(" in ipo_name and ")" in ipo_name:
-            # Extract both full name and code in parentheses
-            full_part = ipo_name.split("(")[0].strip()
-            code_part = ipo_name.split("(")[1].split(")")[0].strip()
-            ipo_parts.extend([ipo_name, full_part, code_part])
-        else:
-            ipo_parts.append(ipo_name)
+        # Full name, company and scrip, for flexible matching
+        ipo_parts = issue_terms(ipo_name)
         
         # Add variations for better matching
         for part in ipo_parts.copy():
@@ -228,7 +245,7 @@ def select_ipo_and_apply(driver):
             # Add version with different spacing
             ipo_parts.append(part.replace(" ", "").upper())
         
-        print(f"🔍 Searching for IPO variations: {ipo_parts}")
+        logger.debug(f"🔍 Searching for IPO variations: {ipo_parts}")
         
         apply_button = None
         ipo_number = None
@@ -252,11 +269,11 @@ def select_ipo_and_apply(driver):
             
             for i, selector in enumerate(ipo_selectors):
                 try:
-                    print(f"🔍 Trying selector {i+1} with term '{search_term}'...")
+                    logger.debug(f"🔍 Trying selector {i+1} with term '{search_term}'...")
                     apply_button = WebDriverWait(driver, 2).until(
                         EC.element_to_be_clickable((By.XPATH, selector))
                     )
-                    print(f"✅ Found IPO using selector {i+1} with term '{search_term}'")
+                    logger.info(f"✅ Found IPO using selector {i+1} with term '{search_term}'")
                     
                     try:
                         # Look for data attributes or hidden fields that might contain the IPO ID/number
@@ -274,7 +291,7 @@ def select_ipo_and_apply(driver):
                                 value = element.get_attribute('value') or element.get_attribute('data-id') or element.get_attribute('data-ipo-id') or element.get_attribute('data-number')
                                 if value and value.isdigit():
                                     ipo_number = value
-                                    print(f"✅ Found IPO number: {ipo_number}")
+                                    logger.info(f"✅ Found IPO number: {ipo_number}")
                                     break
                             if ipo_number:
                                 break
@@ -288,10 +305,10 @@ def select_ipo_and_apply(driver):
                             number_match = re.search(r'\d+', onclick + href)
                             if number_match:
                                 ipo_number = number_match.group()
-                                print(f"✅ Extracted IPO number from attributes: {ipo_number}")
+                                logger.info(f"✅ Extracted IPO number from attributes: {ipo_number}")
                     
                     except Exception as e:
-                        print(f"⚠️ Could not extract IPO number: {e}")
+                        logger.warning(f"⚠️ Could not extract IPO number: {e}")
                     
                     break
                 except:
@@ -302,10 +319,10 @@ def select_ipo_and_apply(driver):
         
         if not apply_button:
             try:
-                print("❌ IPO not found. Available IPOs:")
+                logger.error("❌ IPO not found. Available IPOs:")
                 ipo_elements = driver.find_elements(By.XPATH, "//button[contains(@class,'btn-issue') or contains(text(),'Apply')]/ancestor::div[contains(@class,'row') or contains(@class,'company')]")
                 for i, element in enumerate(ipo_elements[:5]):  # Show first 5
-                    print(f"  {i+1}. {element.text[:100]}...")
+                    logger.debug(f"  {i+1}. {element.text[:100]}...")
             except:
                 pass
             raise Exception(f"IPO '{ipo_name}' not found or Apply button not available")
@@ -316,15 +333,15 @@ def select_ipo_and_apply(driver):
         
         if ipo_number:
             target_url = f"https://meroshare.cdsc.com.np/#/asba/apply/{ipo_number}"
-            print(f"🔗 Navigating to: {target_url}")
+            logger.debug(f"🔗 Navigating to: {target_url}")
             driver.get(target_url)
             time.sleep(3)
-            print(f"✅ Successfully navigated to IPO application page")
+            logger.info(f"✅ Successfully navigated to IPO application page")
         else:
             # Fallback to clicking the button if no number found
             apply_button.click()
             time.sleep(2)
-            print(f"✅ Clicked Apply button for IPO: {ipo_name}")
+            logger.info(f"✅ Clicked Apply button for IPO: {ipo_name}")
         
     except Exception as e:
         raise Exception(f"Failed to find and apply for IPO '{ipo_name}': {e}")
@@ -333,7 +350,7 @@ def select_ipo_and_apply(driver):
 def fill_ipo_form(driver, acc):
     """Auto-fill IPO application form with enhanced error handling"""
     try:
-        print("🔄 Waiting for IPO application form to load...")
+        logger.debug("🔄 Waiting for IPO application form to load...")
         
         # Wait for the form container to be present first
         WebDriverWait(driver, 20).until(
@@ -353,17 +370,17 @@ def fill_ipo_form(driver, acc):
         
         for selector_type, selector_value in bank_selectors:
             try:
-                print(f"🔍 Trying bank selector: {selector_type} = {selector_value}")
+                logger.debug(f"🔍 Trying bank selector: {selector_type} = {selector_value}")
                 bank_dropdown = WebDriverWait(driver, 5).until(
                     EC.element_to_be_clickable((selector_type, selector_value))
                 )
-                print(f"✅ Found bank dropdown using: {selector_type} = {selector_value}")
+                logger.info(f"✅ Found bank dropdown using: {selector_type} = {selector_value}")
                 break
             except:
                 continue
         
         if not bank_dropdown:
-            print("🔍 Bank dropdown not found with standard selectors, searching all select elements...")
+            logger.debug("🔍 Bank dropdown not found with standard selectors, searching all select elements...")
             select_elements = driver.find_elements(By.TAG_NAME, "select")
             for i, select_elem in enumerate(select_elements):
                 try:
@@ -375,7 +392,7 @@ def fill_ipo_form(driver, acc):
                     bank_keywords = ['bank', 'nabil', 'nic', 'everest', 'standard', 'himalayan', 'nepal investment']
                     if any(keyword in ' '.join(option_texts) for keyword in bank_keywords):
                         bank_dropdown = select_elem
-                        print(f"✅ Found bank dropdown by content analysis (select #{i})")
+                        logger.info(f"✅ Found bank dropdown by content analysis (select #{i})")
                         break
                 except:
                     continue
@@ -403,7 +420,7 @@ def fill_ipo_form(driver, acc):
                         EC.element_to_be_clickable((By.XPATH, selector))
                     )
                     bank_option.click()
-                    print(f"✅ Selected bank: {bank_name}")
+                    logger.info(f"✅ Selected bank: {bank_name}")
                     bank_selected = True
                     break
                 except:
@@ -413,9 +430,9 @@ def fill_ipo_form(driver, acc):
                 try:
                     first_bank_option = bank_dropdown.find_elements(By.TAG_NAME, "option")[1]  # Skip first empty option
                     first_bank_option.click()
-                    print(f"⚠️ Bank '{bank_name}' not found, selected first available bank: {first_bank_option.text}")
+                    logger.warning(f"⚠️ Bank '{bank_name}' not found, selected first available bank: {first_bank_option.text}")
                 except:
-                    print(f"❌ Could not select any bank option")
+                    logger.error(f"❌ Could not select any bank option")
         
         time.sleep(1)
         
@@ -433,7 +450,7 @@ def fill_ipo_form(driver, acc):
                 account_dropdown = WebDriverWait(driver, 5).until(
                     EC.element_to_be_clickable((selector_type, selector_value))
                 )
-                print(f"✅ Found account dropdown using: {selector_type} = {selector_value}")
+                logger.info(f"✅ Found account dropdown using: {selector_type} = {selector_value}")
                 break
             except:
                 continue
@@ -446,13 +463,13 @@ def fill_ipo_form(driver, acc):
                 account_options = account_dropdown.find_elements(By.TAG_NAME, "option")
                 if len(account_options) > 1:
                     account_options[1].click()  # Select first non-empty option
-                    print("✅ Selected first available account number")
+                    logger.info("✅ Selected first available account number")
                 else:
-                    print("⚠️ No account options found")
+                    logger.warning("⚠️ No account options found")
             except Exception as e:
-                print(f"⚠️ Could not select account: {e}")
+                logger.warning(f"⚠️ Could not select account: {e}")
         else:
-            print("⚠️ Account dropdown not found")
+            logger.warning("⚠️ Account dropdown not found")
         
         time.sleep(1)
         
@@ -486,9 +503,9 @@ def fill_ipo_form(driver, acc):
                     arguments[0].dispatchEvent(new Event('change', { bubbles: true }));
                 """, kitta_field)
                 
-                print(f"✅ Entered applied kitta: {acc['lot']}")
+                logger.info(f"✅ Entered applied kitta: {acc['lot']}")
             else:
-                print("⚠️ Kitta field not found")
+                logger.warning("⚠️ Kitta field not found")
         
         if acc.get("crn"):
             crn_field = None
@@ -512,9 +529,9 @@ def fill_ipo_form(driver, acc):
             if crn_field:
                 crn_field.clear()
                 crn_field.send_keys(acc["crn"])
-                print(f"✅ Entered CRN: {acc['crn']}")
+                logger.info("✅ Entered CRN")
             else:
-                print("⚠️ CRN field not found")
+                logger.warning("⚠️ CRN field not found")
         
         declaration_checkbox = None
         declaration_selectors = [
@@ -537,11 +554,11 @@ def fill_ipo_form(driver, acc):
         
         if declaration_checkbox and not declaration_checkbox.is_selected():
             declaration_checkbox.click()
-            print("✅ Ticked declaration checkbox")
+            logger.info("✅ Ticked declaration checkbox")
         elif declaration_checkbox:
-            print("✅ Declaration checkbox already selected")
+            logger.info("✅ Declaration checkbox already selected")
         else:
-            print("⚠️ Declaration checkbox not found")
+            logger.warning("⚠️ Declaration checkbox not found")
         
         time.sleep(1)
         
@@ -566,18 +583,17 @@ def fill_ipo_form(driver, acc):
         if proceed_button:
             proceed_button.click()
             time.sleep(3)
-            print("✅ Clicked Proceed button")
+            logger.info("✅ Clicked Proceed button")
         else:
-            print("⚠️ Proceed button not found")
+            logger.warning("⚠️ Proceed button not found")
         
     except Exception as e:
-        print(f"❌ Error in fill_ipo_form: {e}")
+        logger.error(f"❌ Error in fill_ipo_form: {e}")
         try:
-            print(f"Current URL: {driver.current_url}")
-            print(f"Page title: {driver.title}")
-            # Take screenshot of current state for debugging
-            driver.save_screenshot("error_screenshot.png")
-            print("📸 Screenshot saved as error_screenshot.png")
+            logger.debug(f"Current URL: {driver.current_url}")
+            logger.debug(f"Page title: {driver.title}")
+            # Capture the current state for debugging
+            capture_failure(driver, acc, "fill_ipo_form", str(e))
         except:
             pass
         raise Exception(f"Failed to fill IPO form: {e}")
@@ -589,7 +605,7 @@ def enter_pin_and_submit(driver, acc):
         if not acc.get("pin"):
             raise Exception("PIN not found in account configuration")
         
-        print("🔄 Waiting for PIN entry page...")
+        logger.debug("🔄 Waiting for PIN entry page...")
         time.sleep(2)
         
         pin_field = None
@@ -608,7 +624,7 @@ def enter_pin_and_submit(driver, acc):
                 pin_field = WebDriverWait(driver, 5).until(
                     EC.presence_of_element_located((selector_type, selector_value))
                 )
-                print(f"✅ Found PIN field using: {selector_type} = {selector_value}")
+                logger.info(f"✅ Found PIN field using: {selector_type} = {selector_value}")
                 break
             except:
                 continue
@@ -618,9 +634,9 @@ def enter_pin_and_submit(driver, acc):
         
         pin_field.clear()
         pin_field.send_keys(acc["pin"])
-        print(f"✅ Entered PIN")
+        logger.info(f"✅ Entered PIN")
         
-        print("🔄 Waiting for Apply button to become enabled...")
+        logger.debug("🔄 Waiting for Apply button to become enabled...")
         time.sleep(3)  # Wait for PIN validation
         
         apply_button = None
@@ -662,7 +678,7 @@ def enter_pin_and_submit(driver, acc):
         
         for i, selector in enumerate(apply_selectors):
             try:
-                print(f"🔍 Trying Apply button selector {i+1}: {selector}")
+                logger.debug(f"🔍 Trying Apply button selector {i+1}: {selector}")
                 
                 # Wait for button to be present
                 buttons = WebDriverWait(driver, 5).until(
@@ -676,38 +692,38 @@ def enter_pin_and_submit(driver, acc):
                             # Additional check - make sure it's visible and clickable
                             if button.is_displayed() and button.is_enabled():
                                 apply_button = button
-                                print(f"✅ Found enabled Apply button using selector {i+1}")
+                                logger.info(f"✅ Found enabled Apply button using selector {i+1}")
                                 break
                         else:
-                            print(f"⚠️ Button found but disabled, waiting for it to be enabled...")
+                            logger.warning(f"⚠️ Button found but disabled, waiting for it to be enabled...")
                             # Wait up to 10 seconds for button to become enabled
                             for wait_count in range(10):
                                 time.sleep(1)
                                 if button.get_attribute('disabled') is None:
                                     apply_button = button
-                                    print(f"✅ Button enabled after {wait_count + 1} seconds")
+                                    logger.info(f"✅ Button enabled after {wait_count + 1} seconds")
                                     break
                             if apply_button:
                                 break
                     except Exception as btn_error:
-                        print(f"⚠️ Error checking button: {btn_error}")
+                        logger.warning(f"⚠️ Error checking button: {btn_error}")
                         continue
                 
                 if apply_button:
                     break
                     
             except Exception as e:
-                print(f"⚠️ Selector {i+1} failed: {str(e)[:100]}...")
+                logger.warning(f"⚠️ Selector {i+1} failed: {str(e)[:100]}...")
                 continue
         
         # If still no button found, do comprehensive debugging
         if not apply_button:
-            print("🔍 Apply button not found. Debugging all available buttons...")
+            logger.debug("🔍 Apply button not found. Debugging all available buttons...")
             try:
                 all_buttons = driver.find_elements(By.TAG_NAME, "button")
                 all_inputs = driver.find_elements(By.XPATH, "//input[@type='submit' or @type='button']")
                 
-                print(f"📋 Found {len(all_buttons)} button elements and {len(all_inputs)} input elements:")
+                logger.debug(f"📋 Found {len(all_buttons)} button elements and {len(all_inputs)} input elements:")
                 
                 # Check all buttons
                 for i, btn in enumerate(all_buttons):
@@ -719,18 +735,18 @@ def enter_pin_and_submit(driver, acc):
                         visible = btn.is_displayed()
                         enabled = btn.is_enabled()
                         
-                        print(f"  Button {i+1}: text='{text}', class='{classes}', type='{btn_type}', disabled={disabled}, visible={visible}, enabled={enabled}")
+                        logger.debug(f"  Button {i+1}: text='{text}', class='{classes}', type='{btn_type}', disabled={disabled}, visible={visible}, enabled={enabled}")
                         
                         # Try to find a suitable button
                         if (disabled is None and visible and enabled and 
                             (text.lower() in ['apply', 'submit', 'confirm', 'continue'] or 
                              'btn-primary' in classes or 'btn-issue' in classes)):
-                            print(f"🎯 Using button {i+1} as Apply button")
+                            logger.debug(f"🎯 Using button {i+1} as Apply button")
                             apply_button = btn
                             break
                             
                     except Exception as e:
-                        print(f"  Button {i+1}: Error - {e}")
+                        logger.debug(f"  Button {i+1}: Error - {e}")
                 
                 # Check input elements if no button found
                 if not apply_button:
@@ -742,28 +758,28 @@ def enter_pin_and_submit(driver, acc):
                             visible = inp.is_displayed()
                             enabled = inp.is_enabled()
                             
-                            print(f"  Input {i+1}: value='{value}', class='{classes}', disabled={disabled}, visible={visible}, enabled={enabled}")
+                            logger.debug(f"  Input {i+1}: value='{value}', class='{classes}', disabled={disabled}, visible={visible}, enabled={enabled}")
                             
                             if (disabled is None and visible and enabled and 
                                 value.lower() in ['apply', 'submit', 'confirm']):
-                                print(f"🎯 Using input {i+1} as Apply button")
+                                logger.debug(f"🎯 Using input {i+1} as Apply button")
                                 apply_button = inp
                                 break
                                 
                         except Exception as e:
-                            print(f"  Input {i+1}: Error - {e}")
+                            logger.debug(f"  Input {i+1}: Error - {e}")
                             
             except Exception as debug_error:
-                print(f"❌ Error during debugging: {debug_error}")
+                logger.error(f"❌ Error during debugging: {debug_error}")
         
         if not apply_button:
-            # Take screenshot for debugging
-            try:
-                driver.save_screenshot("apply_button_not_found.png")
-                print("📸 Screenshot saved as apply_button_not_found.png")
-            except:
-                pass
+            # Capture the page for debugging
+            capture_failure(driver, acc, "apply_button_not_found")
             raise Exception("Apply button not found after comprehensive search")
+
+        if acc.get("dry_run"):
+            logger.info("🧪 Dry run: Apply button found and enabled, not clicking it")
+            return
         
         # Click the Apply button
         try:
@@ -773,20 +789,20 @@ def enter_pin_and_submit(driver, acc):
             
             # Try regular click
             apply_button.click()
-            print("✅ Successfully clicked Apply button")
+            logger.info("✅ Successfully clicked Apply button")
             
         except Exception as click_error:
-            print(f"⚠️ Regular click failed: {click_error}")
+            logger.warning(f"⚠️ Regular click failed: {click_error}")
             try:
                 # Try JavaScript click as fallback
                 driver.execute_script("arguments[0].click();", apply_button)
-                print("✅ Successfully clicked Apply button using JavaScript")
+                logger.info("✅ Successfully clicked Apply button using JavaScript")
             except Exception as js_error:
                 raise Exception(f"Both regular and JavaScript clicks failed: {click_error}, {js_error}")
         
         # Wait for completion and check for success
         time.sleep(5)
-        print("✅ Apply button clicked - waiting for confirmation...")
+        logger.info("✅ Apply button clicked - waiting for confirmation...")
         
         # Check for success indicators
         try:
@@ -805,88 +821,419 @@ def enter_pin_and_submit(driver, acc):
                     success_element = WebDriverWait(driver, 3).until(
                         EC.presence_of_element_located((By.XPATH, indicator))
                     )
-                    print(f"🎉 Success confirmation: {success_element.text[:100]}")
+                    logger.info(f"🎉 Success confirmation: {success_element.text[:100]}")
                     break
                 except:
                     continue
             else:
-                print("⚠️ No explicit success message found, but Apply button was clicked successfully")
+                logger.warning("⚠️ No explicit success message found, but Apply button was clicked successfully")
                 
         except Exception as e:
-            print(f"⚠️ Error checking success: {e}")
+            logger.warning(f"⚠️ Error checking success: {e}")
         
-        print("🎉 IPO application process completed!")
+        logger.info("🎉 IPO application process completed!")
         
     except Exception as e:
-        print(f"❌ Error in enter_pin_and_submit: {e}")
+        logger.error(f"❌ Error in enter_pin_and_submit: {e}")
         try:
-            print(f"Current URL: {driver.current_url}")
-            driver.save_screenshot("pin_submit_error.png")
-            print("📸 Error screenshot saved as pin_submit_error.png")
+            logger.debug(f"Current URL: {driver.current_url}")
+            capture_failure(driver, acc, "enter_pin_and_submit", str(e))
         except:
             pass
         raise Exception(f"Failed to complete PIN submission: {e}")
 
 
-def apply_ipo_for_account(driver, acc):
-    """Complete IPO application process for one account"""
+REPORT_ROWS_JS = """
+return [...document.querySelectorAll('.company-list, table tbody tr')]
+    .map(row => row.innerText.trim()).filter(text => text);
+"""
+
+
+def issue_in_report(rows, ipo_name):
+    """Whether one Application Report row names the issue: full name, company or scrip, as whole words"""
+    patterns = [re.compile(rf"(?<!\w){re.escape(term)}(?!\w)", re.IGNORECASE) for term in issue_terms(ipo_name)]
+    return any(pattern.search(row) for row in rows for pattern in patterns)
+
+
+def check_already_applied(driver, ipo_name):
+    """Look for the issue under My ASBA > Application Report"""
+    navigate_to_asba(driver)
+    report_tab = WebDriverWait(driver, 15).until(
+        EC.element_to_be_clickable((By.XPATH, "//*[contains(text(),'Application Report')]"))
+    )
+    report_tab.click()
+    time.sleep(2)
+
+    # Only the report's rows: the page header, menus and the Apply tab also carry issue names
+    rows = driver.execute_script(REPORT_ROWS_JS) or []
+    return issue_in_report(rows, ipo_name)
+
+
+def on_asba_page(driver, acc):
+    """My ASBA is showing its issue list (login already navigates here)"""
+    return driver.current_url.rstrip("/") == ASBA_URL and bool(
+        driver.find_elements(By.XPATH, "//*[contains(text(),'Apply for Issue') or contains(text(),'Current Issue')]")
+    )
+
+
+def in_asba_section(driver, acc):
+    """Still inside My ASBA, i.e. the session has not bounced back to the login page"""
+    return driver.current_url.startswith(ASBA_URL)
+
+
+def capture_confirmation(driver, acc):
+    """Optional stage: keep a screenshot of the page MeroShare shows after submitting"""
+    time.sleep(2)
+    get_artifact_store().capture(driver, acc["name"], "confirmation", run_id=acc.get("run_id"))
+
+
+register_step("asba", lambda driver, acc: navigate_to_asba(driver), postcondition=on_asba_page)
+register_step("select_issue", lambda driver, acc: select_ipo_and_apply(driver, acc.get("issue")),
+              precondition=on_asba_page)
+register_step("fill_form", fill_ipo_form, precondition=in_asba_section)
+register_step("submit", enter_pin_and_submit, precondition=in_asba_section)
+register_step("capture_confirmation", capture_confirmation)
+
+
+def apply_ipo_for_account(driver, acc, steps=None):
+    """Complete IPO application process for one account (steps from APPLY_PIPELINE)"""
     try:
-        # Navigate to My ASBA
-        navigate_to_asba(driver)
-        
-        # Find specific IPO and Apply
-        select_ipo_and_apply(driver)
-        
-        # Fill the IPO form
-        fill_ipo_form(driver, acc)
+        run_pipeline(driver, acc, steps or load_pipeline(), run_throttled)
         
-        # Enter PIN and submit
-        enter_pin_and_submit(driver, acc)
-        
-        print(f"🎉 IPO application completed for {acc['name']}")
+        if acc.get("dry_run"):
+            logger.info(f"🧪 Dry run completed for {acc['name']} (nothing submitted)")
+        else:
+            logger.info(f"🎉 IPO application completed for {acc['name']}")
         
     except Exception as e:
-        print(f"❌ IPO application failed for {acc['name']}: {e}")
+        logger.error(f"❌ IPO application failed for {acc['name']}: {e}")
         raise
 
 
-def apply_ipo_for_all():
-    """Main function"""
-    accounts = load_accounts()
+def count_server_errors(driver):
+    """Count 429/5xx responses the page received since the last call"""
+    try:
+        return driver.execute_script("""
+            const failed = performance.getEntriesByType('resource')
+                .filter(e => e.responseStatus === 429 || e.responseStatus >= 500).length;
+            performance.clearResourceTimings();
+            return failed;
+        """) or 0
+    except:
+        return 0
+
+
+def record_step_timing(acc, step_name, started, ok):
+    """Add a step duration to the metrics and to the run trace, if the account belongs to a traced run"""
+    seconds = time.monotonic() - started
+    STEP_SECONDS.observe(seconds, step=step_name)
+    if not ok:
+        STEP_FAILURES.inc(step=step_name)
+    if acc.get("trace"):
+        acc["trace"].record("step", account=acc["name"], step=step_name, seconds=round(seconds, 3), ok=ok)
 
-    if not accounts:
-        print("❌ No accounts found in .env")
-        return
 
+def run_throttled(step, driver, acc, *args):
+    """Run a browser step under the shared rate limiter and report how the server coped"""
+    limiter = get_rate_limiter()
+    limiter.acquire(acc["dp_id"])
+    publish_step(acc, step.__name__, "started")
+    started = time.monotonic()
+    try:
+        with step_scope(step.__name__):
+            result = step(driver, *args)
+    except Exception as e:
+        limiter.record_throttle(acc["dp_id"])
+        record_step_timing(acc, step.__name__, started, ok=False)
+        publish_step(acc, step.__name__, "failed", seconds=round(time.monotonic() - started, 2), error=str(e)[:200])
+        raise
+    record_step_timing(acc, step.__name__, started, ok=True)
+    publish_step(acc, step.__name__, "ok", seconds=round(time.monotonic() - started, 2))
+
+    server_errors = count_server_errors(driver)
+    if server_errors:
+        SERVER_ERRORS.inc(server_errors, dp_id=acc["dp_id"])
+        logger.warning(f"⚠️ Server returned {server_errors} throttled/5xx responses, slowing down")
+        limiter.record_throttle(acc["dp_id"])
+    else:
+        limiter.record_success(acc["dp_id"])
+    return result
+
+
+def create_driver():
+    """Start a Chrome instance for the runner"""
     options = webdriver.ChromeOptions()
     options.add_experimental_option("detach", True)
-    driver = webdriver.Chrome(options=options)
+    use_asset_proxy(options)
+    return webdriver.Chrome(options=options)
 
-    print(f"🎉 Chrome opened. {len(accounts)} accounts to process.")
 
-    for i, acc in enumerate(accounts, 1):
-        print(f"\n=== Processing {acc['name']} ({i}/{len(accounts)}) ===")
+def replace_driver(driver, pool=None):
+    """Swap a bloated browser for a fresh one"""
+    if pool:
+        pool.release(driver, recycle=True)
+        return pool.borrow()
+    driver.quit()
+    return create_driver()
+
+
+def process_account(driver, acc, issue, worker="", run=None):
+    """Log in and apply for one account, recording the outcome in the ledger
+
+    The account's secrets are decrypted here and dropped again when it is done.
+    """
+    with unsealed(acc) as acc, account_scope(acc):
+        # A dry run must not touch the real ledger row for this issue
+        record = None if acc.get("dry_run") else start_application(acc, issue, worker, run)
+        ACCOUNTS_IN_PROGRESS.inc()
         try:
-            print(f"🔑 Starting login process for {acc['name']}...")
-            login(driver, acc)
-            print(f"✅ Login process completed for {acc['name']}")
-            
-            print("🚀 Starting IPO application process...")
+            logger.info(f"🔑 Starting login process for {acc['name']}...")
+            run_throttled(login, driver, acc, acc)
+            logger.info(f"✅ Login process completed for {acc['name']}")
+
+            logger.info("🚀 Starting IPO application process...")
             apply_ipo_for_account(driver, acc)
-            
+            if record:
+                finish_application(record, ok=True)
+            get_circuit_breaker().record_success()
+            outcome = "rehearsed" if acc.get("dry_run") else "submitted"
+            ACCOUNTS.inc(outcome=outcome)
+            publish_step(acc, "account", outcome)
+            return True
+
         except Exception as e:
-            print(f"❌ Error processing {acc['name']}: {e}")
-            import traceback
-            print(f"Full error traceback: {traceback.format_exc()}")
+            logger.exception(f"❌ Error processing {acc['name']}: {e}")
             try:
-                print(f"Current URL when error occurred: {driver.current_url}")
-                print(f"Page title: {driver.title}")
+                logger.debug(f"Current URL when error occurred: {driver.current_url}")
+                logger.debug(f"Page title: {driver.title}")
             except:
                 pass
-            # Continue with next account
-            continue
+            if record:
+                finish_application(record, ok=False, message=str(e))
+            get_circuit_breaker().record_failure(str(e))
+            ACCOUNTS.inc(outcome="failed")
+            publish_step(acc, "account", "failed")
+            return False
+        finally:
+            ACCOUNTS_IN_PROGRESS.dec()
 
-    driver.quit()
+
+def record_proxy_stats(trace, before):
+    """Add the asset proxy's hit rate for this run to the trace"""
+    stats = proxy_stats_since(before)
+    if stats:
+        trace.record("proxy", **stats)
+
+
+def run_plan(plan, trace, pool=None, run=None):
+    """Process eligible applications one after another on a single browser (or the warm pool)
+
+    The order comes from the scheduler: priority first, then expected duration.
+    While the circuit breaker is open the queue is on hold, and accounts that
+    failed because the site went down are put back.
+    """
+    guard = MemoryGuard(trace)
+    breaker = get_circuit_breaker()
+    run_started = time.monotonic()
+    proxy_before = proxy_snapshot()
+    first_submission = None
+    driver = None if pool else create_driver()
+
+    logger.info(f"🎉 Chrome {'pool ready' if pool else 'opened'}. {len(plan)} applications to process.")
+    scheduler = Scheduler(plan)
+    scheduler.report()
+
+    try:
+        while scheduler:
+            breaker.wait_until_closed()
+            acc = scheduler.next()
+            QUEUE_DEPTH.set(len(scheduler.remaining))
+            logger.info(f"=== Processing {acc['name']} ({len(plan) - len(scheduler.remaining)}/{len(plan)}) ===")
+            acc["run_id"] = trace.run_id
+            acc["trace"] = trace
+            # Continue with next account on failure
+            if pool:
+                pooled_driver = pool.borrow()
+                ok = process_account(pooled_driver, acc, acc["issue"], run=run)
+                pool.release(pooled_driver, recycle=guard.check(pooled_driver, acc["name"]))
+            else:
+                ok = process_account(driver, acc, acc["issue"], run=run)
+                if guard.check(driver, acc["name"]):
+                    driver = replace_driver(driver)
+
+            if not ok and breaker.is_open() and acc.get("holds", 0) < MAX_HOLDS:
+                acc["holds"] = acc.get("holds", 0) + 1
+                logger.info(f"⏸️ {acc['name']} back on hold until MeroShare recovers")
+                scheduler.requeue(acc)
+                QUEUE_DEPTH.set(len(scheduler.remaining))
+                continue
+
+            if ok and first_submission is None:
+                first_submission = time.monotonic() - run_started
+                logger.info(f"⏱️ First submission {first_submission:.1f}s after run start (warm pool: {'yes' if pool else 'no'})")
+
+            scheduler.done(acc)
+            trace.record("eta", account=acc["name"], seconds=round(scheduler.report(), 1))
+    finally:
+        if driver:
+            driver.quit()
+        for transition in breaker.transitions_since(run_started):
+            trace.record("breaker", at=round(transition["at"] - trace.started, 1),
+                         **{key: transition[key] for key in ("from", "to", "reason")})
+        record_proxy_stats(trace, proxy_before)
+        get_artifact_store().flush()
+        trace.save()
+        trace.print_summary()
+    return first_submission
+
+
+def apply_ipo_for_all(pool=None, dry_run=False):
+    """Main function"""
+    accounts = load_accounts()
+
+    if not accounts:
+        logger.error("❌ No accounts found in .env")
+        return
+
+    # Work out kitta and drop ineligible accounts before any browser work
+    plan, ineligible = evaluate(accounts, load_open_issues())
+    print_ineligible(ineligible)
+    if not plan:
+        logger.error("❌ No eligible accounts to apply for")
+        return
+
+    if dry_run:
+        logger.info("🧪 Dry run: every step runs except the final Apply click")
+        for acc in plan:
+            acc["dry_run"] = True
+
+    return run_plan(plan, RunTrace(run_id=f"dryrun-{time.strftime('%Y%m%d-%H%M%S')}" if dry_run else None), pool)
+
+
+def apply_ipo_for_queryset(queryset, run=None):
+    """Apply for the configured issue with a set of UserAccount rows (used by background jobs)"""
+    roster = {acc["username"]: acc for acc in load_accounts()}
+    issues = load_open_issues()
+    if run is not None and run.issue:
+        issues = [dict(issue, name=run.issue) for issue in issues]
+
+    plan, ineligible = evaluate([account_to_dict(account, roster) for account in queryset], issues)
+    print_ineligible(ineligible)
+    if not plan:
+        logger.error("❌ No eligible accounts to apply for")
+        return
+
+    trace = RunTrace(run_id=f"job-{run.pk}" if run is not None else None)
+    return run_plan(plan, trace, run=run)
+
+
+def check_applied_for_queryset(queryset, run=None):
+    """Record which UserAccounts already have an application for the run's issue"""
+    issue = run.issue if run is not None and run.issue else config("APPLY_IPO", default="")
+    roster = {acc["username"]: acc for acc in load_accounts()}
+    driver = create_driver()
+    applied = 0
+    try:
+        for account in queryset:
+            with unsealed(account_to_dict(account, roster)) as acc, account_scope(acc):
+                try:
+                    run_throttled(login, driver, acc, acc)
+                    if check_already_applied(driver, issue):
+                        record_already_applied(acc, issue, run)
+                        applied += 1
+                        logger.info(f"✅ {acc['name']} already applied for {issue}")
+                    else:
+                        logger.info(f"➖ {acc['name']} has not applied for {issue}")
+                except Exception as e:
+                    logger.error(f"❌ Could not check {acc['name']}: {e}")
+    finally:
+        driver.quit()
+    logger.info(f"🏁 {applied} accounts already applied for {issue}")
+    return applied
+
+
+def enqueue_shard_run(account_ids=None):
+    """Put UserAccount rows on the shared work queue for the configured issue"""
+    issue = config("APPLY_IPO", default="")
+    accounts = UserAccount.objects.all()
+    if account_ids is not None:
+        accounts = accounts.filter(id__in=account_ids)
+    # Claims are handed out in queue order, so queue in scheduling order
+    ordered = Scheduler(list(accounts.values("id", "username", "dp_id", "priority"))).ordered()
+    queued = get_work_queue(issue).enqueue([acc["id"] for acc in ordered])
+    logger.info(f"📥 {queued} accounts queued for {issue}")
+    return queued
+
+
+def apply_ipo_for_shard(worker=None, batch=1, pool=None):
+    """Claim accounts from the shared work queue until it is drained"""
+    issue = config("APPLY_IPO", default="")
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}"
+    queue = get_work_queue(issue)
+
+    roster = {acc["username"]: acc for acc in load_accounts()}
+    issues = [open_issue for open_issue in load_open_issues() if open_issue["name"] == issue]
+
+    trace = RunTrace(run_id=f"{worker}-{time.strftime('%Y%m%d-%H%M%S')}")
+    guard = MemoryGuard(trace)
+    heartbeat = LeaseHeartbeat(queue, worker)
+    heartbeat.start()
+    driver = pool.borrow() if pool else create_driver()
+    logger.info(f"🎉 Shard {worker} started for {issue}")
+
+    breaker = get_circuit_breaker()
+    shard_started = time.monotonic()
+    proxy_before = proxy_snapshot()
+    processed = 0
+    holds = {}
+    try:
+        while True:
+            account_ids = queue.claim(worker, batch)
+            if not account_ids:
+                break
+            heartbeat.hold(account_ids)
+
+            for account in UserAccount.objects.filter(id__in=account_ids):
+                # One wait per account: after an outage it may hand this shard the half-open trial
+                # slot, which only this account's success or failure releases. The heartbeat keeps
+                # the claimed leases alive meanwhile.
+                breaker.wait_until_closed()
+                processed += 1
+                logger.info(f"=== [{worker}] Processing {account.name} ({processed}) ===")
+                plan, ineligible = evaluate([account_to_dict(account, roster)], issues)
+                if plan:
+                    plan[0]["run_id"] = trace.run_id
+                    plan[0]["trace"] = trace
+                    ok = process_account(driver, plan[0], issue, worker)
+                else:
+                    print_ineligible(ineligible)
+                    breaker.release_trial()  # never reached MeroShare, so it says nothing about the site
+                    ok = False
+                if plan and not ok and breaker.is_open() and holds.get(account.id, 0) < MAX_HOLDS:
+                    # Back on the queue: this shard (or another) claims it again once the site is back
+                    holds[account.id] = holds.get(account.id, 0) + 1
+                    logger.info(f"⏸️ {account.name} back on the queue until MeroShare recovers")
+                    queue.requeue(worker, account.id)
+                else:
+                    queue.complete(worker, account.id, ok)
+                heartbeat.release([account.id])
+                if guard.check(driver, account.name):
+                    driver = replace_driver(driver, pool)
+    finally:
+        heartbeat.stop()
+        if pool:
+            pool.release(driver)
+        else:
+            driver.quit()
+
+    logger.info(f"🏁 Shard {worker} finished: {processed} accounts processed")
+    for transition in breaker.transitions_since(shard_started):
+        trace.record("breaker", at=round(transition["at"] - trace.started, 1),
+                     **{key: transition[key] for key in ("from", "to", "reason")})
+    record_proxy_stats(trace, proxy_before)
+    get_artifact_store().flush()
+    trace.save()
+    trace.print_summary()
 
 
 if __name__ == "__main__":
@@ -1,3 +1,1291 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import importlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from cryptography import x509
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import serialization
+from django.apps import apps
+from django.contrib.admin import site
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase
+from django.utils import timezone
+from selenium.webdriver import ChromeOptions
+from selenium.webdriver.chrome.webdriver import WebDriver as ChromeDriver
+from selenium.webdriver.remote.errorhandler import ErrorHandler
+from selenium.webdriver.remote.switch_to import SwitchTo
+
+from ipo_app.admin import UserAccountAdmin
+from ipo_app.allotment import AllotmentChecker, check_allotment
+from ipo_app.artifacts import ArtifactStore
+from ipo_app.asset_proxy import AssetCache, AssetProxy, CertificateAuthority, is_cacheable, use_asset_proxy
+from ipo_app.browser_contexts import ContextEngine
+from ipo_app.browser_pool import BrowserPool
+from ipo_app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from ipo_app.config_loader import decrypt_account, decrypt_accounts, load_encrypted_accounts, unsealed
+from ipo_app.eligibility import FOREIGN_EMPLOYMENT, LOCAL, ORDINARY, evaluate, issue_terms, requested_kitta
+from ipo_app.events import EventBus, Subscription
+from ipo_app.fields import EncryptedValue
+from ipo_app.jobs import run_queryset
+from ipo_app.ledger import record_already_applied
+from ipo_app.logs import ContextFilter, QueueLogHandler, account_scope, step_scope
+from ipo_app.memory_guard import MemoryGuard
+from ipo_app.metrics import Counter, Histogram, Registry
+from ipo_app.models import ApplicationRecord, Holding, Run, Tag, UserAccount, WorkClaim
+from ipo_app.pipeline import Step, run_pipeline
+from ipo_app.portfolio import read_table, store_portfolio, sync_portfolio
+from ipo_app.rate_limiter import AdaptiveRateLimiter, FakeClock, simulate
+from ipo_app.scheduler import Scheduler, historical_durations
+from ipo_app.status_poller import MeroShareClient, poll_statuses
+from ipo_app.tasks import account_to_dict, apply_ipo_for_shard, issue_in_report
+from ipo_app.work_queue import DatabaseWorkQueue
+
+# UserAccount secrets are Fernet-encrypted; tests use a throwaway key
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+
+
+def make_limiter(**kwargs):
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(clock=clock, sleep=clock.sleep, **kwargs)
+    return limiter, clock
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_dp_bucket_limits_each_dp_separately(self):
+        limiter, clock = make_limiter(global_rate=100, dp_rate=1, burst=1)
+
+        self.assertEqual(limiter.try_acquire("13700"), 0.0)
+        clock.sleep(0.05)
+        self.assertGreater(limiter.try_acquire("13700"), 0.0)
+        self.assertEqual(limiter.try_acquire("11000"), 0.0)
+
+        clock.sleep(1)
+        self.assertEqual(limiter.try_acquire("13700"), 0.0)
+
+    def test_throttle_slows_down_and_success_recovers(self):
+        limiter, clock = make_limiter(global_rate=10, dp_rate=10, increase=0.1)
+
+        limiter.record_throttle("13700")
+        self.assertAlmostEqual(limiter.current_rate("13700"), 5.0)
+
+        for _ in range(5):
+            limiter.record_success("13700")
+        self.assertAlmostEqual(limiter.current_rate("13700"), 10.0)
+
+    def test_adaptive_backoff_beats_fixed_rate_on_throttling_server(self):
+        fixed, fixed_clock = make_limiter(global_rate=20, dp_rate=20, burst=5, decrease=1.0, increase=0.0)
+        adaptive, adaptive_clock = make_limiter(global_rate=20, dp_rate=20, burst=5)
+
+        fixed_stats = simulate(fixed, fixed_clock, workers=30, server_capacity=5, duration=600)
+        adaptive_stats = simulate(adaptive, adaptive_clock, workers=30, server_capacity=5, duration=600)
+
+        self.assertGreater(adaptive_stats["submitted"], 2 * fixed_stats["submitted"])
+        self.assertLess(adaptive_stats["throttled"], fixed_stats["throttled"] / 4)
+
+
+class StubResultService:
+    """Local stand-in for the CDSC allotment result service"""
+
+    def __init__(self, allotted_boids, refused_boids=()):
+        self.allotted_boids = set(allotted_boids)
+        self.refused_boids = set(refused_boids)
+        self.checked = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, body):
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.reply({"body": {"companyShareList": [
+                    {"id": 7, "name": "RBB Foo Ltd", "scrip": "RBBF"},
+                ]}})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.checked.append(payload["boid"])
+                if payload["boid"] in stub.refused_boids:
+                    self.reply({"success": False, "message": "Invalid Captcha"})
+                    return
+                allotted = payload["boid"] in stub.allotted_boids
+                self.reply({"success": allotted, "message": "Congratulation Alloted !!! Alloted quantity : 10"
+                            if allotted else "Sorry, not alloted for the entered BOID."})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class AllotmentCheckerTests(TestCase):
+    ISSUE = "RBB Foo Ltd (RBBF)"
+
+    def make_account(self, i, boid, applied=True):
+        account = UserAccount.objects.create(
+            name=f"Account {i}", dp_id="13700", boid=boid, username=f"user{i}", password="x", crn="x"
+        )
+        if applied:
+            ApplicationRecord.objects.create(account=account, username=account.username, issue=self.ISSUE,
+                                             status=ApplicationRecord.STATUS_SUBMITTED)
+        return account
+
+    def test_each_boid_is_looked_up_once(self):
+        with StubResultService(allotted_boids=["1301370000000001"]) as stub:
+            checker = AllotmentChecker(base_url=stub.url, workers=4)
+            results = checker.check_all(7, ["1301370000000001", "1301370000000002", "1301370000000001"])
+            checker.check_all(7, ["1301370000000002"])
+
+        self.assertTrue(results["1301370000000001"]["allotted"])
+        self.assertFalse(results["1301370000000002"]["allotted"])
+        self.assertEqual(sorted(stub.checked), ["1301370000000001", "1301370000000002"])
+
+    def test_results_are_stored_in_ledger_and_not_rechecked(self):
+        self.make_account(1, "1301370000000001")
+        self.make_account(2, "1301370000000002")
+
+        with StubResultService(allotted_boids=["1301370000000001"]) as stub:
+            counts = check_allotment(self.ISSUE, checker=AllotmentChecker(base_url=stub.url))
+            check_allotment(self.ISSUE, checker=AllotmentChecker(base_url=stub.url))
+
+        self.assertEqual(counts, {"allotted": 1, "not_allotted": 1, "errors": 0})
+        self.assertEqual(len(stub.checked), 2)
+        record = ApplicationRecord.objects.get(username="user1", issue=self.ISSUE)
+        self.assertEqual(record.allotment, ApplicationRecord.ALLOTMENT_ALLOTTED)
+
+    def test_refused_lookup_is_an_error_and_checked_again(self):
+        self.make_account(1, "1301370000000001")
+
+        with StubResultService(allotted_boids=[], refused_boids=["1301370000000001"]) as stub:
+            counts = check_allotment(self.ISSUE, checker=AllotmentChecker(base_url=stub.url))
+            stub.refused_boids.clear()
+            retry = check_allotment(self.ISSUE, checker=AllotmentChecker(base_url=stub.url))
+
+        self.assertEqual(counts, {"allotted": 0, "not_allotted": 0, "errors": 1})
+        self.assertEqual(retry, {"allotted": 0, "not_allotted": 1, "errors": 0})
+
+    def test_accounts_without_an_application_get_no_ledger_row(self):
+        self.make_account(1, "1301370000000001")
+        self.make_account(2, "1301370000000002", applied=False)
+
+        with StubResultService(allotted_boids=["1301370000000002"]) as stub:
+            check_allotment(self.ISSUE, checker=AllotmentChecker(base_url=stub.url))
+
+        self.assertEqual(stub.checked, ["1301370000000001"])
+        self.assertFalse(ApplicationRecord.objects.filter(username="user2").exists())
+
+
+class PipelineTests(SimpleTestCase):
+    def run_steps(self, steps):
+        ran = []
+        run_pipeline(None, {"name": "acc"}, steps, lambda step, driver, acc, *args: ran.append(step.name))
+        return ran
+
+    def test_step_whose_postcondition_holds_is_skipped(self):
+        steps = [
+            Step("asba", None, postcondition=lambda driver, acc: True),
+            Step("select_issue", None),
+        ]
+        self.assertEqual(self.run_steps(steps), ["select_issue"])
+
+    def test_unmet_precondition_stops_the_pipeline(self):
+        steps = [
+            Step("select_issue", None),
+            Step("fill_form", None, precondition=lambda driver, acc: False),
+            Step("submit", None),
+        ]
+        with self.assertRaisesMessage(Exception, "fill_form"):
+            self.run_steps(steps)
+
+
+class SchedulerTests(SimpleTestCase):
+    def make_scheduler(self, **kwargs):
+        plan = [
+            {"username": "short", "dp_id": "13700"},
+            {"username": "long", "dp_id": "13700"},
+            {"username": "vip", "dp_id": "11000", "priority": 1},
+            {"username": "other", "dp_id": "11000"},
+        ]
+        clock = FakeClock()
+        durations = {"short": 15, "long": 40, "vip": 10, "other": 30}
+        return Scheduler(plan, durations=durations, clock=clock, **kwargs), clock
+
+    def test_priority_then_longest_first(self):
+        scheduler, _ = self.make_scheduler()
+        self.assertEqual([acc["username"] for acc in scheduler.ordered()], ["vip", "long", "other", "short"])
+        self.assertEqual(scheduler.eta_seconds(), 95)
+
+    def test_slow_dp_is_reranked_and_eta_follows(self):
+        scheduler, clock = self.make_scheduler()
+        scheduler.next()  # vip, on DP 11000
+        scheduler.next()  # long, on DP 13700
+        clock.sleep(120)  # 3x slower than its history
+        scheduler.done({"username": "long", "dp_id": "13700"})
+
+        # short now expects 45s on the slow DP and moves ahead of other
+        self.assertEqual([acc["username"] for acc in scheduler.ordered()], ["short", "other"])
+        self.assertEqual(scheduler.eta_seconds(), 75)
+
+
+class HistoricalDurationTests(TestCase):
+    def test_average_of_submitted_applications(self):
+        now = timezone.now()
+        for issue, seconds, status in (("A", 30, "submitted"), ("B", 50, "submitted"), ("C", 500, "failed")):
+            ApplicationRecord.objects.create(username="user1", issue=issue, status=status,
+                                             started_at=now - timedelta(seconds=seconds), finished_at=now)
+
+        self.assertEqual(historical_durations(["user1", "user2"]), {"user1": 40.0})
+
+    def test_report_discovered_applications_are_not_timed_or_reset(self):
+        now = timezone.now()
+        polled = ApplicationRecord.objects.create(
+            username="user1", issue="A", status=ApplicationRecord.STATUS_SUBMITTED,
+            started_at=now - timedelta(seconds=30), finished_at=now,
+            application_status=ApplicationRecord.APPLICATION_REJECTED, needs_reapply=True,
+            next_status_check_at=now + timedelta(hours=1))
+        ApplicationRecord.objects.create(username="user1", issue="B", status=ApplicationRecord.STATUS_FAILED,
+                                         started_at=now - timedelta(seconds=500), finished_at=now)
+
+        for issue in ("A", "B", "C"):
+            record_already_applied({"username": "user1"}, issue)
+
+        polled.refresh_from_db()
+        self.assertEqual((polled.application_status, polled.needs_reapply, polled.started_at),
+                         (ApplicationRecord.APPLICATION_REJECTED, True, now - timedelta(seconds=30)))
+        self.assertEqual(ApplicationRecord.objects.filter(status=ApplicationRecord.STATUS_SUBMITTED).count(), 3)
+        self.assertEqual(historical_durations(["user1"]), {"user1": 30.0})
+
+
+class PortfolioSyncTests(TestCase):
+    def setUp(self):
+        self.account = UserAccount.objects.create(name="Account 1", dp_id="13700", boid="1301370000000001",
+                                                  username="user1", password="x", crn="x")
+        self.holdings = [
+            {"scrip": "NABIL", "quantity": "10", "last_price": "500.00", "value": "5000.00"},
+            {"scrip": "RBBF", "quantity": "20", "last_price": None, "value": None},
+        ]
+        self.transactions = [
+            {"scrip": "RBBF", "date": "2024-05-12", "credit": "10", "debit": "0", "balance": "10",
+             "description": "INITIAL PUBLIC OFFERING"},
+            {"scrip": "RBBF", "date": "2024-05-12", "credit": "10", "debit": "0", "balance": "10",
+             "description": "INITIAL PUBLIC OFFERING"},
+        ]
+
+    def test_first_sync_writes_everything(self):
+        counts = store_portfolio(self.account, self.holdings, self.transactions)
+
+        self.assertEqual(counts, {"holdings": 2, "removed": 0, "transactions": 2})
+        self.assertEqual(self.account.transactions.count(), 2)
+
+    def test_only_changed_rows_are_written(self):
+        store_portfolio(self.account, self.holdings, self.transactions)
+        self.assertEqual(store_portfolio(self.account, self.holdings, self.transactions),
+                         {"holdings": 0, "removed": 0, "transactions": 0})
+
+        holdings = [dict(self.holdings[0], quantity="15")]
+        counts = store_portfolio(self.account, holdings, self.transactions + [dict(self.transactions[0], credit="5")])
+
+        self.assertEqual(counts, {"holdings": 1, "removed": 1, "transactions": 1})
+        self.assertEqual(Holding.objects.get(account=self.account, scrip="NABIL").quantity, 15)
+        self.assertEqual(self.account.transactions.count(), 3)
+
+    def test_read_table_tells_empty_from_not_loaded(self):
+        driver = mock.Mock()
+        driver.execute_script.side_effect = [None, {"headers": ["scrip", "current balance"], "rows": [["NABIL", "10"]]}]
+        self.assertEqual(read_table(driver, "https://example.test/portfolio", timeout=5),
+                         [{"scrip": "NABIL", "current balance": "10"}])
+
+        driver.execute_script.side_effect = None
+        driver.execute_script.return_value = {"headers": [], "rows": []}  # the no-data message
+        self.assertEqual(read_table(driver, "https://example.test/portfolio", timeout=5), [])
+
+        driver.execute_script.return_value = None
+        with self.assertRaisesMessage(Exception, "neither a table nor a no-data message"):
+            read_table(driver, "https://example.test/portfolio", timeout=0.2)
+
+    def test_failed_load_keeps_stored_holdings(self):
+        store_portfolio(self.account, self.holdings, self.transactions)
+
+        with mock.patch("ipo_app.tasks.create_driver"), mock.patch("ipo_app.tasks.run_throttled"), \
+                mock.patch("ipo_app.tasks.load_accounts", return_value=[]), \
+                mock.patch("ipo_app.portfolio.read_table", side_effect=Exception("table did not load")):
+            totals = sync_portfolio()
+
+        self.assertEqual((totals["accounts"], totals["failed"], totals["removed"]), (1, 1, 0))
+        self.assertEqual(self.account.holdings.count(), 2)
+
+
+class LoggingTests(SimpleTestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = QueueLogHandler(format="json", stream=self.stream)
+        self.logger = logging.getLogger("ipo_app.tests.logging")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+        self.acc = {"name": "Account 1", "dp_id": "13700", "password": "hunter22", "crn": "CRN55", "pin": "4321"}
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.stop()
+
+    def lines(self):
+        self.handler.stop()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_records_carry_account_context_and_secrets_are_redacted(self):
+        with account_scope(self.acc), step_scope("fill_ipo_form"):
+            self.logger.info("typed hunter22, CRN55 and 4321 for BOID 1301370000000001; pin=9999")
+
+        [line] = self.lines()
+        self.assertEqual(line["msg"], "typed ***, *** and *** for BOID ***; pin=***")
+        self.assertEqual((line["account"], line["dp_id"], line["step"]), ("Account 1", "13700", "fill_ipo_form"))
+
+    def test_verbosity_is_set_per_step(self):
+        self.handler.filters = [ContextFilter(level="INFO", step_levels={"fill_form": logging.WARNING,
+                                                                         "login": logging.DEBUG})]
+        with step_scope("fill_form"):
+            self.logger.info("dropped")
+            self.logger.warning("kept")
+        with step_scope("login"):
+            self.logger.debug("kept too")
+        self.logger.debug("dropped outside any step")
+
+        self.assertEqual([line["msg"] for line in self.lines()], ["kept", "kept too"])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def make_breaker(self, probe_results):
+        clock = FakeClock()
+        results = iter(probe_results)
+        breaker = CircuitBreaker(failure_threshold=3, probe_interval=10, max_probe_interval=30,
+                                 probe=lambda: next(results), clock=clock, sleep=clock.sleep)
+        return breaker, clock
+
+    def test_account_specific_failures_do_not_open(self):
+        breaker, _ = self.make_breaker([True])
+        for _ in range(3):
+            breaker.record_failure("wrong password")
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_outage_opens_probes_with_backoff_and_recovers(self):
+        breaker, clock = self.make_breaker([False, False, False, False, True])
+        for _ in range(3):
+            breaker.record_failure("timeout")
+        self.assertEqual(breaker.state, OPEN)
+
+        breaker.wait_until_closed()  # probes 10s, 20s, 30s apart, then lets the trial account through
+        self.assertEqual(clock.now, 60)
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+        breaker.record_success()
+        self.assertEqual([t["to"] for t in breaker.transitions], [OPEN, HALF_OPEN, CLOSED])
+
+
+class MetricsTests(SimpleTestCase):
+    def test_prometheus_text_format(self):
+        registry = Registry()
+        accounts = registry.register(Counter("ipo_accounts_total", "Accounts", ["outcome"]))
+        steps = registry.register(Histogram("ipo_step_seconds", "Steps", ["step"], buckets=(1, 5)))
+        accounts.inc(outcome="submitted")
+        accounts.inc(outcome="submitted")
+        steps.observe(0.5, step="login")
+        steps.observe(3, step="login")
+
+        text = registry.render()
+        self.assertIn('ipo_accounts_total{outcome="submitted"} 2\n', text)
+        self.assertIn('ipo_step_seconds_bucket{step="login",le="1"} 1\n', text)
+        self.assertIn('ipo_step_seconds_bucket{step="login",le="+Inf"} 2\n', text)
+        self.assertIn('ipo_step_seconds_sum{step="login"} 3.5\n', text)
+
+    def test_metrics_endpoint(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE ipo_step_seconds histogram", response.content)
+
+
+class AssetProxyTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.origin_hits = []
+        test = self
+
+        class Origin(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                test.origin_hits.append(self.path)
+                body = b"console.log('bundle')" if self.path.endswith(".js") else b'{"ok": true}'
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.origin = ThreadingHTTPServer(("127.0.0.1", 0), Origin)
+        threading.Thread(target=self.origin.serve_forever, daemon=True).start()
+        self.addCleanup(self.origin.server_close)
+        self.addCleanup(self.origin.shutdown)
+
+    def test_only_hashed_static_assets_are_cacheable(self):
+        host = "meroshare.cdsc.com.np"
+        self.assertTrue(is_cacheable("GET", host, "/main.8f3a9c21d4e5b6a7.js"))
+        self.assertTrue(is_cacheable("GET", host, "/assets/fonts/roboto.woff2"))
+        self.assertFalse(is_cacheable("GET", host, "/index.html"))
+        self.assertFalse(is_cacheable("POST", host, "/main.8f3a9c21d4e5b6a7.js"))
+        self.assertFalse(is_cacheable("GET", "webbackend.cdsc.com.np", "/main.8f3a9c21d4e5b6a7.js"))
+
+    def test_eviction_drops_least_recently_served(self):
+        cache = AssetCache(self.directory, max_bytes=10)
+        cache.put("https://x/a.js", 200, [], b"aaaaaa")
+        os.utime(cache._path("https://x/a.js", ".body"), (1, 1))
+        cache.put("https://x/b.js", 200, [], b"bbbbbb")
+
+        self.assertIsNone(cache.get("https://x/a.js"))
+        self.assertEqual(cache.get("https://x/b.js")[2], b"bbbbbb")
+
+    def test_second_request_served_from_cache_and_api_passes_through(self):
+        proxy = AssetProxy(cache=AssetCache(self.directory), intercept_tls=False).start()
+        self.addCleanup(proxy.stop)
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler({"http": f"http://{proxy.address}"}))
+        base = f"http://127.0.0.1:{self.origin.server_port}"
+
+        with mock.patch("ipo_app.asset_proxy.INTERCEPT_HOSTS", ["127.0.0.1"]):
+            for _ in range(3):
+                with opener.open(f"{base}/main.0123abcd.js") as response:
+                    self.assertEqual(response.read(), b"console.log('bundle')")
+            for _ in range(2):
+                with opener.open(f"{base}/api/capital") as response:
+                    self.assertEqual(response.read(), b'{"ok": true}')
+
+        self.assertEqual(self.origin_hits, ["/main.0123abcd.js", "/api/capital", "/api/capital"])
+        stats = proxy.cache.snapshot()
+        self.assertEqual((stats["hits"], stats["misses"], stats["passthrough"]), (2, 1, 2))
+        self.assertEqual(stats["bytes_saved"], 2 * len(b"console.log('bundle')"))
+
+    def test_chrome_trusts_only_the_proxy_keys(self):
+        ca = CertificateAuthority(self.directory)
+        ca.server_context("meroshare.cdsc.com.np")
+        with open(os.path.join(self.directory, "meroshare.cdsc.com.np-cert.pem"), "rb") as f:
+            chain = x509.load_pem_x509_certificates(f.read())
+        served = [
+            base64.b64encode(hashlib.sha256(cert.public_key().public_bytes(
+                serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)).digest()).decode()
+            for cert in chain
+        ]
+        self.assertEqual(served, list(reversed(ca.spki_hashes())))  # leaf, then CA
+        self.assertEqual(CertificateAuthority(self.directory).spki_hashes(), ca.spki_hashes())
+
+        proxy = AssetProxy(cache=AssetCache(self.directory))
+        self.addCleanup(proxy.server.server_close)
+        with mock.patch("ipo_app.asset_proxy.get_asset_proxy", return_value=proxy):
+            options = use_asset_proxy(ChromeOptions())
+        self.assertIn(f"--ignore-certificate-errors-spki-list={','.join(ca.spki_hashes())}", options.arguments)
+        self.assertFalse(options.accept_insecure_certs)
+
+
+class StubMeroShareBackend:
+    """Local stand-in for the MeroShare JSON backend: DP list, login, application report"""
+
+    def __init__(self, statuses):
+        self.statuses = statuses  # username -> statusName of its only form
+        self.logins = []
+        self.expired = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, body, status=200, headers=()):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def user(self):
+                username = (self.headers.get("Authorization") or "").removeprefix("token-")
+                if username not in stub.statuses or username in stub.expired:
+                    stub.expired.discard(username)
+                    self.reply({"message": "expired"}, status=401)
+                    return None
+                return username
+
+            def do_GET(self):
+                if self.path == "/capital/":
+                    self.reply([{"id": 128, "code": "13700", "name": "Foo Capital"}])
+                    return
+                username = self.user()
+                if username:
+                    self.reply({"statusName": stub.statuses[username], "reasonOrRemark": "remark"})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path == "/auth/":
+                    stub.logins.append(payload["username"])
+                    self.reply({}, headers=[("Authorization", f"token-{payload['username']}")])
+                    return
+                if self.user():
+                    self.reply({"object": [{"companyName": "RBB Foo Ltd", "scrip": "RBBF", "applicantFormId": 1,
+                                            "statusName": "TRANSACTION_SUCCESS"}]})
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StatusPollerTests(TestCase):
+    ISSUE = "RBB Foo Ltd (RBBF)"
+
+    def make_record(self, i, status=ApplicationRecord.STATUS_SUBMITTED):
+        account = UserAccount.objects.create(
+            name=f"Account {i}", dp_id="13700", boid=f"13013700000000{i:02d}", username=f"user{i}",
+            password="x", crn="x",
+        )
+        return ApplicationRecord.objects.create(account=account, username=account.username, issue=self.ISSUE,
+                                                status=status)
+
+    def test_statuses_stored_and_rejections_flagged_while_issue_open(self):
+        verified, rejected, unverified = self.make_record(1), self.make_record(2), self.make_record(3)
+        self.make_record(4, status=ApplicationRecord.STATUS_FAILED)
+        statuses = {"user1": "Verified", "user2": "Rejected", "user3": "Unverified", "user4": "Verified"}
+
+        with StubMeroShareBackend(statuses) as stub:
+            counts = poll_statuses(once=True, client=MeroShareClient(stub.url), open_issues=[self.ISSUE], workers=2)
+
+        self.assertEqual(counts, {"checked": 3, "final": 2, "reapply": 1, "errors": 0})
+        self.assertEqual(sorted(stub.logins), ["user1", "user2", "user3"])  # failed submissions are not polled
+        for record in (verified, rejected, unverified):
+            record.refresh_from_db()
+        self.assertEqual(verified.application_status, ApplicationRecord.APPLICATION_VERIFIED)
+        self.assertIsNone(verified.next_status_check_at)
+        self.assertTrue(rejected.needs_reapply)
+        self.assertEqual(unverified.application_status, ApplicationRecord.APPLICATION_UNVERIFIED)
+        self.assertIsNotNone(unverified.next_status_check_at)
+
+        # once the issue has closed a rejection is only recorded
+        record = self.make_record(5)
+        with StubMeroShareBackend({"user5": "Rejected"}) as stub:
+            poll_statuses(once=True, client=MeroShareClient(stub.url), open_issues=[])
+        record.refresh_from_db()
+        self.assertEqual(record.application_status, ApplicationRecord.APPLICATION_REJECTED)
+        self.assertFalse(record.needs_reapply)
+
+    def test_intervals_grow_and_sessions_are_reused(self):
+        record = self.make_record(1)
+        sleeps = []
+
+        with StubMeroShareBackend({"user1": "Unverified"}) as stub:
+            client = MeroShareClient(stub.url)
+
+            def sleep(seconds):
+                sleeps.append(seconds)
+                if len(sleeps) == 2:
+                    stub.expired.add("user1")
+                if len(sleeps) == 3:
+                    stub.statuses["user1"] = "Verified"
+                ApplicationRecord.objects.filter(pk=record.pk).update(next_status_check_at=timezone.now())
+
+            counts = poll_statuses(client=client, open_issues=[self.ISSUE], interval=10, max_interval=25,
+                                   sleep=sleep)
+
+        self.assertEqual(counts["checked"], 4)
+        self.assertEqual([round(seconds) for seconds in sleeps], [10, 20, 25])
+        self.assertEqual(stub.logins, ["user1", "user1"])  # one login, one after the token expired
+        record.refresh_from_db()
+        self.assertEqual(record.application_status, ApplicationRecord.APPLICATION_VERIFIED)
+        self.assertEqual(record.status_checks, 4)
+
+
+class WorkQueueTests(TestCase):
+    def setUp(self):
+        self.accounts = [
+            UserAccount.objects.create(name=f"Account {i}", dp_id="13700", boid=f"13013700000001{i:02d}",
+                                       username=f"user{i}", password="x", crn="x")
+            for i in range(3)
+        ]
+
+    def test_claim_retries_after_losing_the_race(self):
+        test = self
+
+        class RacedQueue(DatabaseWorkQueue):
+            calls = 0
+
+            def _claimable(self):
+                RacedQueue.calls += 1
+                if RacedQueue.calls == 2:  # another shard wins the rows between SELECT and UPDATE
+                    WorkClaim.objects.filter(account=test.accounts[0]).update(
+                        status=WorkClaim.STATUS_CLAIMED, worker="other", claim_token="x",
+                        lease_expires_at=timezone.now() + timedelta(seconds=60))
+                return super()._claimable()
+
+        queue = RacedQueue("RBB Foo Ltd (RBBF)")
+        queue.enqueue([account.id for account in self.accounts])
+
+        self.assertEqual(queue.claim("me"), [self.accounts[1].id])
+        self.assertEqual(queue.pending(), 1)
+
+    def test_expired_lease_is_claimed_again(self):
+        queue = DatabaseWorkQueue("RBB Foo Ltd (RBBF)", lease_seconds=-1)
+        queue.enqueue([self.accounts[0].id])
+
+        self.assertEqual(queue.claim("a"), [self.accounts[0].id])
+        self.assertEqual(queue.claim("b"), [self.accounts[0].id])
+        queue.complete("a", self.accounts[0].id, ok=True)  # a's lease lapsed; b owns the row now
+        self.assertEqual(WorkClaim.objects.get().worker, "b")
+
+    def test_requeued_account_is_claimed_again(self):
+        queue = DatabaseWorkQueue("RBB Foo Ltd (RBBF)")
+        queue.enqueue([self.accounts[0].id])
+
+        self.assertEqual(queue.claim("a"), [self.accounts[0].id])
+        queue.requeue("b", self.accounts[0].id)  # not b's lease: ignored
+        self.assertEqual(queue.pending(), 0)
+        queue.requeue("a", self.accounts[0].id)
+        self.assertEqual(queue.pending(), 1)
+        self.assertEqual(queue.claim("b"), [self.accounts[0].id])
+
+    def run_shard(self, breaker, eligible, outcomes, batch=1):
+        """apply_ipo_for_shard with a real breaker; process_account reports to it like the real one does"""
+        def process_account(driver, acc, issue, worker):
+            ok = next(outcomes)
+            breaker.record_success() if ok else breaker.record_failure("timeout")
+            return ok
+
+        def evaluate(accounts, issues):
+            return (accounts, []) if accounts[0]["name"] in eligible else ([], accounts)
+
+        with mock.patch.dict(os.environ, {"APPLY_IPO": "RBB Foo Ltd (RBBF)"}), \
+                mock.patch("ipo_app.tasks.get_circuit_breaker", return_value=breaker), \
+                mock.patch("ipo_app.tasks.load_accounts", return_value=[]), \
+                mock.patch("ipo_app.tasks.load_open_issues", return_value=[]), \
+                mock.patch("ipo_app.tasks.evaluate", side_effect=evaluate), \
+                mock.patch("ipo_app.tasks.print_ineligible"), \
+                mock.patch("ipo_app.tasks.process_account", side_effect=process_account) as mocked, \
+                mock.patch("ipo_app.tasks.create_driver", return_value=FakeDriver()), \
+                mock.patch("ipo_app.tasks.MemoryGuard"), mock.patch("ipo_app.tasks.RunTrace"):
+            # Runs here (the test database is not shared with other threads); a shard stuck in the
+            # breaker is freed by the watchdog and fails the test instead of hanging it
+            stuck = []
+
+            def rescue():
+                with breaker.cond:
+                    stuck.append(breaker.state)
+                    breaker.state = CLOSED
+                    breaker.cond.notify_all()
+
+            watchdog = threading.Timer(10, rescue)
+            watchdog.start()
+            try:
+                apply_ipo_for_shard(worker="shard-1", batch=batch)
+            finally:
+                watchdog.cancel()
+        self.assertEqual(stuck, [], "shard was stuck waiting on the breaker")
+        return mocked.call_count
+
+    def make_breaker(self, probe_results):
+        clock = FakeClock()
+        results = iter(probe_results)
+        return CircuitBreaker(failure_threshold=1, probe=lambda: next(results), clock=clock, sleep=clock.sleep)
+
+    def test_shard_retries_account_that_failed_while_breaker_was_open(self):
+        # the failure opens the breaker (probe False); then False, True: half-open and the retry is the trial
+        breaker = self.make_breaker([False, False, True])
+        DatabaseWorkQueue("RBB Foo Ltd (RBBF)").enqueue([self.accounts[0].id])
+
+        calls = self.run_shard(breaker, ["Account 0"], iter([False, True]))
+
+        self.assertEqual(calls, 2)
+        self.assertEqual(breaker.state, CLOSED)
+        claim = WorkClaim.objects.get()
+        self.assertEqual((claim.status, claim.attempts), (WorkClaim.STATUS_DONE, 2))
+
+    def test_ineligible_trial_account_releases_the_trial_slot(self):
+        breaker = self.make_breaker([False, True])
+        breaker.record_failure("timeout")
+        DatabaseWorkQueue("RBB Foo Ltd (RBBF)").enqueue([self.accounts[0].id, self.accounts[1].id])
+
+        calls = self.run_shard(breaker, ["Account 1"], iter([True]), batch=2)
+
+        self.assertEqual(calls, 1)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertEqual(dict(WorkClaim.objects.values_list("account_id", "status")), {
+            self.accounts[0].id: WorkClaim.STATUS_FAILED, self.accounts[1].id: WorkClaim.STATUS_DONE})
+
+
+class FakeDriver:
+    def quit(self):
+        pass
+
+
+class BrowserPoolTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("ipo_app.browser_pool.park_on_login")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_respawn_is_retried(self):
+        attempts = []
+
+        def factory():
+            attempts.append(1)
+            if len(attempts) == 2:
+                raise Exception("chrome crashed on start")
+            return FakeDriver()
+
+        pool = BrowserPool(1, factory, retry_delay=0)
+        pool.start()
+        pool.release(pool.borrow(), recycle=True)
+
+        self.assertIsInstance(pool.borrow(timeout=5), FakeDriver)
+        self.assertEqual((len(attempts), pool.dead), (3, 0))
+        pool.close()
+
+    def test_borrow_raises_once_every_slot_is_dead(self):
+        drivers = iter([FakeDriver()])
+
+        def factory():
+            return next(drivers)  # StopIteration after the first browser
+
+        pool = BrowserPool(1, factory, retry_delay=0)
+        pool.start()
+        pool.release(pool.borrow(), recycle=True)
+
+        with self.assertRaisesMessage(Exception, "no working browsers"):
+            pool.borrow(timeout=30)
+        self.assertEqual(pool.dead, 1)
+        pool.close()
+
+    def test_borrow_times_out(self):
+        pool = BrowserPool(1, FakeDriver)
+        pool.start()
+        pool.borrow()
+        with self.assertRaisesMessage(Exception, "No browser available"):
+            pool.borrow(timeout=0.1)
+        pool.close()
+
+
+class FakeChromeServer:
+    """Stands in for chromedriver: tracks tabs, browser contexts and which tab each command ran on"""
+
+    def __init__(self):
+        self.tabs = {"home": "about:blank"}
+        self.context_tabs = {}
+        self.current = "home"
+        self.log = []
+        self.js_heap = {}
+        self.ids = 0
+
+    def execute(self, command, params):
+        self.log.append((command, self.current, params.get("cmd")))
+        value = None
+        if command == "w3cGetCurrentWindowHandle":
+            value = self.current
+        elif command == "w3cGetWindowHandles":
+            value = list(self.tabs)
+        elif command == "switchToWindow":
+            self.current = params["handle"]
+        elif command == "get":
+            self.tabs[self.current] = params["url"]
+        elif command == "getCurrentUrl":
+            value = self.tabs[self.current]
+        elif command == "executeCdpCommand":
+            value = self.cdp(params["cmd"], params["params"])
+        return {"value": value}
+
+    def cdp(self, cmd, args):
+        self.ids += 1
+        if cmd == "Target.createBrowserContext":
+            return {"browserContextId": f"context-{self.ids}"}
+        if cmd == "Target.createTarget":
+            self.tabs[f"tab-{self.ids}"] = args["url"]
+            self.context_tabs[args["browserContextId"]] = f"tab-{self.ids}"
+            return {"targetId": f"tab-{self.ids}"}
+        if cmd == "Target.disposeBrowserContext":
+            del self.tabs[self.context_tabs.pop(args["browserContextId"])]
+        if cmd == "Performance.getMetrics":
+            return {"metrics": [{"name": "JSHeapUsedSize", "value": self.js_heap.get(self.current, 0)}]}
+        return {}
+
+
+class FakeChrome(ChromeDriver):
+    def __init__(self):
+        # No chromedriver: commands go to FakeChromeServer through the real WebDriver.execute
+        self.session_id = "session"
+        self.caps = {"browserName": "chrome"}
+        self.command_executor = FakeChromeServer()
+        self.error_handler = ErrorHandler()
+        self._switch_to = SwitchTo(self)
+        self.closed = False
+
+    def quit(self):
+        self.closed = True
+
+
+class ContextEngineTests(SimpleTestCase):
+    def setUp(self):
+        self.engine = ContextEngine(factory=FakeChrome)
+        self.server = self.engine.driver.command_executor
+
+    def test_each_context_runs_commands_on_its_own_tab(self):
+        first, second = self.engine.new_context(), self.engine.new_context()
+        self.assertNotEqual(first.context_id, second.context_id)
+
+        first.get("https://meroshare.cdsc.com.np/#/login")
+        second.get("https://meroshare.cdsc.com.np/#/asba")
+        self.assertEqual(first.current_url, "https://meroshare.cdsc.com.np/#/login")
+        self.assertEqual(second.current_url, "https://meroshare.cdsc.com.np/#/asba")
+        self.assertEqual([tab for command, tab, _ in self.server.log if command == "get"], [first.handle, second.handle])
+
+    def test_commands_from_threads_are_not_interleaved(self):
+        contexts = [self.engine.new_context() for _ in range(4)]
+
+        def browse(context):
+            for i in range(20):
+                context.get(f"https://example.test/{context.context_id}/{i}")
+                self.assertEqual(context.current_url, f"https://example.test/{context.context_id}/{i}")
+
+        threads = [threading.Thread(target=browse, args=(context,)) for context in contexts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len([entry for entry in self.server.log if entry[0] == "get"]), 80)
+
+    def test_quit_disposes_only_that_context(self):
+        first, second = self.engine.new_context(), self.engine.new_context()
+        first.quit()
+        first.quit()
+
+        disposed = [entry for entry in self.server.log if entry[2] == "Target.disposeBrowserContext"]
+        self.assertEqual(len(disposed), 1)
+        self.assertEqual(list(self.engine.contexts), [second.context_id])
+        self.assertNotIn(first.handle, self.server.tabs)
+        self.assertIn(second.handle, self.server.tabs)
+        self.assertFalse(self.engine.driver.closed)
+
+        self.engine.close()
+        self.assertTrue(self.engine.driver.closed)
+
+    def test_memory_guard_recycles_a_context_on_its_own_js_heap_only(self):
+        first, second = self.engine.new_context(), self.engine.new_context()
+        self.server.js_heap = {first.handle: 50 * 1024 * 1024, second.handle: 400 * 1024 * 1024}
+        guard = MemoryGuard(mock.Mock(), max_browser_mb=100, max_js_heap_mb=300)
+
+        # The shared Chrome is over the browser limit, which says nothing about one context
+        with mock.patch("ipo_app.memory_guard.browser_rss_mb", return_value=2000):
+            self.assertFalse(guard.check(first, "Account 1"))
+            self.assertTrue(guard.check(second, "Account 2"))
+            self.assertTrue(guard.check(FakeDriver(), "Account 3"))
+
+
+class CaptureDriver:
+    current_url = "https://meroshare.cdsc.com.np/#/asba"
+
+    def __init__(self, page):
+        self.page = page
+
+    def get_screenshot_as_png(self):
+        return f"png of {self.page}".encode() * 50
+
+    @property
+    def page_source(self):
+        return f"<html>{self.page}</html>"
+
+
+class ArtifactStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def index_entries(self, store):
+        entries = []
+        for path in store._index_files():
+            with open(path) as f:
+                entries.append(json.load(f))
+        return entries
+
+    def disk_bytes(self):
+        return sum(os.path.getsize(os.path.join(dirpath, name))
+                   for dirpath, _, names in os.walk(self.root) for name in names)
+
+    def test_identical_captures_share_blobs(self):
+        store = ArtifactStore(self.root, run_id="run")
+        store.capture(CaptureDriver("same"), "Account 1", "login")
+        store.capture(CaptureDriver("same"), "Account 2", "login")
+        store.flush()
+
+        self.assertEqual(len(os.listdir(store.blob_dir)), 2)
+        self.assertEqual(store.deduplicated, 2)
+        self.assertEqual(len(self.index_entries(store)), 2)
+        self.assertEqual(store.total_bytes, self.disk_bytes())
+
+    def test_eviction_removes_blobs_and_their_index_entries(self):
+        store = ArtifactStore(self.root, max_bytes=3000, run_id="run")
+        for i in range(6):
+            store.capture(CaptureDriver(f"page {i}"), f"Account {i}", "login")
+            store.flush()
+            for name in os.listdir(store.blob_dir):  # distinct mtimes for a deterministic LRU order
+                path = os.path.join(store.blob_dir, name)
+                os.utime(path, (os.path.getmtime(path) - 10, os.path.getmtime(path) - 10))
+
+        entries = self.index_entries(store)
+        blobs = set(os.listdir(store.blob_dir))
+        self.assertLess(len(entries), 6)
+        self.assertIn("Account 5", [entry["account"] for entry in entries])
+        for entry in entries:
+            self.assertIn(entry["screenshot"], blobs)
+            self.assertIn(entry["dom"], blobs)
+        self.assertLessEqual(store.total_bytes, 3000)
+        self.assertEqual(store.total_bytes, self.disk_bytes())
+
+
+class ConfigLoaderTests(SimpleTestCase):
+    def env(self, key=None, count=2):
+        fernet = Fernet(key or os.environ["FERNET_KEY"].encode())
+        env = {}
+        for i in range(1, count + 1):
+            env.update({
+                f"ACC{i}_NAME": f"Account {i}",
+                f"ACC{i}_DP_ID": "13700",
+                f"ACC{i}_USERNAME": f"user{i}",
+                f"ACC{i}_PASSWORD": fernet.encrypt(f"password{i}".encode()).decode(),
+                f"ACC{i}_CRN": fernet.encrypt(f"CRN{i}".encode()).decode(),
+                f"ACC{i}_PIN": fernet.encrypt(b"1234").decode(),
+                f"ACC{i}_LOT": "10",
+                f"ACC{i}_PRIORITY": str(i),
+            })
+        return env
+
+    def test_roster_stays_sealed_until_a_worker_unseals_one_account(self):
+        accounts = load_encrypted_accounts(self.env())
+        self.assertEqual([acc["priority"] for acc in accounts], [1, 2])
+        self.assertTrue(accounts[0]["password"].startswith("gAAAAA"))
+
+        with unsealed(accounts[0]) as acc:
+            self.assertEqual((acc["password"], acc["crn"], acc["pin"]), ("password1", "CRN1", "1234"))
+        self.assertNotIn("password", acc)  # forgotten once the block ends
+        self.assertTrue(accounts[0]["password"].startswith("gAAAAA"))
+
+    def test_batch_decrypt_matches_per_account(self):
+        accounts = load_encrypted_accounts(self.env(count=5))
+        self.assertEqual(decrypt_accounts(accounts, parallel_min=0, processes=2),
+                         [decrypt_account(acc) for acc in accounts])
+
+    def test_plaintext_env_values_pass_through(self):
+        acc = {"name": "Account 1", "password": "hunter2", "crn": "CRN1", "pin": "1234"}
+        self.assertEqual(decrypt_account(acc)["password"], "hunter2")
+
+    def test_wrong_key_is_reported(self):
+        accounts = load_encrypted_accounts(self.env(key=Fernet.generate_key()))
+        with self.assertRaisesMessage(Exception, "encrypted with this FERNET_KEY"):
+            decrypt_account(accounts[0])
+
+    def test_missing_key_is_reported(self):
+        accounts = load_encrypted_accounts(self.env())
+        environ = {key: value for key, value in os.environ.items() if key != "FERNET_KEY"}
+        with mock.patch.dict(os.environ, environ, clear=True), mock.patch("ipo_app.config_loader._fernet", None):
+            with self.assertRaisesMessage(Exception, "FERNET_KEY is not set"):
+                decrypt_account(accounts[0])
+
+
+class EligibilityTests(SimpleTestCase):
+    def issue(self, **overrides):
+        issue = {"name": "RBB Foo Ltd (RBBF)", "share_type": ORDINARY, "min_unit": 10, "max_unit": 0,
+                 "unit_step": 10, "local_districts": []}
+        issue.update(overrides)
+        return issue
+
+    def account(self, **overrides):
+        acc = {"name": "Account 1", "dp_id": "13700", "username": "user1", "password": "x", "crn": "C1",
+               "pin": "1234", "lot": "10", "district": "", "foreign_employment": False}
+        acc.update(overrides)
+        return acc
+
+    def reasons(self, acc, issue):
+        plan, ineligible = evaluate([acc], [issue])
+        return ineligible[0][2] if ineligible else []
+
+    def test_issue_terms(self):
+        self.assertEqual(issue_terms("RBB Foo Ltd (RBBF)"), ["RBB Foo Ltd (RBBF)", "RBB Foo Ltd", "RBBF"])
+        self.assertEqual(issue_terms("Bar Hydro"), ["Bar Hydro"])
+
+    def test_kitta_is_capped_and_rounded_to_the_unit_step(self):
+        self.assertEqual(requested_kitta(self.account(lot="57"), self.issue()), 50)
+        self.assertEqual(requested_kitta(self.account(lot="500"), self.issue(max_unit=200)), 200)
+        self.assertEqual(requested_kitta(self.account(lot=None), self.issue(min_unit=20)), 20)
+        self.assertEqual(requested_kitta(self.account(lot="ten"), self.issue()), 0)
+
+    def test_kitta_below_the_minimum_unit_is_ineligible(self):
+        self.assertEqual(self.reasons(self.account(lot="5"), self.issue()), ["kitta is below the issue's minimum unit"])
+        self.assertEqual(self.reasons(self.account(lot="15"), self.issue(min_unit=20, unit_step=1)),
+                         ["kitta is below the issue's minimum unit"])
+
+    def test_plan_carries_issue_and_computed_kitta(self):
+        plan, ineligible = evaluate([self.account(lot="57")], [self.issue()])
+        self.assertEqual(ineligible, [])
+        self.assertEqual((plan[0]["issue"], plan[0]["lot"]), ("RBB Foo Ltd (RBBF)", "50"))
+
+    def test_missing_dp_credentials_or_crn(self):
+        self.assertEqual(self.reasons(self.account(dp_id=""), self.issue()), ["DP, username or password missing"])
+        self.assertEqual(self.reasons(self.account(pin=None), self.issue()), ["CRN or PIN missing"])
+
+    def test_quota_issues(self):
+        foreign = self.issue(share_type=FOREIGN_EMPLOYMENT)
+        self.assertEqual(self.reasons(self.account(), foreign),
+                         ["foreign-employment quota is reserved for migrant workers"])
+        self.assertEqual(self.reasons(self.account(foreign_employment=True), foreign), [])
+
+        local = self.issue(share_type=LOCAL, local_districts=["dolakha"])
+        self.assertEqual(self.reasons(self.account(district="Kathmandu"), local),
+                         ["local quota is limited to the issue's project districts"])
+        self.assertEqual(self.reasons(self.account(district="Dolakha"), local), [])
+
+    def test_every_account_is_checked_against_every_issue(self):
+        plan, ineligible = evaluate(
+            [self.account(), self.account(name="Account 2", username="user2", lot="5")],
+            [self.issue(), self.issue(name="Bar Hydro (BARH)", share_type=LOCAL)],
+        )
+        self.assertEqual([(acc["name"], acc["issue"]) for acc in plan], [("Account 1", "RBB Foo Ltd (RBBF)")])
+        self.assertEqual(len(ineligible), 3)
+
+
+class RunsApiTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user("ops", password="pw", is_staff=True)
+        self.client.force_login(self.staff)
+
+    def post(self, body, client=None, **headers):
+        return (client or self.client).post("/api/runs/", body, content_type="application/json", **headers)
+
+    def test_create_list_and_detail(self):
+        response = self.post({"issue": "RBB Foo Ltd (RBBF)", "account_ids": [1, 2]})
+        self.assertEqual(response.status_code, 202)
+        run = Run.objects.get()
+        self.assertEqual((run.issue, run.filters, run.requested_by), ("RBB Foo Ltd (RBBF)", {"account_ids": [1, 2]}, "ops"))
+
+        listed = self.client.get("/api/runs/").json()["runs"]
+        self.assertEqual([item["id"] for item in listed], [run.pk])
+
+        statuses = [ApplicationRecord.STATUS_SUBMITTED] * 3 + [ApplicationRecord.STATUS_FAILED] * 2
+        for i, status in enumerate(statuses, start=1):
+            account = UserAccount.objects.create(name=f"Account {i}", dp_id="13700", boid=f"130137000000000{i}",
+                                                 username=f"user{i}", password="x", crn="x")
+            ApplicationRecord.objects.create(account=account, username=f"user{i}", issue=run.issue, run=run,
+                                             status=status)
+        detail = self.client.get(f"/api/runs/{run.pk}/").json()
+        self.assertEqual(detail["counts"], {"submitted": 3, "failed": 2})
+        self.assertEqual([item["name"] for item in detail["accounts"]], [f"Account {i}" for i in range(1, 6)])
+        self.assertEqual(self.client.get("/api/runs/999/").status_code, 404)
+
+    def test_invalid_filters_are_rejected(self):
+        for body in ({"account_ids": "1,2"}, {"account_ids": [1, "2"]}, {"account_ids": [True]}, {"dp_id": 13700}, [1]):
+            self.assertEqual(self.post(body).status_code, 400, body)
+        self.assertFalse(Run.objects.exists())
+
+    def test_staff_session_required(self):
+        anonymous = Client()
+        self.assertEqual(anonymous.get("/api/runs/").status_code, 401)
+        self.assertEqual(self.post({}, client=anonymous).status_code, 401)
+
+        self.client.force_login(User.objects.create_user("viewer", password="pw"))
+        self.assertEqual(self.client.get("/api/runs/").status_code, 401)
+
+    def test_post_needs_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.staff)
+        self.assertEqual(self.post({}, client=client).status_code, 403)
+
+        client.get("/admin/")  # any page with a form sets the csrftoken cookie
+        token = client.cookies["csrftoken"].value
+        self.assertEqual(self.post({}, client=client, HTTP_X_CSRFTOKEN=token).status_code, 202)
+        self.assertEqual(Run.objects.count(), 1)
+
+
+class AdminRunTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("ops", password="pw"))
+        self.vip = Tag.objects.create(name="vip")
+        for i in range(1, 5):
+            account = UserAccount.objects.create(name=f"Account {i}", dp_id="13700" if i < 4 else "10900",
+                                                 boid=f"130137000000000{i}", username=f"user{i}", password="x", crn="x")
+            if i % 2:
+                account.tags.add(self.vip)
+
+    def act(self, query="", **data):
+        return self.client.post(f"/admin/ipo_app/useraccount/{query}", {"action": "check_allotment", **data})
+
+    def test_select_all_stores_changelist_filters(self):
+        self.act(f"?dp_id__exact=13700&tags__id__exact={self.vip.pk}&q=account&o=1", select_across="1",
+                 _selected_action=[UserAccount.objects.first().pk])
+        run = Run.objects.get()
+        self.assertEqual(run.filters, {"lookups": {"dp_id__exact": "13700", "tags__id__exact": str(self.vip.pk)},
+                                       "search": "account"})
+        self.assertEqual([account.name for account in run_queryset(run)], ["Account 1", "Account 3"])
+
+    def test_already_applied_matches_whole_words_in_report_rows(self):
+        rows = ["RBB Foo Ltd Debenture (RBBFD)\nIPO\nOrdinary Shares", "Bar Hydro (BARH)\nIPO"]
+        self.assertTrue(issue_in_report(rows, "Bar Hydro (BARH)"))
+        self.assertTrue(issue_in_report(["BARH  IPO  Verified"], "Bar Hydro (BARH)"))
+        self.assertFalse(issue_in_report(rows, "Kalika Power (ARH)"))  # ARH only inside BARH
+        self.assertFalse(issue_in_report([], "Bar Hydro (BARH)"))
+
+    def test_select_all_replays_the_admin_search(self):
+        for query in ("USER3", '"account 2"', "account 4"):
+            Run.objects.all().delete()
+            response = self.act(f"?q={urllib.parse.quote(query)}", select_across="1",
+                                _selected_action=[UserAccount.objects.first().pk])
+            shown = UserAccountAdmin(UserAccount, site).get_search_results(
+                response.wsgi_request, UserAccount.objects.all(), query)[0]
+            self.assertEqual(sorted(run_queryset(Run.objects.get()).values_list("id", flat=True)),
+                             sorted(shown.values_list("id", flat=True)), query)
+            self.assertEqual(run_queryset(Run.objects.get()).count(), 1)
+
+    def test_page_selection_stores_ids(self):
+        ids = list(UserAccount.objects.filter(dp_id="13700").values_list("id", flat=True)[:2])
+        self.act("?dp_id__exact=13700", select_across="0", _selected_action=ids)
+        self.assertCountEqual(Run.objects.get().filters["account_ids"], ids)
+
+
+class EncryptedFieldTests(TestCase):
+    def setUp(self):
+        self.account = UserAccount.objects.create(name="Account 1", dp_id="13700", boid="1301370000000001",
+                                                  username="user1", password="secret", crn="CRN1")
+
+    def stored(self, column):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {column} FROM ipo_app_useraccount WHERE id = %s", [self.account.pk])
+            return cursor.fetchone()[0]
+
+    def test_round_trip_stores_tokens_only(self):
+        self.assertTrue(self.stored("password").startswith("gAAAAA"))
+        account = UserAccount.objects.get(pk=self.account.pk)
+        self.assertEqual((account.password, account.crn, account.pin), ("secret", "CRN1", ""))
+
+    def test_decrypts_on_first_read_and_saves_untouched_tokens_as_is(self):
+        token = self.stored("password")
+        account = UserAccount.objects.get(pk=self.account.pk)
+        self.assertIsInstance(account.__dict__["password"], EncryptedValue)
+
+        with mock.patch.object(EncryptedValue, "reveal", side_effect=AssertionError("decrypted")):
+            account.name = "Renamed"
+            account.save()
+        self.assertEqual(self.stored("password"), token)
+
+        self.assertEqual(account.password, "secret")
+        self.assertEqual(account.__dict__["password"], "secret")
+
+    def test_admin_form_hides_secret_and_keeps_it_when_blank(self):
+        self.client.force_login(User.objects.create_superuser("ops", password="pw"))
+        url = f"/admin/ipo_app/useraccount/{self.account.pk}/change/"
+        self.assertNotContains(self.client.get(url), "secret")
+
+        token = self.stored("password")
+        data = {"name": "Account 1", "dp_id": "13700", "boid": "1301370000000001", "username": "user1",
+                "password": "", "crn": "CRN2", "pin": "", "lot_size": 10, "priority": 0}
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        account = UserAccount.objects.get(pk=self.account.pk)
+        self.assertEqual(self.stored("password"), token)
+        self.assertEqual((account.password, account.crn), ("secret", "CRN2"))
+
+        response = self.client.post("/admin/ipo_app/useraccount/add/", {**data, "boid": "1301370000000002"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserAccount.objects.count(), 1)
+
+    def test_runner_dicts_keep_secrets_sealed_until_unsealed(self):
+        account = UserAccount.objects.get(pk=self.account.pk)
+        issue = {"name": "RBB Foo Ltd (RBBF)", "share_type": ORDINARY, "min_unit": 10, "max_unit": 0,
+                 "unit_step": 10, "local_districts": []}
+        with mock.patch.object(EncryptedValue, "reveal", side_effect=AssertionError("decrypted")):
+            acc = account_to_dict(account, {"user1": {"pin": "1234"}})
+            plan, _ = evaluate([acc], [issue])
+        self.assertEqual(acc["password"], self.stored("password"))
+        self.assertEqual(len(plan), 1)
+
+        with unsealed(acc) as plain:
+            self.assertEqual((plain["password"], plain["crn"], plain["pin"]), ("secret", "CRN1", "1234"))
+        self.assertNotIn("password", plain)
+        self.assertEqual(acc["crn"], self.stored("crn"))
+
+    def test_migration_encrypts_plaintext_rows_once(self):
+        token = self.stored("password")
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE ipo_app_useraccount SET crn = %s WHERE id = %s", ["CRN-plain", self.account.pk])
+
+        migration = importlib.import_module("ipo_app.migrations.0006_useraccount_encrypted_fields_and_indexes")
+        migration.encrypt_plaintext_secrets(apps, mock.Mock(connection=connection))
+
+        self.assertEqual(self.stored("password"), token)
+        self.assertTrue(self.stored("crn").startswith("gAAAAA"))
+        self.assertEqual(UserAccount.objects.get(pk=self.account.pk).crn, "CRN-plain")
+
+
+class EventBusTests(SimpleTestCase):
+    async def test_slow_client_keeps_newest_events_and_counts_drops(self):
+        subscription = Subscription(asyncio.get_running_loop(), size=3)
+        for i in range(5):
+            subscription.push({"run": "r", "n": i})
+
+        events, dropped = subscription.drain()
+        self.assertEqual([event["n"] for event in events], [2, 3, 4])
+        self.assertEqual(dropped, 2)
+        self.assertEqual(subscription.drain(), ([], 0))
+
+    async def test_subscriber_gets_recent_history_for_its_run_then_live_events(self):
+        bus = EventBus(history=3)
+        for i in range(5):
+            bus.publish(run="job-1" if i % 2 else "job-2", n=i)
+
+        subscription = bus.subscribe("job-1")
+        events, _ = subscription.drain()
+        self.assertEqual([event["n"] for event in events], [3])  # history holds 2, 3, 4
+
+        subscription.ready.clear()
+        thread = threading.Thread(target=bus.publish, kwargs={"run": "job-1", "n": 5})
+        thread.start()
+        await asyncio.wait_for(subscription.ready.wait(), timeout=5)
+        thread.join()
+        events, _ = subscription.drain()
+        self.assertEqual([event["n"] for event in events], [5])
+
+        bus.unsubscribe(subscription)
+        bus.publish(run="job-1", n=6)
+        self.assertEqual(subscription.drain(), ([], 0))
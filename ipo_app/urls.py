@@ -0,0 +1,11 @@
+from django.urls import path
+
+from . import views
+
+app_name = "ipo_app"
+
+urlpatterns = [
+    path("runs/", views.runs, name="runs"),
+    path("runs/<int:run_id>/", views.run_detail, name="run_detail"),
+    path("events/", views.events, name="events"),
+]
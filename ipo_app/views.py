@@ -1,3 +1,138 @@
-from django.shortcuts import render
+import asyncio
+import json
+from functools import wraps
 
-# Create your views here.
+from decouple import config
+from django.db.models import Count
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods
+
+from .events import bus
+from .jobs import enqueue_run
+from .metrics import CONTENT_TYPE, registry
+from .models import Run
+
+
+def staff_required(view):
+    """Runs submit real applications, so the API is limited to staff users"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not (request.user.is_authenticated and request.user.is_staff):
+            return JsonResponse({"error": "authentication required"}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def run_to_dict(run):
+    return {
+        "id": run.pk,
+        "kind": run.kind,
+        "issue": run.issue,
+        "filters": run.filters,
+        "status": run.status,
+        "requested_by": run.requested_by,
+        "created_at": run.created_at,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+    }
+
+
+def parse_filters(body):
+    """Account filters from a POST body; raises ValueError with a message for the client"""
+    if not isinstance(body, dict):
+        raise ValueError("body must be a JSON object")
+    account_ids = body.get("account_ids")
+    if account_ids is not None and not (
+        isinstance(account_ids, list) and all(type(value) is int for value in account_ids)
+    ):
+        raise ValueError("account_ids must be a list of integers")
+    for key in ("issue", "dp_id", "tag"):
+        if body.get(key) is not None and not isinstance(body[key], str):
+            raise ValueError(f"{key} must be a string")
+    return {key: body[key] for key in ("account_ids", "dp_id", "tag") if body.get(key)}
+
+
+# Session-authenticated, so Django's CSRF check applies: send the csrftoken cookie back as X-CSRFToken
+@staff_required
+@require_http_methods(["GET", "POST"])
+def runs(request):
+    """GET lists recent runs; POST enqueues one for all accounts or a filtered set"""
+    if request.method == "GET":
+        return JsonResponse({"runs": [run_to_dict(run) for run in Run.objects.order_by("-id")[:50]]})
+
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "invalid JSON"}, status=400)
+    try:
+        filters = parse_filters(body)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    run = enqueue_run(issue=body.get("issue"), filters=filters, requested_by=request.user.get_username())
+    return JsonResponse(run_to_dict(run), status=202)
+
+
+@staff_required
+@require_http_methods(["GET"])
+def run_detail(request, run_id):
+    """A run with per-account progress from the ledger"""
+    run = get_object_or_404(Run, pk=run_id)
+    applications = run.applications.select_related("account").order_by("id")
+    data = run_to_dict(run)
+    # order_by() clears the ordering, which would otherwise join the GROUP BY and make every row its own group
+    counts = run.applications.order_by().values("status").annotate(n=Count("id"))
+    data["counts"] = {row["status"]: row["n"] for row in counts}
+    data["accounts"] = [
+        {
+            "username": record.username,
+            "name": record.account.name if record.account else "",
+            "status": record.status,
+            "message": record.message,
+            "started_at": record.started_at,
+            "finished_at": record.finished_at,
+        }
+        for record in applications
+    ]
+    return JsonResponse(data)
+
+
+async def _event_stream(run_id):
+    subscription = bus.subscribe(run_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                await asyncio.wait_for(subscription.ready.wait(), timeout=15)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            subscription.ready.clear()
+            events, dropped = subscription.drain()
+            if dropped:
+                yield f"event: dropped\ndata: {json.dumps({'dropped': dropped})}\n\n"
+            for event in events:
+                yield f"data: {json.dumps(event)}\n\n"
+    finally:
+        bus.unsubscribe(subscription)
+
+
+async def events(request):
+    """Server-Sent Events stream of per-account step events (?run=<run id> to filter)"""
+    user = await request.auser()
+    if not (user.is_authenticated and user.is_staff):
+        return JsonResponse({"error": "authentication required"}, status=401)
+
+    response = StreamingHttpResponse(_event_stream(request.GET.get("run")), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def metrics(request):
+    """Prometheus scrape endpoint; set METRICS_TOKEN to require `Authorization: Bearer <token>`"""
+    token = config("METRICS_TOKEN", default="")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse("unauthorized\n", status=401, content_type="text/plain")
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
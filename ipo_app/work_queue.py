@@ -0,0 +1,228 @@
+# ipo_app/work_queue.py
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from decouple import config
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import WorkClaim
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = config("SHARD_LEASE_SECONDS", default=120, cast=int)
+HEARTBEAT_SECONDS = config("SHARD_HEARTBEAT_SECONDS", default=30, cast=int)
+
+
+class DatabaseWorkQueue:
+    """Work queue stored in the WorkClaim table of the project database"""
+
+    def __init__(self, issue, lease_seconds=LEASE_SECONDS):
+        self.issue = issue
+        self.lease_seconds = lease_seconds
+
+    def enqueue(self, account_ids):
+        """Queue accounts for this issue; accounts already queued are left alone"""
+        claims = [WorkClaim(account_id=account_id, issue=self.issue) for account_id in account_ids]
+        WorkClaim.objects.bulk_create(claims, ignore_conflicts=True)
+        return WorkClaim.objects.filter(issue=self.issue, status=WorkClaim.STATUS_QUEUED).count()
+
+    def _claimable(self):
+        now = timezone.now()
+        return WorkClaim.objects.filter(issue=self.issue).filter(
+            Q(status=WorkClaim.STATUS_QUEUED)
+            | Q(status=WorkClaim.STATUS_CLAIMED, lease_expires_at__lt=now)
+        )
+
+    def claim(self, worker, batch=1):
+        """Lease up to `batch` accounts, including ones whose previous lease expired
+
+        Returns [] only when nothing is claimable: losing the race for every
+        candidate to another shard means trying again, not that the queue is drained.
+        """
+        while True:
+            token = uuid.uuid4().hex
+            with transaction.atomic():
+                # Backends with row locks (PostgreSQL, MySQL) hand each shard different rows;
+                # elsewhere the claimable filter is re-applied in the UPDATE, so a row another
+                # shard grabbed between the SELECT and here is skipped instead of stolen.
+                claimable = self._claimable().order_by("id")
+                if connection.features.has_select_for_update_skip_locked:
+                    claimable = claimable.select_for_update(skip_locked=True)
+                candidate_ids = list(claimable.values_list("id", flat=True)[:batch])
+                if not candidate_ids:
+                    return []
+                self._claimable().filter(id__in=candidate_ids).update(
+                    status=WorkClaim.STATUS_CLAIMED,
+                    worker=worker,
+                    claim_token=token,
+                    lease_expires_at=timezone.now() + timedelta(seconds=self.lease_seconds),
+                    attempts=F("attempts") + 1,
+                )
+            claimed = list(WorkClaim.objects.filter(claim_token=token).values_list("account_id", flat=True))
+            if claimed:
+                return claimed
+
+    def heartbeat(self, worker, account_ids):
+        """Extend the lease on accounts this worker still holds"""
+        WorkClaim.objects.filter(
+            issue=self.issue, worker=worker, status=WorkClaim.STATUS_CLAIMED, account_id__in=account_ids
+        ).update(lease_expires_at=timezone.now() + timedelta(seconds=self.lease_seconds))
+
+    def complete(self, worker, account_id, ok):
+        """Mark a leased account as finished"""
+        WorkClaim.objects.filter(
+            issue=self.issue, worker=worker, account_id=account_id, status=WorkClaim.STATUS_CLAIMED
+        ).update(
+            status=WorkClaim.STATUS_DONE if ok else WorkClaim.STATUS_FAILED,
+            lease_expires_at=None,
+        )
+
+    def requeue(self, worker, account_id):
+        """Hand a leased account back to the queue so the next claim picks it up again"""
+        WorkClaim.objects.filter(
+            issue=self.issue, worker=worker, account_id=account_id, status=WorkClaim.STATUS_CLAIMED
+        ).update(status=WorkClaim.STATUS_QUEUED, worker="", claim_token="", lease_expires_at=None)
+
+    def pending(self):
+        return self._claimable().count()
+
+
+class RedisWorkQueue:
+    """Work queue kept in Redis (or any server speaking the Redis protocol)"""
+
+    def __init__(self, issue, url, lease_seconds=LEASE_SECONDS):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("SHARD_QUEUE_BACKEND=redis needs the 'redis' package installed")
+
+        self.client = redis.Redis.from_url(url)
+        self.issue = issue
+        self.lease_seconds = lease_seconds
+        self.queue_key = f"ipo:queue:{issue}"
+        self.lease_key = f"ipo:leases:{issue}"
+        self.owner_key = f"ipo:owners:{issue}"
+        self.seen_key = f"ipo:seen:{issue}"
+        self.claim_script = self.client.register_script(self.CLAIM_SCRIPT)
+        self.complete_script = self.client.register_script(self.COMPLETE_SCRIPT)
+        self.requeue_script = self.client.register_script(self.REQUEUE_SCRIPT)
+
+    def enqueue(self, account_ids):
+        for account_id in account_ids:
+            # SADD returns 0 for accounts queued by an earlier enqueue
+            if self.client.sadd(self.seen_key, account_id):
+                self.client.rpush(self.queue_key, account_id)
+        return self.client.llen(self.queue_key)
+
+    # Requeue expired leases, then pop and lease up to ARGV[4] accounts, in one atomic step
+    CLAIM_SCRIPT = """
+    local queue_key, lease_key, owner_key = KEYS[1], KEYS[2], KEYS[3]
+    local now, expires, batch, worker = tonumber(ARGV[1]), ARGV[2], tonumber(ARGV[4]), ARGV[3]
+    for _, account_id in ipairs(redis.call('ZRANGEBYSCORE', lease_key, '-inf', now)) do
+        redis.call('ZREM', lease_key, account_id)
+        redis.call('HDEL', owner_key, account_id)
+        redis.call('RPUSH', queue_key, account_id)
+    end
+    local claimed = {}
+    for _ = 1, batch do
+        local account_id = redis.call('LPOP', queue_key)
+        if not account_id then break end
+        redis.call('ZADD', lease_key, expires, account_id)
+        redis.call('HSET', owner_key, account_id, worker)
+        table.insert(claimed, account_id)
+    end
+    return claimed
+    """
+
+    # Drop a lease only if ARGV[2] still owns it
+    COMPLETE_SCRIPT = """
+    if redis.call('HGET', KEYS[2], ARGV[1]) == ARGV[2] then
+        redis.call('ZREM', KEYS[1], ARGV[1])
+        redis.call('HDEL', KEYS[2], ARGV[1])
+        return 1
+    end
+    return 0
+    """
+
+    # Like COMPLETE_SCRIPT, then put the account back on the queue
+    REQUEUE_SCRIPT = """
+    if redis.call('HGET', KEYS[2], ARGV[1]) == ARGV[2] then
+        redis.call('ZREM', KEYS[1], ARGV[1])
+        redis.call('HDEL', KEYS[2], ARGV[1])
+        redis.call('RPUSH', KEYS[3], ARGV[1])
+        return 1
+    end
+    return 0
+    """
+
+    def claim(self, worker, batch=1):
+        now = timezone.now().timestamp()
+        account_ids = self.claim_script(
+            keys=[self.queue_key, self.lease_key, self.owner_key],
+            args=[now, now + self.lease_seconds, worker, batch],
+        )
+        return [int(account_id) for account_id in account_ids]
+
+    def heartbeat(self, worker, account_ids):
+        expires = timezone.now().timestamp() + self.lease_seconds
+        for account_id in account_ids:
+            if self.client.hget(self.owner_key, account_id) == worker.encode():
+                self.client.zadd(self.lease_key, {account_id: expires}, xx=True)
+
+    def complete(self, worker, account_id, ok):
+        # A worker whose lease lapsed must not drop the lease of the shard that took the account over
+        self.complete_script(keys=[self.lease_key, self.owner_key], args=[account_id, worker])
+
+    def requeue(self, worker, account_id):
+        self.requeue_script(keys=[self.lease_key, self.owner_key, self.queue_key], args=[account_id, worker])
+
+    def pending(self):
+        return self.client.llen(self.queue_key) + self.client.zcard(self.lease_key)
+
+
+def get_work_queue(issue):
+    """Return the work queue selected by SHARD_QUEUE_BACKEND"""
+    backend = config("SHARD_QUEUE_BACKEND", default="database")
+    if backend == "redis":
+        return RedisWorkQueue(issue, config("SHARD_REDIS_URL", default="redis://localhost:6379/0"))
+    return DatabaseWorkQueue(issue)
+
+
+class LeaseHeartbeat(threading.Thread):
+    """Background thread that keeps this worker's leases alive"""
+
+    def __init__(self, queue, worker, interval=HEARTBEAT_SECONDS):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.worker = worker
+        self.interval = interval
+        self.held = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def hold(self, account_ids):
+        with self.lock:
+            self.held.update(account_ids)
+
+    def release(self, account_ids):
+        with self.lock:
+            self.held.difference_update(account_ids)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                held = list(self.held)
+            if not held:
+                continue
+            try:
+                self.queue.heartbeat(self.worker, held)
+            except Exception as e:
+                logger.warning(f"⚠️ Lease heartbeat failed: {e}")
+        connection.close()
+
+    def stop(self):
+        self.stopped.set()